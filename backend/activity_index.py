@@ -0,0 +1,222 @@
+"""操作日志的 SQLite 查询索引 (logs/activity_index.db)。
+
+每次查询前增量导入：已轮转的压缩段按文件名只导入一次，当前 activity.log 记录
+(inode, 偏移) 只读取新增的尾部。同一行可能先从当前文件、轮转后又从压缩段读到，
+按行内容的哈希去重。查询只访问索引，不再扫描日志文件。
+
+分页使用 (ts, id) 键集游标，结果按时间倒序。
+"""
+import base64
+import hashlib
+import gzip
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Iterable, Optional
+
+import fast_json
+from activity_log import segment_paths
+
+LIVE_SOURCE = "activity.log"
+MAX_LIMIT = 1000
+
+
+def _line_hash(raw: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(raw.rstrip(b"\r\n"), digest_size=8).digest(), "big", signed=True)
+
+
+def encode_cursor(ts: float, row_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{ts!r}:{row_id}".encode("ascii")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> tuple:
+    try:
+        ts, row_id = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("ascii").split(":")
+        return float(ts), int(row_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def parse_time(value: Optional[str], tz) -> Optional[float]:
+    """ISO 8601 时间转为时间戳；不带时区时按 tz 解释。"""
+    if not value:
+        return None
+    try:
+        dt = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Invalid time: {value}")
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=tz)
+    return dt.timestamp()
+
+
+class ActivityIndex:
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS entries (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        ts REAL NOT NULL,
+        hour TEXT,
+        action TEXT,
+        username TEXT,
+        project_id TEXT,
+        table_id TEXT,
+        line_hash INTEGER NOT NULL UNIQUE,
+        record TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS entries_by_ts ON entries (ts, id);
+    CREATE INDEX IF NOT EXISTS entries_by_action ON entries (action, ts);
+    CREATE INDEX IF NOT EXISTS entries_by_user ON entries (username, ts);
+    CREATE INDEX IF NOT EXISTS entries_by_table ON entries (table_id, ts);
+    CREATE TABLE IF NOT EXISTS sources (
+        name TEXT PRIMARY KEY,
+        ino INTEGER,
+        offset INTEGER NOT NULL
+    );
+    """
+
+    def __init__(self, log_path: Path, db_path: Path):
+        self.log_path = Path(log_path)
+        self.db_path = Path(db_path)
+        self._local = threading.local()
+        self._ingest_lock = threading.Lock()
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn().executescript(self.SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.db_path), timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # --- ingestion ---
+
+    @staticmethod
+    def _row(raw: bytes) -> Optional[tuple]:
+        try:
+            entry = fast_json.loads(raw)
+            ts = datetime.fromisoformat(entry["timestamp"]).timestamp()
+        except Exception:
+            return None
+        if not isinstance(entry, dict):
+            return None
+        details = entry.get("details") if isinstance(entry.get("details"), dict) else {}
+        table_id = details.get("tableId")
+        return (
+            ts,
+            str(entry["timestamp"])[:13],
+            entry.get("action"),
+            entry.get("username"),
+            details.get("projectId"),
+            None if table_id is None else str(table_id),
+            _line_hash(raw),
+            raw.decode("utf-8").rstrip("\r\n"),
+        )
+
+    def _insert(self, conn: sqlite3.Connection, lines: Iterable[bytes]):
+        rows = [row for row in (self._row(raw) for raw in lines if raw.strip()) if row is not None]
+        conn.executemany(
+            "INSERT OR IGNORE INTO entries (ts, hour, action, username, project_id, table_id, line_hash, record) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+
+    def refresh(self):
+        """导入尚未入索引的压缩段与当前文件新增的行。"""
+        with self._ingest_lock:
+            conn = self._conn()
+            known = {name: (ino, offset) for name, ino, offset in conn.execute("SELECT name, ino, offset FROM sources")}
+            for segment in segment_paths(self.log_path):
+                if segment.name in known:
+                    continue
+                with gzip.open(segment, "rb") as f, conn:
+                    self._insert(conn, f)
+                    conn.execute("INSERT OR REPLACE INTO sources (name, ino, offset) VALUES (?, NULL, -1)", (segment.name,))
+
+            try:
+                st = os.stat(self.log_path)
+            except FileNotFoundError:
+                return
+            ino, offset = known.get(LIVE_SOURCE, (None, 0))
+            if ino != st.st_ino or offset > st.st_size:
+                offset = 0  # 已轮转为新文件
+            if offset == st.st_size:
+                return
+            with open(self.log_path, "rb") as f:
+                f.seek(offset)
+                chunk = f.read()
+            complete = chunk[:chunk.rfind(b"\n") + 1]  # 未写完的行留待下次
+            with conn:
+                self._insert(conn, complete.splitlines())
+                conn.execute(
+                    "INSERT OR REPLACE INTO sources (name, ino, offset) VALUES (?, ?, ?)",
+                    (LIVE_SOURCE, st.st_ino, offset + len(complete)),
+                )
+
+    # --- queries ---
+
+    @staticmethod
+    def _filters(actions=None, usernames=None, table_ids=None, project_id=None, start=None, end=None) -> tuple:
+        clauses, params = [], []
+        for column, values in (("action", actions), ("username", usernames), ("table_id", table_ids)):
+            if values:
+                clauses.append(f"{column} IN ({','.join('?' * len(values))})")
+                params.extend(values)
+        if project_id:
+            clauses.append("project_id = ?")
+            params.append(project_id)
+        if start is not None:
+            clauses.append("ts >= ?")
+            params.append(start)
+        if end is not None:
+            clauses.append("ts < ?")
+            params.append(end)
+        return clauses, params
+
+    def query(self, limit: int = 100, cursor: Optional[str] = None, aggregate: bool = False, **filters) -> dict:
+        self.refresh()
+        conn = self._conn()
+        clauses, params = self._filters(**filters)
+        page_clauses, page_params = list(clauses), list(params)
+        if cursor:
+            ts, row_id = decode_cursor(cursor)
+            page_clauses.append("(ts < ? OR (ts = ? AND id < ?))")
+            page_params.extend([ts, ts, row_id])
+        limit = max(1, min(int(limit), MAX_LIMIT))
+        where = f"WHERE {' AND '.join(page_clauses)}" if page_clauses else ""
+        rows = conn.execute(
+            f"SELECT id, ts, record FROM entries {where} ORDER BY ts DESC, id DESC LIMIT ?",
+            (*page_params, limit + 1),
+        ).fetchall()
+        items = [fast_json.loads(record) for _, _, record in rows[:limit]]
+        result = {
+            "items": items,
+            "nextCursor": encode_cursor(rows[limit - 1][1], rows[limit - 1][0]) if len(rows) > limit else None,
+        }
+        if aggregate:
+            result["counts"] = self.counts(conn, clauses, params)
+        return result
+
+    @staticmethod
+    def counts(conn: sqlite3.Connection, clauses: list, params: list) -> dict:
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+        def grouped(column: str) -> dict:
+            return {
+                key: count for key, count in conn.execute(
+                    f"SELECT {column}, COUNT(*) FROM entries {where} GROUP BY {column} ORDER BY {column}", params
+                ) if key is not None
+            }
+
+        total = conn.execute(f"SELECT COUNT(*) FROM entries {where}", params).fetchone()[0]
+        return {
+            "total": total,
+            "byTable": grouped("table_id"),
+            "byUser": grouped("username"),
+            "byAction": grouped("action"),
+            "byHour": grouped("hour"),
+        }
@@ -0,0 +1,161 @@
+"""后台批量写入的操作日志 (logs/activity.log)。
+
+请求处理中只把条目放入内存队列；后台线程按批（达到条数或间隔时间）序列化并追加写入。
+当前文件超过大小上限或跨天时轮转为 activity.YYYYmmdd-HHMMSS.NNN.log.gz（gzip 压缩段，时间为该段最后写入时间），
+每批写入与轮转都在 activity.lock 文件锁内进行，多个 worker 进程可共用同一日志目录。
+进程退出（应用 shutdown 或 atexit）时会把队列中剩余的条目写完。
+"""
+import atexit
+import gzip
+import os
+import queue
+import shutil
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+import fast_json
+from table_locks import file_lock
+
+SEGMENT_PREFIX = "activity."
+SEGMENT_SUFFIX = ".log.gz"
+
+
+class ActivityLogger:
+    def __init__(self, path: Path, tz=None, max_bytes: int = 64 * 1024 * 1024,
+                 flush_interval: float = 1.0, batch_size: int = 512, max_queue: int = 100_000):
+        self.path = Path(path)
+        self.tz = tz
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.lock_path = self.path.with_name("activity.lock")
+        self.dropped = 0
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._closed = False
+
+    # --- producer side ---
+
+    def log(self, entry: dict):
+        """放入队列后立即返回；队列已满（写入长时间失败）时丢弃并计数。"""
+        if self._closed:
+            return
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self, timeout: Optional[float] = None):
+        """阻塞直到此前放入的条目全部落盘。"""
+        if self._thread is None:
+            return
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait(timeout)
+
+    def close(self, timeout: float = 10.0):
+        if self._closed:
+            return
+        self._closed = True
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout)
+
+    # --- writer thread ---
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                thread = threading.Thread(target=self._run, name="activity-log", daemon=True)
+                thread.start()
+                atexit.register(self.close)
+                self._thread = thread
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            batch, waiters = [], []
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if item is None:
+                    stopping = True
+                elif isinstance(item, threading.Event):
+                    waiters.append(item)
+                else:
+                    batch.append(item)
+                if stopping or waiters or len(batch) >= self.batch_size:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            if batch:
+                try:
+                    self._write(batch)
+                except Exception:
+                    pass
+            for waiter in waiters:
+                waiter.set()
+
+    def _write(self, batch: list):
+        data = b"".join(fast_json.dumps(entry) + b"\n" for entry in batch)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # 每批取一次锁：轮转压缩期间其它进程不会再向被轮转的文件追加
+        with file_lock(self.lock_path):
+            if self._needs_rotation(len(data)):
+                self._rotate()
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, data)
+            finally:
+                os.close(fd)
+
+    def _today(self, timestamp: Optional[float] = None):
+        return datetime.fromtimestamp(time.time() if timestamp is None else timestamp, self.tz).date()
+
+    def _needs_rotation(self, incoming: int) -> bool:
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        if st.st_size == 0:
+            return False
+        if st.st_size + incoming > self.max_bytes:
+            return True
+        return self._today(st.st_mtime) != self._today()
+
+    def _rotate(self):
+        # 以当前文件最后写入的时间命名，段名即其覆盖时间范围的终点；同一秒内多次轮转时递增序号
+        stamp = datetime.fromtimestamp(os.stat(self.path).st_mtime, self.tz).strftime("%Y%m%d-%H%M%S")
+        seq = 0
+        while self.path.with_name(f"{SEGMENT_PREFIX}{stamp}.{seq:03d}{SEGMENT_SUFFIX}").exists():
+            seq += 1
+        segment = self.path.with_name(f"{SEGMENT_PREFIX}{stamp}.{seq:03d}{SEGMENT_SUFFIX}")
+        rotated = segment.with_name(segment.name[:-len(".gz")])
+        os.replace(self.path, rotated)
+        tmp = segment.with_name(segment.name + ".tmp")
+        with open(rotated, "rb") as src, gzip.open(tmp, "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        os.replace(tmp, segment)
+        os.unlink(rotated)
+
+def segment_paths(log_path: Path) -> list:
+    """按时间先后列出已轮转的压缩段（不含当前文件）。"""
+    log_path = Path(log_path)
+    if not log_path.parent.exists():
+        return []
+    return sorted(
+        p for p in log_path.parent.iterdir()
+        if p.name.startswith(SEGMENT_PREFIX) and p.name.endswith(SEGMENT_SUFFIX)
+    )
@@ -0,0 +1,630 @@
+"""汇总表物化聚合引擎。
+
+每张汇总表的聚合结果常驻内存：记录各直接子表的贡献值以及合计值。
+子表写入后只对依赖它的汇总表做增量更新（减去旧贡献、加上新贡献）；
+单元格级修改 (cell_patch.CellChanges) 只更新变化的单元格，不再重新编码整张子表。
+读取时仅比对依赖文档的存储端签名（跨进程一致，其它 worker 或外部工具的写入同样可见），不再遍历子表数据。
+
+汇总表读取的是子表各自保存的快照（而不是子表的汇总结果），
+所以一次写入只影响其直接上级（PARENT_MAP），不会继续向上传播。
+汇总结果（含汇总表自身的覆盖层）最后按模板公式重算派生单元格（见 formula.py），随物化结果一起缓存。
+"""
+import copy
+import threading
+from datetime import datetime
+from typing import Callable, Optional
+
+import numpy as np
+
+import metrics
+from columnar import ColumnarTable, TableLayout, encode_table, fit
+from formula import FormulaPlan
+
+
+CALCULATED_FIELD_IDS = {1004, 1005}
+CALCULATED_METRIC_IDS = {
+    7, 18, 25, 28, 29, 32, 35, 36, 40, 42, 62, 63, 65, 68, 75, 76, 77, 78, 79, 80, 81,
+    82, 83, 84, 85, 86, 87, 88, 89, 90, 91, 92, 93, 94, 96, 98, 100, 102, 104, 106,
+    108, 110, 112, 115
+}
+
+# 表0中由多张子表合并而成的列：供热公司 = 9 + 10
+TABLE0_MERGED_SOURCES = {"heating_company": ("9", "10")}
+
+# 浮点增量累计误差的上限控制：每个视图累计这么多次增量后整体重算一次
+DEFAULT_REBUILD_EVERY = 256
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float))
+
+
+def select_child_payload(summary_id: str, content: dict):
+    """按汇总表规则挑选子表参与汇总的快照。"""
+    if not isinstance(content, dict):
+        return None
+    if summary_id == '1':
+        sub_data = content.get("approved") or content.get("submit")
+    elif summary_id in ('2', '3'):
+        sub_data = content.get("submit")
+    else:
+        sub_data = content.get("submit") or content.get("temp")
+    if not sub_data or not isinstance(sub_data.get("tableData"), list):
+        return None
+    return sub_data
+
+
+def select_latest_payload(content: dict, tz):
+    """表0规则：在 approved 与 submit 中取时间较新的一份。"""
+    if not isinstance(content, dict):
+        return None
+    approved_payload = content.get("approved")
+    submit_payload = content.get("submit")
+    candidates: list[tuple[dict, str]] = []
+    if isinstance(approved_payload, dict) and isinstance(approved_payload.get("tableData"), list):
+        ts_a = approved_payload.get("approvedAt") or approved_payload.get("timestamp") or ""
+        candidates.append((approved_payload, ts_a))
+    if isinstance(submit_payload, dict) and isinstance(submit_payload.get("tableData"), list):
+        ts_s = submit_payload.get("submittedAt") or submit_payload.get("timestamp") or ""
+        candidates.append((submit_payload, ts_s))
+    if not candidates:
+        return None
+
+    def _parse_ts(ts: str):
+        try:
+            ts_norm = ts.replace('Z', '+00:00') if isinstance(ts, str) else ""
+            return datetime.fromisoformat(ts_norm)
+        except Exception:
+            return None
+
+    return max(
+        candidates,
+        key=lambda item: _parse_ts(item[1]) or datetime.min.replace(tzinfo=tz)
+    )[0]
+
+
+def apply_summary_overlay(payload: dict, summary_content: dict):
+    """用汇总表自身保存的 submit/temp 覆盖聚合结果中对应的单元格。"""
+    if not summary_content:
+        return
+    summary_data = summary_content.get("submit") or summary_content.get("temp")
+    if not summary_data or not isinstance(summary_data.get("tableData"), list):
+        return
+    payload["submittedAt"] = summary_data.get("submittedAt")
+    payload["submittedBy"] = summary_data.get("submittedBy")
+    summary_data_map = {row["metricId"]: row for row in summary_data.get("tableData", []) if row.get("metricId")}
+    for agg_row in payload.get("tableData", []):
+        metric_id = agg_row.get("metricId")
+        if not metric_id or metric_id not in summary_data_map:
+            continue
+        summary_row_cells = {cell.get("fieldId"): cell for cell in summary_data_map[metric_id].get("values", []) if cell.get("fieldId")}
+        for i, agg_cell in enumerate(agg_row.get("values", [])):
+            field_id = agg_cell.get("fieldId")
+            if field_id and field_id in summary_row_cells:
+                agg_row["values"][i] = summary_row_cells[field_id]
+
+
+class _ListSummaryView:
+    """subsidiaries 为列表的汇总表（1~4）：逐单元格求和。
+
+    子表快照编码为列式矩阵（见 columnar.py），各子表的贡献为一次掩码运算，
+    合计值为这些贡献矩阵之和。
+    """
+
+    def __init__(self, table_id: str, table_config: dict, all_tables: dict, metric_ids: list):
+        self.table_id = table_id
+        self.table_config = table_config
+        self.children = [str(x) for x in table_config.get("subsidiaries", [])]
+        self.exclusions = set(table_config.get("aggregationExclusions", []))
+        self.child_exclusions = {
+            cid: set(all_tables.get(cid, {}).get("beAggregatedExclusions", []))
+            for cid in self.children
+        }
+        self.layout = TableLayout(metric_ids)
+        self.payloads: dict[str, Optional[dict]] = {}
+        # child -> (masked values, float flags)；用于增量更新时减去旧贡献
+        self.contribs: dict[str, tuple] = {}
+        self.sums = np.zeros(self.layout.shape, dtype=np.float64)
+        self.float_counts = np.zeros(self.layout.shape, dtype=np.int32)
+        self._masks: dict = {}
+        self.skeleton_source: Optional[str] = None
+        self.skeleton: Optional[dict] = None
+
+    def sources(self):
+        return self.children
+
+    def _static_masks(self, cid: str):
+        shape = self.layout.shape
+        key = (cid, shape)
+        masks = self._masks.get(key)
+        if masks is None:
+            layout = self.layout
+            excluded = layout.metric_mask(self.exclusions) | layout.metric_mask(self.child_exclusions.get(cid, set()))
+            calculated = layout.metric_mask(CALCULATED_METRIC_IDS)
+            summable_fields = ~layout.field_mask(CALCULATED_FIELD_IDS)
+            masks = (excluded, calculated, summable_fields)
+            self._masks[key] = masks
+        return masks
+
+    def _keep(self, cid: str, table: ColumnarTable) -> np.ndarray:
+        excluded, calculated, summable_fields = self._static_masks(cid)
+        rows = table.present & ~excluded & ~(calculated & ~table.force)
+        return table.numeric & rows[:, None] & summable_fields[None, :]
+
+    def _encode(self, content: dict):
+        sub_data = select_child_payload(self.table_id, content)
+        table = encode_table(sub_data.get("tableData", []), self.layout) if sub_data else None
+        return sub_data, table
+
+    def _fit_all(self):
+        shape = self.layout.shape
+        self.sums = fit(self.sums, shape)
+        self.float_counts = fit(self.float_counts, shape)
+        for cid, (values, floats) in self.contribs.items():
+            self.contribs[cid] = (fit(values, shape), fit(floats, shape))
+
+    def _contribution(self, cid: str, table: Optional[ColumnarTable]) -> tuple:
+        shape = self.layout.shape
+        if table is None:
+            return (np.zeros(shape, dtype=np.float64), np.zeros(shape, dtype=np.int32))
+        keep = self._keep(cid, table.fit(shape))
+        return (np.where(keep, table.values, 0.0), (keep & table.is_float).astype(np.int32))
+
+    def rebuild(self, contents: dict):
+        """全量物化：所有子表的贡献通过一次掩码求和得到。"""
+        encoded = {cid: self._encode(contents.get(cid)) for cid in self.children}
+        shape = self.layout.shape
+        keeps = []
+        values = []
+        floats = []
+        for cid in self.children:
+            table = encoded[cid][1]
+            if table is None:
+                table = ColumnarTable(shape)
+            table.fit(shape)
+            keeps.append(self._keep(cid, table))
+            values.append(table.values)
+            floats.append(table.is_float)
+        keep = np.stack(keeps) if keeps else np.zeros((0,) + shape, dtype=bool)
+        masked = np.where(keep, np.stack(values) if values else keep, 0.0)
+        float_flags = (keep & np.stack(floats)).astype(np.int32) if floats else keep.astype(np.int32)
+        self.sums = masked.sum(axis=0)
+        self.float_counts = float_flags.sum(axis=0, dtype=np.int32)
+        for n, cid in enumerate(self.children):
+            self.contribs[cid] = (masked[n], float_flags[n])
+            self.payloads[cid] = encoded[cid][0]
+        self._update_skeleton(None)
+
+    def update_source(self, cid: str, content: dict):
+        sub_data, table = self._encode(content)
+        self._fit_all()
+        new_values, new_floats = self._contribution(cid, table)
+        old_values, old_floats = self.contribs.get(cid, (0.0, 0))
+        self.sums += new_values - old_values
+        self.float_counts += new_floats - old_floats
+        self.contribs[cid] = (new_values, new_floats)
+        self.payloads[cid] = sub_data
+        self._update_skeleton(cid)
+
+    def update_cells(self, cid: str, content: dict, changes) -> bool:
+        """按单元格变更更新该子表的贡献；变更不适用于当前物化状态时返回 False，由调用方整表更新。"""
+        sub_data = select_child_payload(self.table_id, content)
+        if sub_data is self.payloads.get(cid):
+            return True  # 参与汇总的快照没有变化
+        if cid not in self.contribs or self.payloads.get(cid) is not changes.base or sub_data is not changes.snapshot:
+            return False
+        self._fit_all()
+        metric_index, field_index = self.layout.metric_index, self.layout.field_index
+        if any(metric_index.get(m) is None or field_index.get(f) is None for m, f, _ in changes.cells):
+            return False
+        rows = {row["metricId"]: row for row in sub_data["tableData"] if isinstance(row, dict) and row.get("metricId")}
+        excluded, calculated, summable_fields = self._static_masks(cid)
+        values, floats = (a.copy() for a in self.contribs[cid])
+        for metric_id, field_id, cell in changes.cells:
+            i, j = metric_index[metric_id], field_index[field_id]
+            value = cell.get("value", 0)
+            keep = (isinstance(value, (int, float)) and bool(summable_fields[j]) and not excluded[i]
+                    and not (calculated[i] and not rows[metric_id].get("force")))
+            new_value = float(value) if keep else 0.0
+            new_float = 1 if keep and isinstance(value, float) else 0
+            self.sums[i, j] += new_value - values[i, j]
+            self.float_counts[i, j] += new_float - floats[i, j]
+            values[i, j] = new_value
+            floats[i, j] = new_float
+        self.contribs[cid] = (values, floats)
+        self.payloads[cid] = sub_data
+        self._update_skeleton(cid)
+        return True
+
+    def _update_skeleton(self, changed: Optional[str]):
+        first = next((c for c in self.children if self.payloads.get(c)), None)
+        if first != self.skeleton_source or changed is None or first == changed:
+            self.skeleton_source = first
+            self.skeleton = self._make_skeleton(self.payloads[first]) if first else None
+
+    def _make_skeleton(self, sub_data: dict) -> dict:
+        rows = sub_data.get("tableData", [])
+        skeleton = {k: v for k, v in sub_data.items() if k != "tableData"}
+        skeleton = copy.deepcopy(skeleton)
+        skeleton["submittedAt"] = None
+        skeleton["submittedBy"] = None
+        if skeleton.get("table"):
+            skeleton["table"]["id"] = self.table_config.get("id")
+            skeleton["table"]["name"] = self.table_config.get("name")
+        skeleton_rows = []
+        for row in rows:
+            if row.get("metricId") in self.exclusions:
+                skeleton_rows.append(copy.deepcopy(row))
+                continue
+            clean_row = copy.deepcopy({k: v for k, v in row.items() if k != "values"})
+            clean_row["values"] = [
+                {"fieldId": cell.get("fieldId"), "value": cell.get("value") if cell.get("fieldId") in (1001, 1002) else 0}
+                for cell in row.get("values", [])
+            ]
+            skeleton_rows.append(clean_row)
+        skeleton["tableData"] = skeleton_rows
+        return skeleton
+
+    def build(self) -> Optional[dict]:
+        if self.skeleton is None:
+            return None
+        payload = {k: copy.deepcopy(v) for k, v in self.skeleton.items() if k != "tableData"}
+        # 响应边界：矩阵一次性转回 Python 数值，仅对骨架中的单元格取值
+        self._fit_all()
+        sums = self.sums.tolist()
+        float_counts = self.float_counts.tolist()
+        metric_index = self.layout.metric_index
+        field_index = self.layout.field_index
+        rows = []
+        for row in self.skeleton["tableData"]:
+            metric_id = row.get("metricId")
+            if not metric_id or metric_id in self.exclusions:
+                rows.append(copy.deepcopy(row))
+                continue
+            i = metric_index.get(metric_id)
+            new_row = {k: v for k, v in row.items() if k != "values"}
+            values = []
+            for cell in row["values"]:
+                field_id = cell["fieldId"]
+                value = cell["value"]
+                if field_id and field_id not in CALCULATED_FIELD_IDS and _is_number(value):
+                    j = field_index.get(field_id)
+                    if i is not None and j is not None:
+                        total = sums[i][j]
+                        # 参与求和的都是整数时保持整数类型
+                        value = value + (total if float_counts[i][j] else int(total))
+                values.append({"fieldId": field_id, "value": value})
+            new_row["values"] = values
+            rows.append(new_row)
+        payload["tableData"] = rows
+        return payload
+
+
+class _GroupSummaryView:
+    """表0：各单位的“本期计划/同期完成”分列展示，供热公司列为 9、10 两表之和。"""
+
+    def __init__(self, table_config: dict, report_template: list, field_config: list, tz):
+        self.table_config = table_config
+        self.report_template = report_template
+        self.field_config = field_config
+        self.tz = tz
+        key_to_plan = {f['name'].split('.')[0]: f['id'] for f in field_config if '.plan' in f['name']}
+        key_to_same = {f['name'].split('.')[0]: f['id'] for f in field_config if '.samePeriod' in f['name']}
+        # column: (sources, plan_field_id, same_period_field_id, merged)
+        self.columns = []
+        for sub_key, sub_id in table_config.get("subsidiaries", {}).items():
+            plan_id = key_to_plan.get(sub_key)
+            same_id = key_to_same.get(sub_key)
+            if not plan_id or not same_id:
+                continue
+            merged = sub_key in TABLE0_MERGED_SOURCES
+            sources = TABLE0_MERGED_SOURCES[sub_key] if merged else (str(sub_id),)
+            self.columns.append((sources, plan_id, same_id, merged))
+        self.source_values: dict[tuple, dict] = {}
+        self.payloads: dict[str, Optional[dict]] = {}
+        # field_id -> {metric_id: value}
+        self.grid: dict[int, dict] = {}
+
+    def sources(self):
+        seen = []
+        for sources, _, _, _ in self.columns:
+            for sid in sources:
+                if sid not in seen:
+                    seen.append(sid)
+        return seen
+
+    @staticmethod
+    def _extract(sub_data: Optional[dict], merged: bool) -> dict:
+        values: dict = {}
+        if not sub_data:
+            return values
+        for row in sub_data.get("tableData", []):
+            metric_id = row.get("metricId")
+            if not metric_id:
+                continue
+            plan_val = 0.0
+            same_period_val = 0.0
+            for cell in row.get("values", []):
+                field_id = cell.get("fieldId")
+                value = cell.get("value", 0) if _is_number(cell.get("value")) else 0
+                if field_id == 1003:
+                    plan_val = plan_val + value if merged else value
+                elif field_id == 1004:
+                    same_period_val = same_period_val + value if merged else value
+            if merged and metric_id in values:
+                prev = values[metric_id]
+                values[metric_id] = (prev[0] + plan_val, prev[1] + same_period_val)
+            else:
+                values[metric_id] = (plan_val, same_period_val)
+        return values
+
+    def rebuild(self, contents: dict):
+        for sid in self.sources():
+            self.update_source(sid, contents.get(sid))
+
+    def update_source(self, sid: str, content: dict):
+        sub_data = select_latest_payload(content, self.tz)
+        self.payloads[sid] = sub_data
+        for sources, plan_id, same_id, merged in self.columns:
+            if sid not in sources:
+                continue
+            self.source_values[(sid, merged)] = self._extract(sub_data, merged)
+            # 仅重写受影响的这一列，与单位数量无关
+            plan_col: dict = {}
+            same_col: dict = {}
+            for source in sources:
+                for metric_id, (plan_val, same_val) in self.source_values.get((source, merged), {}).items():
+                    if merged:
+                        plan_col[metric_id] = plan_col.get(metric_id, 0.0) + plan_val
+                        same_col[metric_id] = same_col.get(metric_id, 0.0) + same_val
+                    else:
+                        plan_col[metric_id] = plan_val
+                        same_col[metric_id] = same_val
+            self.grid[plan_id] = plan_col
+            self.grid[same_id] = same_col
+
+    def update_cells(self, sid: str, content: dict, changes) -> bool:
+        """只重新提取变化单元格所在的指标行；不适用时返回 False，由调用方整表更新。"""
+        sub_data = select_latest_payload(content, self.tz)
+        if sub_data is self.payloads.get(sid):
+            return True
+        if sid not in self.payloads or self.payloads[sid] is not changes.base or sub_data is not changes.snapshot:
+            return False
+        self.payloads[sid] = sub_data
+        metric_ids = {m for m, f, _ in changes.cells if f in (1003, 1004)}
+        if not metric_ids:
+            return True
+        rows = [row for row in sub_data.get("tableData", []) if row.get("metricId") in metric_ids]
+        for sources, plan_id, same_id, merged in self.columns:
+            if sid not in sources:
+                continue
+            values = dict(self.source_values.get((sid, merged), {}))
+            for metric_id in metric_ids:
+                values.pop(metric_id, None)
+            values.update(self._extract({"tableData": rows}, merged))
+            self.source_values[(sid, merged)] = values
+            plan_col = dict(self.grid.get(plan_id, {}))
+            same_col = dict(self.grid.get(same_id, {}))
+            for metric_id in metric_ids:
+                found = [self.source_values[(s, merged)][metric_id] for s in sources
+                         if metric_id in self.source_values.get((s, merged), {})]
+                if not found:
+                    plan_col.pop(metric_id, None)
+                    same_col.pop(metric_id, None)
+                elif merged:
+                    plan_col[metric_id] = sum((v[0] for v in found), 0.0)
+                    same_col[metric_id] = sum((v[1] for v in found), 0.0)
+                else:
+                    plan_col[metric_id], same_col[metric_id] = found[-1]
+            self.grid[plan_id] = plan_col
+            self.grid[same_id] = same_col
+        return True
+
+    def build(self) -> dict:
+        table_data = []
+        grid = self.grid
+        for row_template in self.report_template:
+            metric_id = row_template['id']
+            new_row = {
+                "metricId": metric_id,
+                "name": row_template['name'],
+                "unit": row_template['unit'],
+                "values": []
+            }
+            for field in self.field_config:
+                field_id = field['id']
+                if field_id == 1001:
+                    value = row_template['name']
+                elif field_id == 1002:
+                    value = row_template['unit']
+                else:
+                    value = grid.get(field_id, {}).get(metric_id, 0)
+                new_row["values"].append({"fieldId": field_id, "value": value})
+            table_data.append(new_row)
+        return {
+            "table": {"id": self.table_config.get("id"), "name": self.table_config.get("name")},
+            "tableData": table_data,
+            "submittedAt": None,
+            "submittedBy": None
+        }
+
+
+class SummaryAggregator:
+    """按 (project_id, table_id) 维护汇总表的物化视图。
+
+    read_doc(project_id, table_id) 返回（缓存的）表文档；
+    doc_signature(project_id, table_id) 返回不读取文档即可得到的存储端签名（TableStore.signature），
+    文档不存在时为 None。
+    list_formulas / group_formulas 为列表汇总表 / 表0 的公式计划，为 None 时不做服务端公式计算。
+    hits / misses 统计 get() 直接返回已构建结果与重新构建的次数。
+    """
+
+    def __init__(self, all_tables: dict, report_template: list, group_field_config: list,
+                 read_doc: Callable, doc_signature: Callable, tz,
+                 rebuild_every: int = DEFAULT_REBUILD_EVERY,
+                 list_formulas: Optional[FormulaPlan] = None,
+                 group_formulas: Optional[FormulaPlan] = None):
+        self.all_tables = all_tables
+        self.report_template = report_template
+        self.group_field_config = group_field_config
+        self.read_doc = read_doc
+        self.doc_signature = doc_signature
+        self.tz = tz
+        self.rebuild_every = rebuild_every
+        self.list_formulas = list_formulas
+        self.group_formulas = group_formulas
+        self._views: dict[tuple, dict] = {}
+        # 每个视图一把锁，不同汇总表的构建与增量更新可以并行；_lock 只保护两个字典本身
+        self._view_locks: dict[tuple, threading.RLock] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        # 子表 -> 读取它的汇总表；汇总表 -> 它读取的子表
+        self.dependents: dict[str, list[str]] = {}
+        self._sources: dict[str, list[str]] = {}
+        for table_id in all_tables:
+            if not self.is_summary(table_id):
+                continue
+            self._sources[table_id] = list(self._new_view(table_id).sources())
+            for sid in self._sources[table_id]:
+                self.dependents.setdefault(sid, []).append(table_id)
+
+    def is_summary(self, table_id: str) -> bool:
+        table_config = self.all_tables.get(table_id)
+        if not table_config:
+            return False
+        if table_id == '0':
+            return True
+        return table_config.get("type") == "summary" and isinstance(table_config.get("subsidiaries"), list) and bool(table_config.get("subsidiaries"))
+
+    def sources(self, table_id: str) -> list:
+        """构建该汇总表需要读取的文档：各子表及汇总表自身（覆盖层）。"""
+        if table_id not in self._sources:
+            return []
+        return self._sources[table_id] + [table_id]
+
+    def _new_view(self, table_id: str):
+        table_config = self.all_tables[table_id]
+        if table_id == '0':
+            return _GroupSummaryView(table_config, self.report_template, self.group_field_config, self.tz)
+        return _ListSummaryView(table_id, table_config, self.all_tables, [row['id'] for row in self.report_template])
+
+    def _view_lock(self, project_id: str, table_id: str) -> threading.RLock:
+        key = (project_id, table_id)
+        with self._lock:
+            lock = self._view_locks.get(key)
+            if lock is None:
+                lock = self._view_locks[key] = threading.RLock()
+            return lock
+
+    def _state(self, project_id: str, table_id: str) -> dict:
+        """调用方持有该视图的锁。"""
+        key = (project_id, table_id)
+        with self._lock:
+            state = self._views.get(key)
+        if state is None or state["deltas"] >= self.rebuild_every:
+            state = {"table": table_id, "view": self._new_view(table_id), "signatures": {}, "deltas": 0, "version": 0,
+                     "built": None}
+            with self._lock:
+                self._views[key] = state
+        return state
+
+    def _signature(self, project_id: str, sid: str, snapshot: Optional[dict] = None):
+        if snapshot is not None and sid in snapshot:
+            return snapshot[sid][1]
+        return self.doc_signature(project_id, sid)
+
+    def _read_source(self, project_id: str, sid: str, snapshot: Optional[dict] = None) -> tuple:
+        """(文档, 签名)。先取签名再读文档：两者之间发生的写入只会让下次比对时多更新一次，
+        而不会把旧内容记在新签名下。snapshot 中已有的文档直接使用。"""
+        if snapshot is not None and sid in snapshot:
+            return snapshot[sid]
+        signature = self.doc_signature(project_id, sid)
+        return self.read_doc(project_id, sid), signature
+
+    def _refresh_source(self, project_id: str, state: dict, sid: str, force: bool = False,
+                        snapshot: Optional[dict] = None, changes=None) -> bool:
+        if not force and state["signatures"].get(sid, ()) == self._signature(project_id, sid, snapshot):
+            return False
+        content, signature = self._read_source(project_id, sid, snapshot)
+        if sid in state["signatures"]:
+            state["deltas"] += 1
+        state["signatures"][sid] = signature
+        mode = "cells"
+        with metrics.span("aggregate.refresh"):
+            if changes is None or not state["view"].update_cells(sid, content, changes):
+                mode = "source"
+                state["view"].update_source(sid, content)
+        metrics.AGGREGATION_REFRESHES.inc(table=state["table"], mode=mode)
+        state["version"] += 1
+        return True
+
+    def _load_all(self, project_id: str, state: dict, snapshot: Optional[dict] = None):
+        contents = {}
+        for sid in state["view"].sources():
+            contents[sid], state["signatures"][sid] = self._read_source(project_id, sid, snapshot)
+        with metrics.span("aggregate.rebuild"):
+            state["view"].rebuild(contents)
+        metrics.AGGREGATION_REFRESHES.inc(len(contents), table=state["table"], mode="rebuild")
+        state["version"] += 1
+
+    def notify(self, project_id: str, table_id: str, changes=None):
+        """子表写入后调用：把该子表的增量立即应用到已物化的上级汇总表。
+        changes 为单元格级修改的 CellChanges，给出时只更新变化的单元格。"""
+        for parent_id in self.dependents.get(str(table_id), []):
+            with self._view_lock(project_id, parent_id):
+                with self._lock:
+                    state = self._views.get((project_id, parent_id))
+                if state is not None:
+                    self._refresh_source(project_id, state, str(table_id), changes=changes)
+
+    def invalidate(self, project_id: Optional[str] = None):
+        with self._lock:
+            if project_id is None:
+                self._views.clear()
+            else:
+                for key in [k for k in self._views if k[0] == project_id]:
+                    del self._views[key]
+
+    def get(self, project_id: str, table_id: str, snapshot: Optional[dict] = None) -> dict:
+        """snapshot 为 {table_id: (文档, 签名)}，批量读取时多张汇总表共用同一份已读取的文档。"""
+        with self._view_lock(project_id, table_id):
+            state = self._state(project_id, table_id)
+            view = state["view"]
+            if not state["signatures"]:
+                self._load_all(project_id, state, snapshot)
+            for sid in view.sources():
+                self._refresh_source(project_id, state, sid, snapshot=snapshot)
+            own_content, own_signature = self._read_source(project_id, table_id, snapshot)
+            build_key = (state["version"], own_signature)
+            built = state["built"]
+            metrics.AGGREGATION_FANOUT.set(len(self.sources(table_id)), table=table_id)
+            if built is not None and built[0] == build_key:
+                self.hits += 1
+                return built[1]
+            self.misses += 1
+            result = self._build(table_id, view, own_content)
+            state["built"] = (build_key, result)
+            return result
+
+    def _build(self, table_id: str, view, own_content: dict) -> dict:
+        with metrics.span("aggregate.build"):
+            payload = view.build()
+            if payload is not None:
+                apply_summary_overlay(payload, own_content)
+        if payload is None:
+            return {}
+        formulas = self.group_formulas if table_id == '0' else self.list_formulas
+        if formulas is not None:
+            with metrics.span("aggregate.formulas"):
+                formulas.apply(payload["tableData"])
+        return {"submit": payload, "explanationSummary": []}
+
+    def build_detached(self, table_id: str, contents: dict) -> dict:
+        """不经物化视图，直接由 contents（{table_id: 文档}，含汇总表自身）构建一次汇总结果，
+        用于读取历史时刻的汇总表；缺少的文档按空文档处理。"""
+        view = self._new_view(table_id)
+        with metrics.span("aggregate.rebuild"):
+            view.rebuild({sid: contents.get(sid) or {} for sid in view.sources()})
+        return self._build(table_id, view, contents.get(table_id) or {})
@@ -0,0 +1,134 @@
+"""标准库 json 与 orjson（fast_json）的序列化对比：表0（汇总）与一张子表。
+
+  python benchmarks/json_codec.py [--data-dir DIR] [--project ID] [--tables 0 9] [--repeat 30] [--json out.json]
+
+对每张表测量：
+- response.dumps：GET data/table 的响应体序列化（原为 jsonable_encoder + json.dumps）；
+- request.loads：同一响应体的解析（提交请求体的解析与之相同）；
+- document.dumps / document.loads：表文档按紧凑格式编码落盘与读取解码；
+  document.dumps 另列出旧的 json.dumps(indent=4) 作为参照。
+
+数据目录中的表文档先复制到临时目录再加载应用，不会改动原目录。
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+import fast_json  # noqa: E402
+from snapshot_codec import decode_document, encode_document  # noqa: E402
+
+DEFAULT_DATA_DIR = BACKEND_DIR.parent / "backend_data"
+DEFAULT_PROJECT = "heating_plan_2025-2026"
+
+
+def _timed(func, arg, repeat: int) -> dict:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(arg)
+        samples.append((time.perf_counter() - start) * 1000)
+    return {"median_ms": statistics.median(samples), "min_ms": min(samples)}
+
+
+def _codecs() -> dict:
+    codecs = {"json": (fast_json.std_dumps, fast_json.std_loads)}
+    if fast_json.orjson is not None:
+        codecs["orjson"] = (fast_json.orjson_dumps, fast_json.orjson_loads)
+    return codecs
+
+
+def bench_table(table_id: str, response, document: dict, repeat: int) -> list:
+    results = []
+
+    def record(op: str, impl: str, func, arg, size: int):
+        results.append({"table": table_id, "op": op, "impl": impl, "bytes": size, **_timed(func, arg, repeat)})
+
+    encoded = encode_document(document)
+    for impl, (dumps, loads) in _codecs().items():
+        body = dumps(response)
+        stored = dumps(encoded)
+        record("response.dumps", impl, dumps, response, len(body))
+        record("request.loads", impl, loads, body, len(body))
+        record("document.dumps", impl, lambda doc, dumps=dumps: dumps(encode_document(doc)), document, len(stored))
+        record("document.loads", impl, lambda raw, loads=loads: decode_document(loads(raw)), stored, len(stored))
+        if loads(body) != json.loads(fast_json.std_dumps(response)) or decode_document(loads(stored)) != document:
+            raise AssertionError(f"{impl} round trip differs for table {table_id}")
+    indent4 = json.dumps(document, ensure_ascii=False, indent=4).encode("utf-8")
+    record("document.dumps", "json-indent4",
+           lambda doc: json.dumps(doc, ensure_ascii=False, indent=4).encode("utf-8"), document, len(indent4))
+    return results
+
+
+def load_app(data_dir: Path, project_id: str):
+    """把项目的表文档复制到临时 DATA_DIR 后导入 main。"""
+    tmp = Path(tempfile.mkdtemp(prefix="bench-json-"))
+    source = data_dir / f"{project_id}_data"
+    target = tmp / f"{project_id}_data"
+    target.mkdir(parents=True)
+    for path in source.glob("*.json"):
+        shutil.copy2(path, target / path.name)
+    os.environ["DATA_DIR_PATH"] = str(tmp)
+    import main
+    return main, tmp
+
+
+def print_table(results: list):
+    rows = {}
+    for r in results:
+        rows.setdefault((r["table"], r["op"]), {})[r["impl"]] = r
+    print(f"{'table':>5}  {'operation':<15} {'impl':<13} {'bytes':>10} {'median ms':>10} {'min ms':>9} {'vs json':>8}")
+    for (table_id, op), impls in rows.items():
+        baseline = impls.get("json", {}).get("median_ms")
+        for impl, r in impls.items():
+            ratio = f"{baseline / r['median_ms']:.1f}x" if baseline and r["median_ms"] else ""
+            print(f"{table_id:>5}  {op:<15} {impl:<13} {r['bytes']:>10} {r['median_ms']:>10.2f} {r['min_ms']:>9.2f} {ratio:>8}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare stdlib json and orjson on table payloads")
+    parser.add_argument("--data-dir", type=Path, default=Path(os.getenv("DATA_DIR_PATH") or DEFAULT_DATA_DIR))
+    parser.add_argument("--project", default=DEFAULT_PROJECT)
+    parser.add_argument("--tables", nargs="+", default=["0", "9"], help="table ids (default: table 0 and subsidiary 9)")
+    parser.add_argument("--repeat", type=int, default=30)
+    parser.add_argument("--json", type=Path, help="write results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    app, tmp = load_app(args.data_dir, args.project)
+    try:
+        results = []
+        for table_id in args.tables:
+            response = asyncio.run(app.get_table_data_recursive(args.project, table_id))
+            document = app.STORE.read(args.project, table_id)
+            results.extend(bench_table(table_id, response, document, args.repeat))
+    finally:
+        app.ACTIVITY_LOG.close()
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    print_table(results)
+    if fast_json.orjson is None:
+        print("orjson is not installed; only the stdlib path was measured.")
+    if args.json:
+        report = {
+            "benchmark": "json_codec",
+            "python": platform.python_version(),
+            "orjson": getattr(fast_json.orjson, "__version__", None),
+            "project": args.project,
+            "repeat": args.repeat,
+            "results": results,
+        }
+        args.json.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
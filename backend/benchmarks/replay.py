@@ -0,0 +1,402 @@
+"""按 logs/activity.log 回放真实的请求序列，对本地启动的服务做压力测试。
+
+  python benchmarks/replay.py [--data-dir DIR] [--log activity.log] [--url http://host:port]
+                              [--speedup 60] [--concurrency 8] [--workers 1] [--loops 1]
+                              [--since 2025-09-20] [--until 2025-09-30] [--actions load_table submit ...]
+                              [--limit N] [--json out.json]
+
+回放的操作：load_table → GET data/table；submit / save_draft → POST（请求体由该表当前的 submit/temp 快照
+随机扰动输入单元格生成）；approve / unapprove → POST；login → POST /login（密码取自数据目录的 auth.json）。
+retrieve_draft 与 load_table 属于同一次请求，不单独回放；其它操作跳过。请求头 X-User-Name 为日志中的用户。
+已轮转的 activity.*.log.gz 段与当前文件一起读入，按时间排序。
+
+请求按日志中的时间间隔除以 --speedup 发出（0 表示不等待，尽快发出），由 --concurrency 个连接并发执行；
+--loops 把同一段日志首尾相接重复多次。结果给出吞吐量、各操作的延迟分位数、4xx 与错误（5xx、连接失败）比例，
+以及请求实际发出时间相对计划的滞后（滞后持续增长说明服务跟不上该倍速）。
+
+未给出 --url 时，把数据目录中的 auth.json 与各 *_data 目录顶层的文件复制到临时目录，
+在其上启动 uvicorn（--workers 个进程），结束后删除，不会改动原数据。
+给出 --url 时请求直接发往该服务，提交与批准会真实写入，只应指向测试实例。
+"""
+import argparse
+import gzip
+import http.client
+import json
+import math
+import os
+import platform
+import queue
+import random
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import NamedTuple, Optional
+from urllib.parse import quote, urlsplit
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from activity_log import segment_paths  # noqa: E402
+
+DEFAULT_DATA_DIR = BACKEND_DIR.parent / "backend_data"
+REPLAYED = ("load_table", "submit", "save_draft", "approve", "unapprove", "login")
+PAYLOAD_VARIANTS = 4
+META_KEYS = ("submittedAt", "submittedBy", "approvedAt", "approvedBy", "savedAt")
+
+
+class Entry(NamedTuple):
+    at: float          # 日志时间（秒）
+    action: str
+    username: Optional[str]
+    project_id: Optional[str]
+    table_id: Optional[str]
+
+
+class Call(NamedTuple):
+    offset: float      # 相对回放开始的计划发出时间（秒）
+    action: str
+    method: str
+    path: str
+    headers: dict
+    body: Optional[bytes]
+
+
+def _log_lines(log_path: Path):
+    for segment in segment_paths(log_path):
+        with gzip.open(segment, "rb") as f:
+            yield from f
+    if log_path.exists():
+        with open(log_path, "rb") as f:
+            yield from f
+
+
+def read_entries(log_path: Path, actions, since: Optional[float], until: Optional[float]) -> tuple:
+    """返回 (按时间排序的 Entry 列表, {跳过的操作: 条数})。"""
+    entries, skipped = [], {}
+    for raw in _log_lines(log_path):
+        try:
+            record = json.loads(raw)
+            at = datetime.fromisoformat(record["timestamp"]).timestamp()
+        except (ValueError, KeyError, TypeError):
+            continue
+        action = record.get("action")
+        if action not in actions:
+            skipped[action] = skipped.get(action, 0) + 1
+            continue
+        if (since is not None and at < since) or (until is not None and at > until):
+            continue
+        details = record.get("details") if isinstance(record.get("details"), dict) else {}
+        project_id, table_id = details.get("projectId"), details.get("tableId")
+        if action != "login" and not (project_id and table_id is not None):
+            skipped[action] = skipped.get(action, 0) + 1
+            continue
+        entries.append(Entry(at, action, record.get("username"), project_id,
+                             None if table_id is None else str(table_id)))
+    entries.sort(key=lambda e: e.at)
+    return entries, skipped
+
+
+def _perturbed(snapshot: dict, rng: random.Random) -> bytes:
+    rows = []
+    for row in snapshot.get("tableData") or []:
+        if isinstance(row, dict) and isinstance(row.get("values"), list):
+            row = {**row, "values": [
+                {**cell, "value": round(cell["value"] * (1 + rng.uniform(-0.01, 0.01)), 4)}
+                if isinstance(cell, dict) and (cell.get("fieldId") or 0) >= 2001
+                and isinstance(cell.get("value"), (int, float)) and not isinstance(cell.get("value"), bool)
+                else cell
+                for cell in row["values"]
+            ]}
+        rows.append(row)
+    payload = {k: v for k, v in snapshot.items() if k not in META_KEYS}
+    payload["tableData"] = rows
+    return json.dumps(payload, ensure_ascii=False).encode("utf-8")
+
+
+class Client:
+    """单个 keep-alive 连接；出错后下次请求重新连接。"""
+
+    def __init__(self, base_url: str, timeout: float):
+        parts = urlsplit(base_url)
+        self.host, self.port = parts.hostname, parts.port or (443 if parts.scheme == "https" else 80)
+        self.https = parts.scheme == "https"
+        self.prefix = parts.path.rstrip("/")
+        self.timeout = timeout
+        self.conn = None
+
+    def request(self, method: str, path: str, headers: dict, body: Optional[bytes]) -> tuple:
+        """(状态码, 响应体)；连接失败时抛出 OSError / http.client.HTTPException。
+
+        复用的连接可能已被服务端按空闲超时关闭，此时换新连接重试一次。
+        """
+        reused = self.conn is not None
+        if self.conn is None:
+            cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+            self.conn = cls(self.host, self.port, timeout=self.timeout)
+        try:
+            self.conn.request(method, self.prefix + path, body=body, headers=headers)
+            response = self.conn.getresponse()
+            return response.status, response.read()
+        except (OSError, http.client.HTTPException) as e:
+            self.conn.close()
+            self.conn = None
+            if reused and isinstance(e, (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError)):
+                return self.request(method, path, headers, body)
+            raise
+
+
+def build_calls(entries: list, client: Client, users: dict, loops: int, speedup: float, seed: int) -> tuple:
+    """把日志条目转换为请求；返回 (请求列表, {跳过原因: 条数})。提交类请求体先从服务读取各表当前数据生成。"""
+    rng = random.Random(seed)
+    payloads: dict = {}
+    skipped: dict = {}
+    for e in entries:
+        key = (e.project_id, e.table_id)
+        if e.action in ("submit", "save_draft") and key not in payloads:
+            status, body = client.request("GET", f"/project/{quote(e.project_id)}/data/table/{quote(e.table_id)}", {}, None)
+            doc = json.loads(body) if status == 200 and body else {}
+            snapshot = (doc.get("submit") or doc.get("temp")) if isinstance(doc, dict) else None
+            payloads[key] = [_perturbed(snapshot, rng) for _ in range(PAYLOAD_VARIANTS)] if snapshot else None
+
+    calls = []
+    span = (entries[-1].at - entries[0].at) if entries else 0.0
+    for loop in range(loops):
+        for n, e in enumerate(entries):
+            offset = (e.at - entries[0].at + loop * (span + 1)) / speedup if speedup > 0 else 0.0
+            headers = {"X-User-Name": e.username} if e.username else {}
+            if e.action == "login":
+                user = users.get(e.username)
+                if not user:
+                    skipped["login (unknown user)"] = skipped.get("login (unknown user)", 0) + 1
+                    continue
+                body = json.dumps({"username": e.username, "password": user.get("password", "")}).encode("utf-8")
+                calls.append(Call(offset, e.action, "POST", "/login", {"Content-Type": "application/json"}, body))
+                continue
+            base = f"/project/{quote(e.project_id)}"
+            if e.action == "load_table":
+                calls.append(Call(offset, e.action, "GET", f"{base}/data/table/{quote(e.table_id)}", headers, None))
+            elif e.action in ("submit", "save_draft"):
+                variants = payloads.get((e.project_id, e.table_id))
+                if not variants:
+                    skipped[f"{e.action} (no stored data)"] = skipped.get(f"{e.action} (no stored data)", 0) + 1
+                    continue
+                calls.append(Call(offset, e.action, "POST", f"{base}/table/{quote(e.table_id)}/{e.action}",
+                                  {**headers, "Content-Type": "application/json"}, variants[n % len(variants)]))
+            else:
+                calls.append(Call(offset, e.action, "POST", f"{base}/table/{quote(e.table_id)}/{e.action}", headers, None))
+    return calls, skipped
+
+
+def replay(calls: list, base_url: str, concurrency: int, timeout: float) -> tuple:
+    """按计划时间发出请求；返回 ([(action, status, 延迟秒, 滞后秒)], 总耗时秒)。status 为 0 表示连接失败。"""
+    pending: "queue.Queue" = queue.Queue()
+    results = []
+    lock = threading.Lock()
+
+    def worker():
+        client = Client(base_url, timeout)
+        while True:
+            item = pending.get()
+            if item is None:
+                return
+            call, due = item
+            start = time.perf_counter()
+            try:
+                status, _ = client.request(call.method, call.path, call.headers, call.body)
+            except (OSError, http.client.HTTPException):
+                status = 0
+            elapsed = time.perf_counter() - start
+            with lock:
+                results.append((call.action, status, elapsed, max(0.0, start - due)))
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    began = time.perf_counter()
+    for call in calls:
+        due = began + call.offset
+        delay = due - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        pending.put((call, due))
+    for _ in threads:
+        pending.put(None)
+    for t in threads:
+        t.join()
+    return results, time.perf_counter() - began
+
+
+def _percentile(ordered: list, q: float) -> float:
+    return ordered[max(0, math.ceil(q * len(ordered)) - 1)] if ordered else 0.0
+
+
+def summarize(results: list, duration: float) -> dict:
+    def group(rows: list) -> dict:
+        latencies = sorted(r[2] * 1000 for r in rows)
+        statuses: dict = {}
+        for r in rows:
+            statuses[str(r[1])] = statuses.get(str(r[1]), 0) + 1
+        errors = sum(1 for r in rows if r[1] == 0 or r[1] >= 500)
+        client_errors = sum(1 for r in rows if 400 <= r[1] < 500)
+        return {
+            "count": len(rows),
+            "errors": errors,
+            "error_rate": errors / len(rows) if rows else 0.0,
+            "client_errors": client_errors,
+            "statuses": statuses,
+            "p50_ms": _percentile(latencies, 0.50),
+            "p90_ms": _percentile(latencies, 0.90),
+            "p99_ms": _percentile(latencies, 0.99),
+            "max_ms": latencies[-1] if latencies else 0.0,
+            "mean_ms": statistics.fmean(latencies) if latencies else 0.0,
+        }
+
+    lags = sorted(r[3] * 1000 for r in results)
+    by_action: dict = {}
+    for r in results:
+        by_action.setdefault(r[0], []).append(r)
+    return {
+        "requests": len(results),
+        "duration_s": duration,
+        "throughput_rps": len(results) / duration if duration else 0.0,
+        "overall": group(results),
+        "actions": {action: group(rows) for action, rows in sorted(by_action.items())},
+        "lag_ms": {"p50": _percentile(lags, 0.50), "p95": _percentile(lags, 0.95), "max": lags[-1] if lags else 0.0},
+    }
+
+
+def print_summary(summary: dict):
+    print(f"{summary['requests']} requests in {summary['duration_s']:.1f}s "
+          f"({summary['throughput_rps']:.1f} req/s), schedule lag p50 {summary['lag_ms']['p50']:.1f} ms "
+          f"p95 {summary['lag_ms']['p95']:.1f} ms max {summary['lag_ms']['max']:.1f} ms")
+    print(f"{'action':<12} {'count':>7} {'4xx':>6} {'errors':>7} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for action, s in list(summary["actions"].items()) + [("all", summary["overall"])]:
+        print(f"{action:<12} {s['count']:>7} {s['client_errors']:>6} {s['errors']:>7} "
+              f"{s['p50_ms']:>9.1f} {s['p90_ms']:>9.1f} {s['p99_ms']:>9.1f} {s['max_ms']:>9.1f}")
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(data_dir: Path, workers: int) -> tuple:
+    """复制数据目录并在其上启动 uvicorn；返回 (进程, base_url, 临时目录)。"""
+    tmp = Path(tempfile.mkdtemp(prefix="bench-replay-"))
+    if (data_dir / "auth.json").exists():
+        shutil.copy2(data_dir / "auth.json", tmp / "auth.json")
+    for project_dir in data_dir.glob("*_data"):
+        target = tmp / project_dir.name
+        target.mkdir()
+        for path in project_dir.iterdir():
+            if path.is_file():
+                shutil.copy2(path, target / path.name)
+    port = _free_port()
+    env = {**os.environ, "DATA_DIR_PATH": str(tmp)}
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 60
+    probe = Client(base_url, 5)
+    while True:
+        if process.poll() is not None:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise SystemExit(f"uvicorn exited with status {process.returncode}")
+        try:
+            if probe.request("GET", "/", {}, None)[0] == 200:
+                return process, base_url, tmp
+        except (OSError, http.client.HTTPException):
+            pass
+        if time.monotonic() > deadline:
+            process.terminate()
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise SystemExit("uvicorn did not become ready within 60s")
+        time.sleep(0.2)
+
+
+def _timestamp(value: Optional[str]) -> Optional[float]:
+    return datetime.fromisoformat(value).timestamp() if value else None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay logs/activity.log against a local backend")
+    parser.add_argument("--data-dir", type=Path, default=Path(os.getenv("DATA_DIR_PATH") or DEFAULT_DATA_DIR))
+    parser.add_argument("--log", type=Path, help="activity log to replay (default: DATA_DIR/logs/activity.log)")
+    parser.add_argument("--url", help="send requests to this server instead of starting one")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes for the local server")
+    parser.add_argument("--speedup", type=float, default=60.0, help="divide log time gaps by this factor (0: no waiting)")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--loops", type=int, default=1, help="replay the selected log window this many times")
+    parser.add_argument("--since", help="replay entries at or after this ISO time")
+    parser.add_argument("--until", help="replay entries at or before this ISO time")
+    parser.add_argument("--actions", nargs="+", default=list(REPLAYED), choices=REPLAYED)
+    parser.add_argument("--limit", type=int, help="replay at most this many log entries")
+    parser.add_argument("--timeout", type=float, default=60.0, help="per-request timeout in seconds")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", type=Path, help="write the summary as JSON to this file")
+    args = parser.parse_args(argv)
+
+    log_path = args.log or args.data_dir / "logs" / "activity.log"
+    entries, skipped = read_entries(log_path, set(args.actions), _timestamp(args.since), _timestamp(args.until))
+    if args.limit is not None:
+        entries = entries[:args.limit]
+    if not entries:
+        raise SystemExit(f"no replayable entries in {log_path}")
+    users: dict = {}
+    try:
+        with open(args.data_dir / "auth.json", "r", encoding="utf-8") as f:
+            users = {u.get("username"): u for u in json.load(f) if isinstance(u, dict)}
+    except (OSError, ValueError):
+        pass
+
+    process = tmp = None
+    base_url = args.url
+    if base_url is None:
+        process, base_url, tmp = start_server(args.data_dir, args.workers)
+    try:
+        calls, unplayable = build_calls(entries, Client(base_url, args.timeout), users, args.loops, args.speedup, args.seed)
+        skipped.update(unplayable)
+        span = calls[-1].offset if calls else 0.0
+        print(f"replaying {len(calls)} requests from {len(entries)} log entries against {base_url} "
+              f"(planned {span:.1f}s, speedup {args.speedup:g}, concurrency {args.concurrency})")
+        results, duration = replay(calls, base_url, args.concurrency, args.timeout)
+    finally:
+        if process is not None:
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    summary = summarize(results, duration)
+    print_summary(summary)
+    if skipped:
+        print("skipped: " + ", ".join(f"{action} x{n}" for action, n in sorted(skipped.items(), key=lambda kv: str(kv[0]))))
+    if args.json:
+        report = {
+            "benchmark": "replay",
+            "python": platform.python_version(),
+            "log": str(log_path),
+            "params": {"speedup": args.speedup, "concurrency": args.concurrency, "loops": args.loops,
+                       "workers": None if args.url else args.workers, "since": args.since, "until": args.until,
+                       "actions": args.actions, "limit": args.limit},
+            "skipped": skipped,
+            **summary,
+        }
+        args.json.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
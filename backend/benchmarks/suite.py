@@ -0,0 +1,243 @@
+"""报表后端的基准测试：在合成项目（见 synthetic.py）上计时主要的读写路径，结果可写成 JSON 供不同提交之间比较。
+
+  python benchmarks/suite.py [--projects 2] [--subsidiaries 11] [--regions 3] [--metrics 117] [--fields 14]
+                             [--history 200] [--store file|sqlite] [--rounds 20] [--only 表达式 ...]
+                             [--json out.json] [--compare base.json [--max-regression 0.2]]
+
+计时项：
+- get_table_0_data / get_table_data_recursive（表1、区域汇总表、单位表）：
+  cold 为清空文档缓存与汇总视图后的首次读取，warm 为无变化时的重复读取，
+  after_write 为每轮先（不计时）重写一张单位表的 submit 快照，再读取（汇总视图增量更新）；
+- get_table_statuses：全部表的状态；
+- _append_history_record：追加一条提交历史；
+- POST submit / approve（单位表与区域汇总表）、GET data/table/0：经 TestClient 的完整请求。
+
+应用在生成的临时目录上导入（DATA_DIR_PATH / CONFIG_DIR_PATH），不会读写真实数据。
+--compare 按名称对比 median_ms 并打印变化；同时给出 --max-regression 时，任一项变慢超过该比例则以状态 1 退出。
+"""
+import argparse
+import asyncio
+import copy
+import json
+import math
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from fnmatch import fnmatch
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import fast_json  # noqa: E402
+import synthetic  # noqa: E402
+
+
+def _stats(samples: list) -> dict:
+    ordered = sorted(samples)
+    return {
+        "rounds": len(samples),
+        "median_ms": statistics.median(ordered),
+        "mean_ms": statistics.fmean(ordered),
+        "min_ms": ordered[0],
+        "max_ms": ordered[-1],
+        "p95_ms": ordered[max(0, math.ceil(0.95 * len(ordered)) - 1)],
+        "stdev_ms": statistics.stdev(ordered) if len(ordered) > 1 else 0.0,
+    }
+
+
+class Runner:
+    def __init__(self, rounds: int, warmup: int, only: list):
+        self.rounds = rounds
+        self.warmup = warmup
+        self.only = only
+        self.results = []
+
+    def wanted(self, name: str) -> bool:
+        return not self.only or any(fnmatch(name, pattern) for pattern in self.only)
+
+    def measure(self, name: str, func, setup=None):
+        """setup（不计时）在每轮之前执行；func 返回协程时在事件循环中执行完毕再停止计时。"""
+        if not self.wanted(name):
+            return
+        samples = []
+        for n in range(self.warmup + self.rounds):
+            if setup is not None:
+                setup()
+            start = time.perf_counter()
+            func()
+            elapsed = (time.perf_counter() - start) * 1000
+            if n >= self.warmup:
+                samples.append(elapsed)
+        result = {"name": name, **_stats(samples)}
+        self.results.append(result)
+        print(f"{name:<52} {result['median_ms']:>10.3f} {result['p95_ms']:>10.3f} {result['min_ms']:>10.3f}")
+
+
+def load_app(dataset: synthetic.Dataset, store_kind: str):
+    os.environ["DATA_DIR_PATH"] = str(dataset.data_dir)
+    os.environ["CONFIG_DIR_PATH"] = str(dataset.config_dir)
+    os.environ["TABLE_STORE"] = store_kind
+    import main
+    return main
+
+
+def run(app, dataset: synthetic.Dataset, runner: Runner):
+    from fastapi.testclient import TestClient
+
+    loop = asyncio.new_event_loop()
+    project = dataset.projects[0]
+    leaf, region = dataset.leaves[0], dataset.regions[0]
+    all_ids = list(app.ALL_TABLES)
+    original = app.STORE.read(project, leaf)["submit"]
+
+    def call(coro_func, *args):
+        return lambda: loop.run_until_complete(coro_func(*args))
+
+    def cold():
+        app.AGGREGATOR.invalidate(project)
+        for tid in all_ids:
+            app.DOC_CACHE.invalidate((project, tid))
+
+    bump = {"n": 0}
+
+    def rewrite_leaf():
+        # 与整表提交相同：替换 submit 快照并通知汇总引擎
+        bump["n"] += 1
+        snapshot = copy.copy(original)
+        rows = list(snapshot["tableData"])
+        row = rows[bump["n"] % len(rows)]
+        rows[bump["n"] % len(rows)] = {**row, "values": [
+            {**cell, "value": (cell["value"] or 0) + 1} if cell["fieldId"] >= 2001 else cell for cell in row["values"]
+        ]}
+        snapshot["tableData"] = rows
+        snapshot["submittedAt"] = synthetic.BASE_TIME.isoformat()
+        app._update_data_file(project, leaf, "submit", snapshot)
+
+    reads = [("get_table_0_data", lambda: app.get_table_0_data(project))]
+    reads += [(f"get_table_data_recursive[{tid}]", lambda tid=tid: app.get_table_data_recursive(project, tid))
+              for tid in ("1", region, leaf)]
+    for name, read in reads:
+        runner.measure(f"{name}.cold", lambda read=read: loop.run_until_complete(read()), setup=cold)
+        runner.measure(f"{name}.warm", lambda read=read: loop.run_until_complete(read()))
+        runner.measure(f"{name}.after_write", lambda read=read: loop.run_until_complete(read()), setup=rewrite_leaf)
+
+    runner.measure("get_table_statuses", call(app.get_table_statuses, project, all_ids))
+    history_payload = {"submittedAt": synthetic.BASE_TIME.isoformat(), "submittedBy": synthetic.FILLER,
+                       "table": {"id": leaf, "name": app.ALL_TABLES[leaf]["name"], "template": synthetic.TEMPLATE_NAME}}
+    runner.measure("_append_history_record", lambda: app._append_history_record(project, leaf, history_payload, "submit"))
+
+    body = fast_json.dumps(original)
+    filler = {"X-User-Name": synthetic.FILLER["username"], "Content-Type": "application/json"}
+    admin = {"X-User-Name": synthetic.ADMIN["username"]}
+    with TestClient(app.app) as client:
+        def request(method: str, url: str, **kwargs):
+            def send():
+                response = client.request(method, url, **kwargs)
+                if response.status_code != 200:
+                    raise RuntimeError(f"{method} {url}: {response.status_code} {response.text[:200]}")
+            return send
+
+        runner.measure("POST submit", request("POST", f"/project/{project}/table/{leaf}/submit", content=body, headers=filler))
+        runner.measure("POST approve", request("POST", f"/project/{project}/table/{leaf}/approve", headers=admin))
+        # 区域汇总表的批准要求其下单位表均已批准
+        for tid in app.CHILDREN_MAP.get(region, []):
+            request("POST", f"/project/{project}/table/{tid}/approve", headers=admin)()
+        runner.measure("POST approve[summary]", request("POST", f"/project/{project}/table/{region}/approve", headers=admin))
+        runner.measure("GET data/table/0", request("GET", f"/project/{project}/data/table/0"))
+    loop.close()
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline_path: Path, report: dict, max_regression) -> int:
+    baseline = json.loads(baseline_path.read_text(encoding="utf-8"))
+    if baseline.get("params") != report["params"]:
+        print("warning: baseline was measured with different parameters")
+    before = {r["name"]: r["median_ms"] for r in baseline.get("results", [])}
+    regressions = []
+    print(f"\n{'benchmark':<52} {'base ms':>10} {'now ms':>10} {'change':>8}   ({baseline.get('commit')} -> {report['commit']})")
+    for r in report["results"]:
+        base = before.get(r["name"])
+        if base is None:
+            print(f"{r['name']:<52} {'':>10} {r['median_ms']:>10.3f}      new")
+            continue
+        change = (r["median_ms"] - base) / base if base else 0.0
+        flag = ""
+        if max_regression is not None and change > max_regression:
+            regressions.append(r["name"])
+            flag = "  REGRESSION"
+        print(f"{r['name']:<52} {base:>10.3f} {r['median_ms']:>10.3f} {change:>+8.1%}{flag}")
+    return 1 if regressions else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the reporting backend on synthetic projects")
+    defaults = synthetic.Scale()
+    for field in synthetic.Scale._fields:
+        parser.add_argument(f"--{field}", type=int, default=getattr(defaults, field))
+    parser.add_argument("--store", choices=["file", "sqlite"], default=os.getenv("TABLE_STORE", "file"))
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--only", nargs="+", default=[], help="glob patterns of benchmark names to run")
+    parser.add_argument("--json", type=Path, help="write results as JSON to this file")
+    parser.add_argument("--compare", type=Path, help="baseline JSON written by an earlier --json run")
+    parser.add_argument("--max-regression", type=float, help="with --compare: exit 1 if a median grows by more than this ratio")
+    parser.add_argument("--keep", action="store_true", help="keep the generated data directory")
+    args = parser.parse_args(argv)
+
+    scale = synthetic.Scale(**{field: getattr(args, field) for field in synthetic.Scale._fields})
+    if not 1 <= scale.regions <= scale.subsidiaries:
+        parser.error("--regions must be between 1 and --subsidiaries")
+    if scale.projects < 1 or scale.metrics < 1:
+        parser.error("--projects and --metrics must be positive")
+
+    root = Path(tempfile.mkdtemp(prefix="bench-suite-"))
+    try:
+        start = time.perf_counter()
+        dataset = synthetic.generate(root, scale, args.store)
+        generated = time.perf_counter() - start
+        print(f"generated {len(dataset.projects)} projects x {len(dataset.leaves)} tables "
+              f"({dataset.bytes / 1e6:.1f} MB) in {generated:.1f}s at {root}")
+        app = load_app(dataset, args.store)
+        runner = Runner(args.rounds, args.warmup, args.only)
+        print(f"{'benchmark':<52} {'median ms':>10} {'p95 ms':>10} {'min ms':>10}")
+        try:
+            run(app, dataset, runner)
+        finally:
+            app.ACTIVITY_LOG.close()
+    finally:
+        if args.keep:
+            print(f"data kept at {root}")
+        else:
+            shutil.rmtree(root, ignore_errors=True)
+
+    report = {
+        "benchmark": "suite",
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "json": fast_json.BACKEND,
+        "params": {**scale._asdict(), "store": args.store, "rounds": args.rounds, "warmup": args.warmup},
+        "dataset": {"tables": len(app.ALL_TABLES), "bytes": dataset.bytes, "generate_s": generated},
+        "results": runner.results,
+    }
+    if args.json:
+        args.json.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    if args.compare:
+        sys.exit(compare(args.compare, report, args.max_regression))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+"""按可调规模生成合成项目（供 benchmarks/suite.py 使用）。
+
+以 app/data 中的 menucopy.json / templatecopy.json / formulacopy.json 为原型，生成：
+
+- config/heating_plan_2025-2026_data/：菜单与模板。菜单为 表0（集团分单位）→ 表1（集团汇总）
+  → regions 张区域汇总表 → subsidiaries 张单位表（按顺序轮流归入各区域）；
+  指标取 templatecopy.json 的前 metrics 个，不足时追加普通输入指标；
+  子表的月度列取 formulacopy.json 中 subsidiaryFields 的前 fields 个，不足时追加，合计列公式随之重写；
+  表0 每个汇总表、单位各占“本期计划/同期完成/差异率”三列。
+- data/：auth.json（bench_filler / bench_admin）与 projects 个项目的表文档和操作历史，
+  经由 open_table_store 写入，存储类型与应用启动时的 TABLE_STORE 一致。
+  每张单位表都有 submit 快照，偶数序号的表另有 approved，每三张有一张带 temp；
+  每张单位表有 history 条历史记录。表1 与区域汇总表只有 submit（与实际数据一样整表覆盖聚合结果）。
+
+数值由 seed 决定，同一组参数生成的数据完全相同。
+"""
+import json
+import random
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import NamedTuple
+
+from doc_cache import DocumentCache
+from table_store import open_table_store
+
+SOURCE_CONFIG_DIR = Path(__file__).resolve().parent.parent / "app" / "data" / "heating_plan_2025-2026_data"
+CONFIG_SUBDIR = "heating_plan_2025-2026_data"
+PROJECT_PREFIX = "bench"
+TEMPLATE_NAME = "subsidiaryTemplate"
+
+FILLER = {"username": "bench_filler", "password": "password", "unit": "基准单位", "globalRole": "unit_filler"}
+ADMIN = {"username": "bench_admin", "password": "password", "unit": "集团公司", "globalRole": "super_admin"}
+
+BASE_TIME = datetime(2025, 9, 1, 8, 0, tzinfo=timezone(timedelta(hours=8)))
+HISTORY_ACTIONS = ("save_draft", "submit", "approve")
+
+
+class Scale(NamedTuple):
+    projects: int = 2
+    subsidiaries: int = 11
+    regions: int = 3
+    metrics: int = 117
+    fields: int = 14       # 子表的月度（计划/同期）列数，不含名称、单位与合计列
+    history: int = 200     # 每张单位表的历史记录数
+    seed: int = 1
+
+
+class Dataset(NamedTuple):
+    config_dir: Path
+    data_dir: Path
+    projects: list
+    leaves: list           # 单位表 id
+    regions: list          # 区域汇总表 id
+    bytes: int             # 数据目录的总字节数
+
+
+def _load(name: str):
+    with open(SOURCE_CONFIG_DIR / name, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write(path: Path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+def project_ids(scale: Scale) -> list:
+    return [f"{PROJECT_PREFIX}-{n + 1}" for n in range(scale.projects)]
+
+
+def build_fields(count: int, source: list) -> list:
+    """子表列：名称/单位等标签列、合计与差异率列，加 count 个月度列（计划、同期交替）。"""
+    head = [f for f in source if f["id"] < 1003]
+    monthly = [f for f in source if f.get("type") == "basic" and f["id"] >= 2001]
+    fields = monthly[:count]
+    for n in range(len(fields), count):
+        kind = "plan" if n % 2 == 0 else "samePeriod"
+        fields.append({"id": 2001 + n, "name": f"monthlyData.extra{n // 2 + 1}.{kind}", "type": "basic",
+                       "component": "input" if kind == "plan" else "display"})
+    plan = [f["id"] for f in fields if f["name"].endswith(".plan")]
+    same = [f["id"] for f in fields if f["name"].endswith(".samePeriod")]
+    totals = [
+        {"id": 1003, "name": "totals.plan", "type": "totals", "component": "display",
+         "formula": "+".join(f"VAL({fid})" for fid in plan) or "0"},
+        {"id": 1004, "name": "totals.samePeriod", "type": "totals", "component": "display",
+         "formula": "+".join(f"VAL({fid})" for fid in same) or "0"},
+        {"id": 1005, "name": "totals.diffRate", "type": "diffs", "component": "display",
+         "formula": "(VAL(1003)-VAL(1004))/VAL(1004)"},
+    ]
+    return head + totals + fields
+
+
+def build_template(count: int, source: list) -> list:
+    template = source[:count]
+    next_id = max(m["id"] for m in source) + 1
+    for n in range(len(template), count):
+        template.append({"id": next_id + n, "name": f"合成指标{n + 1}", "unit": "", "type": "basic"})
+    return template
+
+
+def build_menu(scale: Scale, source: list) -> tuple:
+    """返回 (菜单, 区域汇总表 id, 单位表 id, 表0 列键)。"""
+    tables = {t["id"]: t for group in source for t in group["tables"]}
+    leaf_protos = [t for t in tables.values() if t["type"] != "summary"]
+    regions = [str(2 + n) for n in range(scale.regions)]
+    leaves = [str(2 + scale.regions + n) for n in range(scale.subsidiaries)]
+    members = {rid: leaves[n::scale.regions] for n, rid in enumerate(regions)}
+
+    keys = {"group": "1"}
+    keys.update({f"region{n + 1}": rid for n, rid in enumerate(regions)})
+    keys.update({f"unit{n + 1}": lid for n, lid in enumerate(leaves)})
+    menu = [{"name": "集团公司", "tables": [
+        {**tables["0"], "subsidiaries": keys},
+        {**tables["1"], "subsidiaries": regions},
+    ]}]
+    for n, rid in enumerate(regions):
+        group = [{**tables["2"], "id": rid, "name": f"区域{n + 1}汇总表", "subsidiaries": members[rid]}]
+        for lid in members[rid]:
+            proto = leaf_protos[int(lid) % len(leaf_protos)]
+            group.append({**proto, "id": lid, "name": f"{proto['name']}-{lid}", "templateName": TEMPLATE_NAME})
+        menu.append({"name": f"区域{n + 1}", "tables": group})
+    return menu, regions, leaves, list(keys)
+
+
+def build_group_fields(keys: list, source: list) -> tuple:
+    """返回 (groupTemplate.json, formulacopy.json 的 groupFields)。"""
+    template = [{"id": 1001, "name": "name"}, {"id": 1002, "name": "unit"}]
+    fields = [f for f in source if f["id"] < 1003]
+    for n, key in enumerate(keys):
+        plan, same, diff = 1003 + 3 * n, 1004 + 3 * n, 1005 + 3 * n
+        template += [{"id": plan, "name": f"{key}.plan"}, {"id": same, "name": f"{key}.samePeriod"},
+                     {"id": diff, "name": f"{key}.diffRate"}]
+        fields += [
+            {"id": plan, "name": f"{key}.plan", "type": "totals", "component": "display"},
+            {"id": same, "name": f"{key}.samePeriod", "type": "totals", "component": "display"},
+            {"id": diff, "name": f"{key}.diffRate", "type": "diffs", "component": "display",
+             "formula": f"(VAL({plan})-VAL({same}))/VAL({same})"},
+        ]
+    return template, fields
+
+
+def table_rows(template: list, fields: list, rng: random.Random) -> list:
+    rows = []
+    for metric in template:
+        values = {}
+        for f in fields:
+            if f["id"] >= 2001:
+                values[f["id"]] = None if rng.random() < 0.1 else round(rng.uniform(0, 1000), 2)
+        plan = sum(v or 0 for fid, v in values.items() if fid % 2 == 1)
+        same = sum(v or 0 for fid, v in values.items() if fid % 2 == 0)
+        values.update({
+            1000: metric["id"], 1001: metric["name"], 1002: metric.get("unit", ""),
+            1003: round(plan, 10), 1004: round(same, 10), 1005: round((plan - same) / same, 10) if same else 0,
+        })
+        rows.append({
+            "metricId": metric["id"],
+            "metricName": metric["name"],
+            "type": metric.get("type", "basic"),
+            "values": [{"fieldId": f["id"], "fieldName": f["name"], "fieldLabel": f["name"], "value": values[f["id"]]}
+                       for f in fields],
+        })
+    return rows
+
+
+def table_doc(table: dict, template: list, fields: list, n: int, rng: random.Random) -> dict:
+    at = (BASE_TIME + timedelta(hours=n)).isoformat()
+    info = {"id": table["id"], "name": table["name"], "template": TEMPLATE_NAME}
+    submit = {"submittedAt": at, "table": info, "submittedBy": FILLER, "tableData": table_rows(template, fields, rng)}
+    doc = {"submit": submit}
+    if n % 2 == 0:
+        doc["approved"] = {**submit, "approvedAt": (BASE_TIME + timedelta(hours=n + 1)).isoformat(), "approvedBy": ADMIN}
+    if n % 3 == 0:
+        doc["temp"] = {"submittedAt": at, "table": info, "submittedBy": FILLER,
+                       "tableData": table_rows(template, fields, rng)}
+    return doc
+
+
+def history_records(project_id: str, table: dict, count: int) -> list:
+    return [{
+        "projectId": project_id,
+        "tableId": table["id"],
+        "tableName": table["name"],
+        "action": HISTORY_ACTIONS[n % len(HISTORY_ACTIONS)],
+        "timestamp": (BASE_TIME + timedelta(minutes=n)).isoformat(),
+        "submittedBy": ADMIN if n % len(HISTORY_ACTIONS) == 2 else FILLER,
+        "tableTemplate": TEMPLATE_NAME,
+    } for n in range(count)]
+
+
+def generate(root: Path, scale: Scale, store_kind: str = "file", fmt: str = "compact") -> Dataset:
+    """在 root 下生成配置目录与数据目录。"""
+    rng = random.Random(scale.seed)
+    formulas = _load("formulacopy.json")
+    template = build_template(scale.metrics, _load("templatecopy.json"))
+    fields = build_fields(scale.fields, formulas["subsidiaryFields"])
+    menu, regions, leaves, keys = build_menu(scale, _load("menucopy.json"))
+    group_template, group_fields = build_group_fields(keys, formulas["groupFields"])
+    metric_ids = {m["id"] for m in template}
+
+    config_dir = root / "config"
+    _write(config_dir / CONFIG_SUBDIR / "menucopy.json", menu)
+    _write(config_dir / CONFIG_SUBDIR / "templatecopy.json", template)
+    _write(config_dir / CONFIG_SUBDIR / "groupTemplate.json", group_template)
+    _write(config_dir / CONFIG_SUBDIR / "formulacopy.json", {
+        "subsidiaryFields": fields,
+        "groupFields": group_fields,
+        "metrics": [m for m in formulas["metrics"] if m["id"] in metric_ids],
+    })
+
+    data_dir = root / "data"
+    _write(data_dir / "auth.json", [FILLER, ADMIN])
+    store = open_table_store(store_kind, data_dir, DocumentCache(0), data_dir / "tables.db", fmt=fmt)
+    tables = {t["id"]: t for group in menu for t in group["tables"]}
+    projects = project_ids(scale)
+    for project_id in projects:
+        (data_dir / f"{project_id}_data").mkdir(parents=True, exist_ok=True)
+        for n, lid in enumerate(leaves):
+            store.write(project_id, lid, table_doc(tables[lid], template, fields, n, rng))
+            for record in history_records(project_id, tables[lid], scale.history):
+                store.append_history(project_id, record)
+        for n, sid in enumerate(["1"] + regions):
+            store.write(project_id, sid, {"submit": table_doc(tables[sid], template, fields, n, rng)["submit"]})
+    size = sum(p.stat().st_size for p in data_dir.rglob("*") if p.is_file())
+    return Dataset(config_dir, data_dir, projects, leaves, regions, size)
@@ -0,0 +1,154 @@
+"""单元格级修改 (PATCH /project/{id}/table/{tid}/cells)。
+
+客户端只提交变化的单元格 [{metricId, fieldId, value[, explanation]}]，作用在它正在编辑的快照上
+（有 submit 时为 submit，否则为 temp，与填报页面加载数据的规则一致），得到新的 submit 或 temp 快照。
+派生单元格由客户端计算后随变更一起提交，与整表提交时相同。
+
+SnapshotDelta 记录新快照相对基准快照的差异：不同的顶层键与被替换的单元格。
+文件存储据此只追加增量（见 FileTableStore.patch），汇总引擎据此只更新变化的单元格
+（CellChanges，见 SummaryAggregator.notify）。
+
+同一 metricId 有多行、同一行内有重复 fieldId 时以最后一个为准，与前端及 columnar.encode_table 一致。
+"""
+from typing import NamedTuple, Optional
+
+CELL_KEYS = ("value", "explanation")
+
+
+class CellPatchError(ValueError):
+    def __init__(self, message: str, cells: Optional[list] = None):
+        super().__init__(message)
+        self.cells = cells or []
+
+
+class CellChanges(NamedTuple):
+    """交给汇总引擎的变更集。"""
+    base: dict       # 修改前的快照
+    snapshot: dict   # 修改后的快照
+    cells: list      # [(metricId, fieldId, 新单元格)]
+
+
+def editing_kind(doc: dict) -> Optional[str]:
+    """客户端编辑所基于的快照：data.submit || data.temp。"""
+    for kind in ("submit", "temp"):
+        snapshot = doc.get(kind)
+        if snapshot and isinstance(snapshot.get("tableData"), list):
+            return kind
+    return None
+
+
+def parse_changes(raw) -> list:
+    """校验请求中的变更列表，返回 [(metricId, fieldId, {键: 新值})]；同一单元格的多次修改依次合并。"""
+    if not isinstance(raw, list) or not raw:
+        raise CellPatchError("changes must be a non-empty list.")
+    merged: dict = {}
+    for n, change in enumerate(raw):
+        if not isinstance(change, dict):
+            raise CellPatchError(f"changes[{n}] must be an object.")
+        metric_id, field_id = change.get("metricId"), change.get("fieldId")
+        if not isinstance(metric_id, (int, str)) or isinstance(metric_id, bool) or metric_id == "":
+            raise CellPatchError(f"changes[{n}].metricId is required.")
+        if not isinstance(field_id, (int, str)) or isinstance(field_id, bool) or field_id == "":
+            raise CellPatchError(f"changes[{n}].fieldId is required.")
+        updates = {key: change[key] for key in CELL_KEYS if key in change}
+        if not updates:
+            raise CellPatchError(f"changes[{n}] has nothing to change.")
+        if isinstance(updates.get("value"), (dict, list)):
+            raise CellPatchError(f"changes[{n}].value must be a number, string or null.")
+        if "explanation" in updates and not isinstance(updates["explanation"], (dict, type(None))):
+            raise CellPatchError(f"changes[{n}].explanation must be an object or null.")
+        merged.setdefault((metric_id, field_id), {}).update(updates)
+    return [(metric_id, field_id, updates) for (metric_id, field_id), updates in merged.items()]
+
+
+def _locate(table_data: list) -> dict:
+    """{metricId: (行下标, {fieldId: 单元格下标})}。"""
+    located = {}
+    for i, row in enumerate(table_data):
+        if isinstance(row, dict) and row.get("metricId") is not None and isinstance(row.get("values"), list):
+            located[row["metricId"]] = (i, {
+                cell.get("fieldId"): j for j, cell in enumerate(row["values"]) if isinstance(cell, dict)
+            })
+    return located
+
+
+def replace_cells(table_data: list, cells: list) -> list:
+    """返回替换了 cells 中单元格的新 tableData；未涉及的行与单元格与原列表共享。"""
+    located = _locate(table_data)
+    rows = list(table_data)
+    copied = set()
+    for metric_id, field_id, cell in cells:
+        i, fields = located.get(metric_id, (None, {}))
+        j = fields.get(field_id)
+        if j is None:
+            continue
+        if i not in copied:
+            rows[i] = {**rows[i], "values": list(rows[i]["values"])}
+            copied.add(i)
+        rows[i]["values"][j] = cell
+    return rows
+
+
+class SnapshotDelta:
+    """doc[kind] = {**doc[source], **set}，并替换其中 cells 列出的单元格。"""
+
+    __slots__ = ("kind", "source", "set", "cells")
+
+    def __init__(self, kind: str, source: str, set_keys: dict, cells: list):
+        self.kind = kind
+        self.source = source
+        self.set = set_keys
+        self.cells = cells
+
+    @classmethod
+    def build(cls, doc: dict, kind: str, changes: list, meta: dict) -> "SnapshotDelta":
+        """按 parse_changes 的结果生成增量；引用了不存在的单元格时抛出 CellPatchError。"""
+        source = editing_kind(doc)
+        if source is None:
+            raise CellPatchError("No stored snapshot to patch.")
+        base = doc[source]
+        table_data = base["tableData"]
+        located = _locate(table_data)
+        missing = [
+            {"metricId": metric_id, "fieldId": field_id}
+            for metric_id, field_id, _ in changes
+            if field_id not in located.get(metric_id, (None, {}))[1]
+        ]
+        if missing:
+            raise CellPatchError("Unknown cells.", missing)
+        cells = []
+        for metric_id, field_id, updates in changes:
+            i, fields = located[metric_id]
+            old = table_data[i]["values"][fields[field_id]]
+            cell = {**old, **updates}
+            if cell.get("explanation", 0) is None:
+                del cell["explanation"]
+            if cell != old:
+                cells.append((metric_id, field_id, cell))
+        set_keys = {k: v for k, v in meta.items() if k != "tableData" and (k not in base or base[k] != v)}
+        return cls(kind, source, set_keys, cells)
+
+    def apply(self, doc: dict) -> dict:
+        """返回应用增量后的新文档（浅拷贝，其它快照与原文档共享）。"""
+        base = doc[self.source]
+        snapshot = {**base, **self.set}
+        snapshot["tableData"] = replace_cells(base["tableData"], self.cells)
+        data = dict(doc)
+        data[self.kind] = snapshot
+        return data
+
+    def changes(self, previous: dict, data: dict) -> CellChanges:
+        return CellChanges(previous[self.source], data[self.kind], self.cells)
+
+    def to_record(self) -> dict:
+        return {
+            "kind": self.kind,
+            "from": self.source,
+            "set": self.set,
+            "cells": [[metric_id, field_id, cell] for metric_id, field_id, cell in self.cells],
+        }
+
+    @classmethod
+    def from_record(cls, record: dict) -> "SnapshotDelta":
+        return cls(record["kind"], record["from"], record.get("set") or {},
+                   [tuple(cell) for cell in record.get("cells") or []])
@@ -0,0 +1,124 @@
+"""tableData 的列式内部表示。
+
+把 row["values"][i]["value"] 形式的嵌套结构压成以 (metricId, fieldId) 为下标的
+float64 稠密矩阵，非数值单元格通过掩码区分，聚合时可以直接做向量化求和。
+JSON 结构只在响应边界由调用方重新构造。
+"""
+from typing import Iterable
+
+import numpy as np
+
+
+class TableLayout:
+    """metricId / fieldId 到矩阵行列下标的映射；遇到新的 id 时自动扩展。"""
+
+    def __init__(self, metric_ids: Iterable = (), field_ids: Iterable = ()):
+        self.metric_ids: list = []
+        self.field_ids: list = []
+        self.metric_index: dict = {}
+        self.field_index: dict = {}
+        self.ensure(metric_ids, field_ids)
+
+    @property
+    def shape(self) -> tuple:
+        return (len(self.metric_ids), len(self.field_ids))
+
+    def ensure(self, metric_ids: Iterable = (), field_ids: Iterable = ()):
+        for metric_id in metric_ids:
+            if metric_id not in self.metric_index:
+                self.metric_index[metric_id] = len(self.metric_ids)
+                self.metric_ids.append(metric_id)
+        for field_id in field_ids:
+            if field_id not in self.field_index:
+                self.field_index[field_id] = len(self.field_ids)
+                self.field_ids.append(field_id)
+
+    def metric_mask(self, metric_ids) -> np.ndarray:
+        """返回长度为行数的布尔向量：metricId 属于 metric_ids 的行为 True。"""
+        mask = np.zeros(len(self.metric_ids), dtype=bool)
+        for metric_id in metric_ids:
+            idx = self.metric_index.get(metric_id)
+            if idx is not None:
+                mask[idx] = True
+        return mask
+
+    def field_mask(self, field_ids) -> np.ndarray:
+        mask = np.zeros(len(self.field_ids), dtype=bool)
+        for field_id in field_ids:
+            idx = self.field_index.get(field_id)
+            if idx is not None:
+                mask[idx] = True
+        return mask
+
+
+def fit(array: np.ndarray, shape: tuple) -> np.ndarray:
+    """布局扩展后，把旧矩阵/向量用 0 (False) 补齐到新形状。"""
+    if array.shape == shape:
+        return array
+    padded = np.zeros(shape, dtype=array.dtype)
+    padded[tuple(slice(0, n) for n in array.shape)] = array
+    return padded
+
+
+class ColumnarTable:
+    """一份 tableData 的列式编码。
+
+    values    float64 (M, F)  数值单元格的值，其它位置为 0
+    numeric   bool    (M, F)  单元格存在且为数值 (int/float)
+    is_float  bool    (M, F)  数值单元格原本为 float（用于在响应中还原 int/float 类型）
+    present   bool    (M,)    该 metricId 的行存在
+    force     bool    (M,)    行上带有 force 标记
+    """
+
+    __slots__ = ("values", "numeric", "is_float", "present", "force")
+
+    def __init__(self, shape: tuple):
+        self.values = np.zeros(shape, dtype=np.float64)
+        self.numeric = np.zeros(shape, dtype=bool)
+        self.is_float = np.zeros(shape, dtype=bool)
+        self.present = np.zeros(shape[0], dtype=bool)
+        self.force = np.zeros(shape[0], dtype=bool)
+
+    def fit(self, shape: tuple):
+        self.values = fit(self.values, shape)
+        self.numeric = fit(self.numeric, shape)
+        self.is_float = fit(self.is_float, shape)
+        self.present = fit(self.present, shape[:1])
+        self.force = fit(self.force, shape[:1])
+        return self
+
+
+def encode_table(table_data: list, layout: TableLayout) -> ColumnarTable:
+    """按 layout 编码 tableData。与逐行构建 {metricId: row} / {fieldId: value} 的语义一致：
+    同一 metricId 出现多次时以最后一行为准，同一行内重复的 fieldId 以最后一个单元格为准。
+    """
+    rows = [row for row in table_data if isinstance(row, dict) and row.get("metricId")]
+    layout.ensure(
+        (row["metricId"] for row in rows),
+        (cell["fieldId"] for row in rows for cell in row.get("values", []) if isinstance(cell, dict) and cell.get("fieldId")),
+    )
+    table = ColumnarTable(layout.shape)
+    values, numeric, is_float = table.values, table.numeric, table.is_float
+    metric_index, field_index = layout.metric_index, layout.field_index
+    for row in rows:
+        i = metric_index[row["metricId"]]
+        if table.present[i]:
+            values[i, :] = 0
+            numeric[i, :] = False
+            is_float[i, :] = False
+        table.present[i] = True
+        table.force[i] = bool(row.get("force"))
+        for cell in row.get("values", []):
+            if not isinstance(cell, dict) or not cell.get("fieldId"):
+                continue
+            j = field_index[cell["fieldId"]]
+            value = cell.get("value", 0)
+            if isinstance(value, (int, float)):
+                values[i, j] = value
+                numeric[i, j] = True
+                is_float[i, j] = isinstance(value, float)
+            else:
+                values[i, j] = 0
+                numeric[i, j] = False
+                is_float[i, j] = False
+    return table
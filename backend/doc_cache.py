@@ -0,0 +1,142 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Optional
+
+
+def file_signature(path: Path) -> Optional[tuple]:
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    # 写入方以原子替换落盘，inode 随之变化，可区分同一时间片内大小相同的两次写入
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+class DocumentCache:
+    """进程内的表文档缓存：按 (project_id, table_id) 缓存已解析的 JSON 文档。
+
+    每次读取先取得存储端的签名（文件为 (mtime_ns, size)，数据库为写入代数），
+    签名不变则直接返回缓存对象；写入方通过 put()/store() 放入新文档并递增该表的写入代数。
+    容量按文档的存储字节数计量，超出上限时按 LRU 淘汰。
+    缓存返回的文档为共享对象，调用方不得原地修改（需要修改时先浅拷贝）。
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._generations: dict[tuple, int] = {}
+        self._known: dict[tuple, tuple] = {}
+        self._bytes = 0
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: tuple, path: Path):
+        """返回 path 对应的已解析文档；文件不存在时返回 None。
+
+        文件内容为空时返回 {}；JSON 解析失败时抛出 json.JSONDecodeError。
+        """
+        signature = file_signature(path)
+        if signature is None:
+            self.forget(key)
+            return None
+
+        def _load():
+            with open(path, "r", encoding="utf-8") as f:
+                content = f.read()
+            return (json.loads(content) if content else {}), signature[1]
+
+        return self.lookup(key, signature, _load)
+
+    def cached(self, key: tuple, signature):
+        """签名匹配时返回缓存对象，否则返回 None（不加载）。"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == signature:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return None
+
+    def lookup(self, key: tuple, signature: tuple, load: Callable):
+        """签名匹配时返回缓存文档，否则调用 load() -> (doc, size) 并缓存。"""
+        doc = self.cached(key, signature)
+        if doc is not None:
+            return doc
+
+        doc, size = load()
+
+        with self._lock:
+            if self._known.get(key) != signature:
+                # 被其它进程或外部工具改写过，视为一次新的写入
+                self._generations[key] = self._generations.get(key, 0) + 1
+                self._known[key] = signature
+            self._store(key, signature, doc, size)
+        return doc
+
+    def put(self, key: tuple, path: Path, doc) -> int:
+        """文件写入方在落盘后调用：缓存新文档并返回递增后的写入代数。"""
+        signature = file_signature(path)
+        if signature is None:
+            self.invalidate(key)
+            return self.generation(key)
+        return self.store(key, signature, doc, signature[1])
+
+    def store(self, key: tuple, signature: tuple, doc, size: int) -> int:
+        with self._lock:
+            generation = self._generations.get(key, 0) + 1
+            self._generations[key] = generation
+            self._known[key] = signature
+            self._store(key, signature, doc, size)
+            return generation
+
+    def forget(self, key: tuple):
+        """存储端已不存在该文档。"""
+        with self._lock:
+            if self._known.pop(key, None) is not None:
+                self._generations[key] = self._generations.get(key, 0) + 1
+            self._drop(key)
+
+    def invalidate(self, key: tuple):
+        with self._lock:
+            self._generations[key] = self._generations.get(key, 0) + 1
+            self._known.pop(key, None)
+            self._drop(key)
+
+    def generation(self, key: tuple) -> int:
+        with self._lock:
+            return self._generations.get(key, 0)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "maxBytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hitRatio": (self.hits / lookups) if lookups else 0.0,
+            }
+
+    def _store(self, key: tuple, signature: tuple, doc, size: int):
+        self._drop(key)
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (signature, doc, size)
+        self._bytes += size
+        while self._bytes > self.max_bytes and self._entries:
+            _, (_, _, evicted_size) = self._entries.popitem(last=False)
+            self._bytes -= evicted_size
+            self.evictions += 1
+
+    def _drop(self, key: tuple):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[2]
@@ -0,0 +1,157 @@
+"""表状态变化的进程内发布/订阅，供 GET /project/{id}/events (SSE) 使用。
+
+- 每个频道（项目）保留最近 history 条事件，事件 id 为 "{启动标识}-{序号}"；
+  客户端重连时带上 Last-Event-ID 即可补发之后的事件，id 来自其它进程实例或已超出保留范围时
+  先收到一条 reset 事件，应重新请求一次 table_statuses；
+- 每个订阅者的待发送事件按 key（tableId）合并，只保留最新的一条，
+  慢客户端跳过中间状态而不会让队列增长；待发送 key 超过 max_pending 时清空并改发 reset，
+  reset 发出前到达的事件不再单独发送；
+- 空闲连接只是一个等待中的协程，按 heartbeat 间隔发送注释行保活。
+
+publish 必须在事件循环线程中调用（各写接口均为 async 处理函数）。
+只在单进程内有效：多 worker 部署时，客户端只会收到所连接进程上发生的写入。
+"""
+import asyncio
+import os
+import time
+from collections import OrderedDict, deque
+from typing import AsyncIterator, Optional
+
+import fast_json
+
+RESET = "reset"
+
+
+class Subscription:
+    def __init__(self, channel: str, max_pending: int):
+        self.channel = channel
+        self.max_pending = max_pending
+        self.pending: "OrderedDict[str, tuple]" = OrderedDict()
+        self.reset = False
+        self._wakeup = asyncio.Event()
+
+    def push(self, event_id: str, key: str, data: dict):
+        if self.reset:
+            return
+        self.pending.pop(key, None)
+        self.pending[key] = (event_id, data)
+        if len(self.pending) > self.max_pending:
+            self.pending.clear()
+            self.reset = True
+        self._wakeup.set()
+
+    def request_reset(self):
+        self.pending.clear()
+        self.reset = True
+        self._wakeup.set()
+
+    async def wait(self, timeout: float) -> bool:
+        """等到有待发送事件（返回 True）或超时（返回 False）。"""
+        if self.pending or self.reset:
+            return True
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    def drain(self) -> tuple:
+        """(是否需要 reset, [(event_id, data)])，并清空待发送事件。"""
+        reset, events = self.reset, list(self.pending.values())
+        self.reset = False
+        self.pending.clear()
+        self._wakeup.clear()
+        return reset, events
+
+
+class EventBus:
+    def __init__(self, history: int = 1024, max_pending: int = 256):
+        self.boot = format(int(time.time() * 1000), "x") + format(os.getpid(), "x")
+        self.history = history
+        self.max_pending = max_pending
+        self._seq = 0
+        self._events: dict[str, deque] = {}
+        self._evicted: dict[str, int] = {}  # 频道中已移出保留范围的最大序号
+        self._subscribers: dict[str, set] = {}
+
+    def publish(self, channel: str, key: str, data: dict) -> str:
+        self._seq += 1
+        event_id = f"{self.boot}-{self._seq}"
+        events = self._events.get(channel)
+        if events is None:
+            events = self._events[channel] = deque(maxlen=self.history)
+        if len(events) == events.maxlen:
+            self._evicted[channel] = events[0][0]
+        events.append((self._seq, event_id, key, data))
+        for subscription in self._subscribers.get(channel, ()):
+            subscription.push(event_id, key, data)
+        return event_id
+
+    def subscribe(self, channel: str, last_event_id: Optional[str] = None) -> Subscription:
+        subscription = Subscription(channel, self.max_pending)
+        if last_event_id:
+            self._replay(subscription, last_event_id)
+        self._subscribers.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscribers = self._subscribers.get(subscription.channel)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[subscription.channel]
+
+    def _replay(self, subscription: Subscription, last_event_id: str):
+        boot, _, seq = last_event_id.rpartition("-")
+        events = self._events.get(subscription.channel, ())
+        try:
+            last_seq = int(seq)
+        except ValueError:
+            last_seq = None
+        # 之后的事件全部仍在保留范围内才能补发
+        if (boot != self.boot or last_seq is None or last_seq > self._seq
+                or last_seq < self._evicted.get(subscription.channel, 0)):
+            subscription.request_reset()
+            return
+        for seq_no, event_id, key, data in events:
+            if seq_no > last_seq:
+                subscription.push(event_id, key, data)
+
+    def last_id(self) -> str:
+        return f"{self.boot}-{self._seq}"
+
+    def subscriber_count(self, channel: Optional[str] = None) -> int:
+        if channel is not None:
+            return len(self._subscribers.get(channel, ()))
+        return sum(len(s) for s in self._subscribers.values())
+
+
+def format_event(event: str, data: dict, event_id: Optional[str] = None) -> bytes:
+    lines = []
+    if event_id:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append("data: " + fast_json.dumps_text(data))
+    return ("\n".join(lines) + "\n\n").encode("utf-8")
+
+
+async def sse_stream(bus: EventBus, channel: str, last_event_id: Optional[str], event: str,
+                     heartbeat: float = 15.0, retry_ms: int = 3000) -> AsyncIterator[bytes]:
+    """订阅 channel 并转为 SSE 字节流。开始迭代时才订阅，连接断开（生成器被关闭）时退订。"""
+    subscription = bus.subscribe(channel, last_event_id)
+    try:
+        yield f"retry: {retry_ms}\n\n".encode("ascii")
+        while True:
+            if not await subscription.wait(heartbeat):
+                yield b": keep-alive\n\n"
+                continue
+            reset, events = subscription.drain()
+            chunks = []
+            if reset:
+                # reset 之后的状态由客户端重新查询得到，id 取当前最新事件，下次从这里续传
+                chunks.append(format_event(RESET, {}, bus.last_id()))
+            chunks.extend(format_event(event, data, event_id) for event_id, data in events)
+            if chunks:
+                yield b"".join(chunks)
+    finally:
+        bus.unsubscribe(subscription)
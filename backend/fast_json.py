@@ -0,0 +1,53 @@
+"""JSON 编解码的快速路径：安装了 orjson 时使用它，否则（或 FAST_JSON=0 时）使用标准库 json。
+
+dumps 返回紧凑、不转义非 ASCII 的 UTF-8 字节，等价于
+json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")；
+orjson 无法处理的对象（超出 64 位的整数、numpy 标量等）自动改用标准库。
+loads 接受 bytes 或 str；orjson 拒绝而标准库接受的输入（NaN、超大整数、带 BOM 的字节串等）
+同样交给标准库，解析失败时抛出的是标准库的异常。
+
+两条路径输出的差别仅在于浮点数的指数写法（1e+16 / 1e16）以及 NaN/Infinity：
+orjson 写为 null，标准库写为 NaN/Infinity。
+"""
+import json
+import os
+
+try:
+    import orjson
+except ImportError:  # 可选依赖
+    orjson = None
+
+ENABLED = orjson is not None and os.getenv("FAST_JSON", "1") != "0"
+BACKEND = "orjson" if ENABLED else "json"
+
+
+def std_dumps(obj) -> bytes:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+std_loads = json.loads
+
+
+if orjson is not None:
+    def orjson_dumps(obj) -> bytes:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            return std_dumps(obj)
+
+    def orjson_loads(raw):
+        try:
+            return orjson.loads(raw)
+        except ValueError:
+            return json.loads(raw)
+else:
+    orjson_dumps = orjson_loads = None
+
+
+dumps = orjson_dumps if ENABLED else std_dumps
+loads = orjson_loads if ENABLED else std_loads
+
+
+def dumps_text(obj) -> str:
+    """dumps 的 str 版本（SQLite TEXT 列等）。"""
+    return dumps(obj).decode("utf-8")
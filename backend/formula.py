@@ -0,0 +1,280 @@
+"""模板公式（VAL(id) 表达式）的服务端计算，规则与前端 DataEntryView 的 calculateAll 一致：
+
+1. 列公式：type 为 calculated/totals 且带 formula 的列逐行计算，指标的 columnFormulaOverrides
+   （按列 name）优先，支持 AVG(...) / LAST_VAL(...)；
+2. 行公式：type 为 calculated 的指标在各数值列（component 为 input/display 且不是 diffs）上计算，
+   按指标间的依赖顺序求值（等价于前端反复迭代到不再变化的结果）；
+3. 差异列（type 为 diffs）最后计算。
+
+取值同 parseFloat(x) || 0，每一步的结果按 toFixed(10) 取整后再被后续公式引用；
+NaN/Infinity 输出为 None（即 JSON.stringify 得到的 null）。无法解析的行公式使该行各数值列为 NaN，
+无法解析的列公式不改动原值。
+
+公式在启动时解析一次并编译为 numpy 向量运算：列公式一次算完所有行，行公式一次算完所有数值列。
+"""
+import ast
+import math
+import operator
+import re
+from typing import Callable, Optional
+
+import numpy as np
+
+_NUMBER_PREFIX = re.compile(r"\s*([+-]?(?:Infinity|(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?))")
+_IDS = re.compile(r"\d+")
+
+_BINARY_OPS = {ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul, ast.Div: operator.truediv}
+_UNARY_OPS = {ast.UAdd: operator.pos, ast.USub: operator.neg}
+
+ROW_VALUE_COMPONENTS = ("input", "display")
+
+
+class FormulaError(ValueError):
+    pass
+
+
+class FormulaCycleError(FormulaError):
+    pass
+
+
+def to_number(value) -> float:
+    """parseFloat(value) || 0。"""
+    if isinstance(value, bool) or value is None:
+        return 0.0
+    if isinstance(value, (int, float)):
+        number = float(value)
+    elif isinstance(value, str):
+        match = _NUMBER_PREFIX.match(value)
+        if not match:
+            return 0.0
+        number = float(match.group(1).replace("Infinity", "inf"))
+    else:
+        return 0.0
+    return 0.0 if math.isnan(number) else number
+
+
+def _round10(values: np.ndarray) -> np.ndarray:
+    """parseFloat(x.toFixed(10))；toFixed 对 1e21 以上的数不取整。"""
+    return np.array(
+        [round(v, 10) if math.isfinite(v) and abs(v) < 1e21 else v for v in values.tolist()],
+        dtype=np.float64,
+    )
+
+
+def json_value(value: float):
+    if not math.isfinite(value):
+        return None
+    if value.is_integer() and abs(value) < 2 ** 53:
+        return int(value)
+    return value
+
+
+class Formula:
+    """一条编译后的公式：evaluate(get) 中 get(id) 返回被引用的 id 对应的向量。"""
+
+    def __init__(self, text: str):
+        self.text = text
+        self.refs: list = []
+        if text.startswith("AVG("):
+            ids = [int(x) for x in _IDS.findall(text)]
+            self.refs = ids
+            self._fn = self._average(ids)
+        elif text.startswith("LAST_VAL("):
+            ids = [int(x) for x in _IDS.findall(text)]
+            self.refs = ids[-1:]
+            self._fn = self._last(ids)
+        else:
+            try:
+                tree = ast.parse(text.strip(), mode="eval")
+            except SyntaxError as e:
+                raise FormulaError(f"Invalid formula {text!r}: {e.msg}")
+            self._fn = self._compile(tree.body)
+
+    @staticmethod
+    def _average(ids: list) -> Callable:
+        if not ids:
+            return lambda get: 0.0
+        return lambda get: sum(get(i) for i in ids) / len(ids)
+
+    @staticmethod
+    def _last(ids: list) -> Callable:
+        if not ids or not ids[-1]:
+            return lambda get: 0.0
+        last = ids[-1]
+        return lambda get: get(last)
+
+    def _compile(self, node) -> Callable:
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) and not isinstance(node.value, bool):
+            constant = float(node.value)
+            return lambda get: constant
+        if (isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id == "VAL"
+                and len(node.args) == 1 and not node.keywords
+                and isinstance(node.args[0], ast.Constant) and isinstance(node.args[0].value, int)):
+            ref = node.args[0].value
+            self.refs.append(ref)
+            return lambda get: get(ref)
+        if isinstance(node, ast.BinOp) and type(node.op) in _BINARY_OPS:
+            op = _BINARY_OPS[type(node.op)]
+            left, right = self._compile(node.left), self._compile(node.right)
+            return lambda get: op(left(get), right(get))
+        if isinstance(node, ast.UnaryOp) and type(node.op) in _UNARY_OPS:
+            op = _UNARY_OPS[type(node.op)]
+            operand = self._compile(node.operand)
+            return lambda get: op(operand(get))
+        raise FormulaError(f"Unsupported expression in formula {self.text!r}")
+
+    def evaluate(self, get: Callable):
+        with np.errstate(all="ignore"):
+            return self._fn(get)
+
+
+def _try_compile(text: str) -> Optional[Formula]:
+    try:
+        return Formula(text)
+    except FormulaError:
+        return None
+
+
+def _dependency_order(formulas: dict) -> list:
+    """行公式的求值顺序：被引用的计算指标排在引用它的指标之前；存在环时抛出 FormulaCycleError。"""
+    order: list = []
+    state: dict = {}  # 1 = 正在访问, 2 = 已完成
+    for root in formulas:
+        if state.get(root):
+            continue
+        path = [root]
+        stack = [(root, iter(formulas[root].refs if formulas[root] else ()))]
+        state[root] = 1
+        while stack:
+            mid, pending = stack[-1]
+            ref = next(pending, None)
+            if ref is None:
+                stack.pop()
+                path.pop()
+                state[mid] = 2
+                order.append(mid)
+            elif ref not in formulas or state.get(ref) == 2:
+                continue
+            elif state.get(ref) == 1:
+                cycle = path[path.index(ref):] + [ref]
+                raise FormulaCycleError(f"Cycle in metric formulas: {' -> '.join(map(str, cycle))}")
+            else:
+                state[ref] = 1
+                path.append(ref)
+                stack.append((ref, iter(formulas[ref].refs if formulas[ref] else ())))
+    return order
+
+
+class FormulaPlan:
+    """一套列配置 (fieldConfig) 与指标公式编译出的求值计划。"""
+
+    def __init__(self, fields: list, metrics: list):
+        self.field_ids = [f["id"] for f in fields]
+        self.field_index = {fid: j for j, fid in enumerate(self.field_ids)}
+        self.value_columns = np.array([
+            self.field_index[f["id"]] for f in fields
+            if f.get("component") in ROW_VALUE_COMPONENTS and f.get("type") != "diffs"
+        ], dtype=np.intp)
+
+        metric_by_id = {m["id"]: m for m in metrics}
+        # (列下标, 默认公式, {metric_id: 覆盖公式})；None 表示公式无法解析
+        self.column_steps = []
+        for f in fields:
+            if f.get("type") not in ("calculated", "totals") or not f.get("formula"):
+                continue
+            overrides = {
+                mid: _try_compile(m["columnFormulaOverrides"][f["name"]])
+                for mid, m in metric_by_id.items()
+                if (m.get("columnFormulaOverrides") or {}).get(f["name"])
+            }
+            self.column_steps.append((self.field_index[f["id"]], _try_compile(f["formula"]), overrides))
+
+        row_formulas = {
+            m["id"]: _try_compile(m["formula"])
+            for m in metrics if m.get("type") == "calculated" and m.get("formula")
+        }
+        self.row_steps = [(mid, row_formulas[mid]) for mid in _dependency_order(row_formulas)]
+        self.diff_steps = [
+            (self.field_index[f["id"]], _try_compile(f["formula"]))
+            for f in fields if f.get("type") == "diffs" and f.get("formula")
+        ]
+
+    def apply(self, table_data: list):
+        """就地重算 table_data 中的派生单元格（替换为新的单元格字典，不修改原单元格对象）。"""
+        rows = [row for row in table_data if isinstance(row, dict) and isinstance(row.get("values"), list)]
+        if not rows:
+            return
+        n_fields = len(self.field_ids)
+        matrix = np.zeros((len(rows), n_fields), dtype=np.float64)
+        first_row: dict = {}
+        for i, row in enumerate(rows):
+            metric_id = row.get("metricId")
+            if metric_id is not None:
+                first_row.setdefault(metric_id, i)
+            for cell in row["values"]:
+                j = self.field_index.get(cell.get("fieldId")) if isinstance(cell, dict) else None
+                if j is not None:
+                    matrix[i, j] = to_number(cell.get("value"))
+        written = np.zeros(matrix.shape, dtype=bool)
+        metric_ids = [row.get("metricId") for row in rows]
+
+        def cleaned(values):
+            return np.where(np.isnan(values), 0.0, values)
+
+        # 1. 列公式：按所用公式（默认或覆盖）分组，每组一次算完
+        for j, default, overrides in self.column_steps:
+            groups: dict = {}
+            for i, metric_id in enumerate(metric_ids):
+                formula = overrides.get(metric_id, default) if overrides else default
+                if formula is not None:
+                    groups.setdefault(id(formula), (formula, []))[1].append(i)
+            for formula, members in groups.values():
+                index = np.array(members, dtype=np.intp)
+
+                def get(fid, index=index):
+                    k = self.field_index.get(fid)
+                    return cleaned(matrix[index, k]) if k is not None else np.zeros(len(index))
+
+                matrix[index, j] = _round10(np.broadcast_to(formula.evaluate(get), index.shape).astype(np.float64))
+                written[index, j] = True
+
+        # 2. 行公式：按依赖顺序，每个指标一次算完所有数值列
+        cols = self.value_columns
+        if len(cols):
+            def get_row(mid):
+                i = first_row.get(mid)
+                return cleaned(matrix[i, cols]) if i is not None else np.zeros(len(cols))
+
+            for metric_id, formula in self.row_steps:
+                i = first_row.get(metric_id)
+                if i is None:
+                    continue
+                if formula is None:
+                    matrix[i, cols] = np.nan
+                else:
+                    matrix[i, cols] = _round10(np.broadcast_to(formula.evaluate(get_row), cols.shape).astype(np.float64))
+                written[i, cols] = True
+
+        # 3. 差异列：所有行一次算完
+        for j, formula in self.diff_steps:
+            if formula is None:
+                continue
+
+            def get_col(fid):
+                k = self.field_index.get(fid)
+                return cleaned(matrix[:, k]) if k is not None else np.zeros(len(rows))
+
+            matrix[:, j] = _round10(np.broadcast_to(formula.evaluate(get_col), (len(rows),)).astype(np.float64))
+            written[:, j] = True
+
+        values = matrix.tolist()
+        for i, row in enumerate(rows):
+            if not written[i].any():
+                continue
+            new_cells = []
+            for cell in row["values"]:
+                j = self.field_index.get(cell.get("fieldId")) if isinstance(cell, dict) else None
+                if j is not None and written[i, j]:
+                    cell = {**cell, "value": json_value(values[i][j])}
+                new_cells.append(cell)
+            row["values"] = new_cells
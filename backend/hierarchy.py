@@ -0,0 +1,109 @@
+"""菜单 (menucopy.json) 中表之间汇总关系的索引，启动时构建一次。
+
+- children / parents：直接上下级（subsidiaries 为字典时取其值）；
+- descendants / ancestors：传递闭包；
+- order：拓扑序，下级表总在上级表之前，summary_order 为其中的汇总表；
+- region_tables / region_children：各区域（菜单分组）的表及其下属单位表，供权限判定使用。
+  区域下属表沿用原有规则，只沿列表形式的 subsidiaries 展开（表 0 的字典映射不计入）。
+
+汇总关系存在环时构建失败，抛出 MenuCycleError。
+"""
+from typing import Optional
+
+
+class MenuCycleError(ValueError):
+    pass
+
+
+def _direct_children(table: dict) -> list:
+    subs = table.get("subsidiaries")
+    if isinstance(subs, list):
+        return [str(x) for x in subs]
+    if isinstance(subs, dict):
+        return [str(v) for v in subs.values()]
+    return []
+
+
+class MenuHierarchy:
+    def __init__(self, menu_data: list):
+        self.tables: dict[str, dict] = {}
+        self.group_of: dict[str, str] = {}
+        self.children: dict[str, list[str]] = {}
+        self.parents: dict[str, list[str]] = {}
+        list_children: dict[str, list[str]] = {}
+        for group in menu_data:
+            for table in group.get("tables", []):
+                tid = str(table.get("id"))
+                self.tables[tid] = table
+                self.group_of[tid] = group.get("name")
+                children = _direct_children(table)
+                if children:
+                    self.children[tid] = children
+                    for cid in children:
+                        self.parents.setdefault(cid, []).append(tid)
+                if isinstance(table.get("subsidiaries"), list):
+                    list_children[tid] = children
+
+        self.order = self._topological_order()
+        self.summary_order = [tid for tid in self.order if tid in self.children]
+
+        self.descendants = self._closure(self.order, self.children)
+        self.ancestors = self._closure(list(reversed(self.order)), self.parents)
+        list_descendants = self._closure(self.order, list_children)
+
+        self.region_tables: dict[str, frozenset] = {}
+        self.region_children: dict[str, frozenset] = {}
+        members: dict[str, set] = {}
+        for tid, group_name in self.group_of.items():
+            members.setdefault(group_name, set()).add(tid)
+        for group_name, tids in members.items():
+            self.region_tables[group_name] = frozenset(tids)
+            self.region_children[group_name] = frozenset().union(*(list_descendants[tid] for tid in tids))
+
+    def _nodes(self) -> list:
+        nodes = list(self.tables)
+        for children in self.children.values():
+            nodes.extend(cid for cid in children if cid not in self.tables)
+        return list(dict.fromkeys(nodes))
+
+    def _topological_order(self) -> list:
+        order: list[str] = []
+        state: dict[str, int] = {}  # 1 = 正在访问, 2 = 已完成
+        for root in self._nodes():
+            if state.get(root):
+                continue
+            path = [root]
+            stack = [(root, iter(self.children.get(root, [])))]
+            state[root] = 1
+            while stack:
+                tid, pending = stack[-1]
+                cid = next(pending, None)
+                if cid is None:
+                    stack.pop()
+                    path.pop()
+                    state[tid] = 2
+                    order.append(tid)
+                elif state.get(cid) == 1:
+                    cycle = path[path.index(cid):] + [cid]
+                    raise MenuCycleError(f"Cycle in menu subsidiaries: {' -> '.join(cycle)}")
+                elif not state.get(cid):
+                    state[cid] = 1
+                    path.append(cid)
+                    stack.append((cid, iter(self.children.get(cid, []))))
+        return order
+
+    @staticmethod
+    def _closure(order: list, edges: dict) -> dict:
+        """按 order（每个节点的 edges 目标都排在它之前）累积可达集合。"""
+        closure: dict[str, frozenset] = {}
+        for tid in order:
+            reach = set()
+            for nid in edges.get(tid, []):
+                reach.add(nid)
+                reach |= closure.get(nid, frozenset())
+            closure[tid] = frozenset(reach)
+        return closure
+
+    def region_scope(self, region_name: Optional[str]) -> tuple:
+        """(区域内的表, 区域下属单位表)；未知区域返回两个空集合。"""
+        return self.region_tables.get(region_name, frozenset()), self.region_children.get(region_name, frozenset())
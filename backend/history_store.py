@@ -0,0 +1,219 @@
+"""按行追加的操作历史存储。
+
+history.jsonl 每行一条记录，写入为 O(1) 追加；
+history.idx 为旁路索引，每行 "tableId<TAB>offset<TAB>length"，
+读取某张表的历史时按偏移直接定位，无需解析整个日志。
+首次访问时会把旧的 history.json（整体 JSON 数组）一次性迁移过来，
+原文件重命名为 history.json.migrated 保留；迁移在 history.lock 文件锁内进行，
+多个 worker 同时首次访问时只有一个执行。
+"""
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Optional
+
+import fast_json
+import metrics
+from table_locks import file_lock
+
+LOG_NAME = "history.jsonl"
+INDEX_NAME = "history.idx"
+LEGACY_NAME = "history.json"
+LOCK_NAME = "history.lock"
+
+
+class HistoryLog:
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self.log_path = self.directory / LOG_NAME
+        self.index_path = self.directory / INDEX_NAME
+        self.legacy_path = self.directory / LEGACY_NAME
+        self.lock_path = self.directory / LOCK_NAME
+        self._lock = threading.RLock()
+        self._offsets: dict[str, list[tuple[int, int]]] = {}
+        self._seen: set[int] = set()
+        self._index_pos = 0
+        self._log_end = 0
+        self._ready = False
+
+    # --- public API ---
+
+    def append(self, record: dict):
+        line = fast_json.dumps(record) + b"\n"
+        with metrics.span("history.append"), self._lock:
+            self._ensure_ready()
+            fd = os.open(self.log_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, line)
+                # O_APPEND 下写入后的位置即本条记录的结尾，多进程追加时同样准确
+                end = os.lseek(fd, 0, os.SEEK_CUR)
+            finally:
+                os.close(fd)
+            offset = end - len(line)
+            table_id = str(record.get("tableId"))
+            self._write_index([(table_id, offset, len(line))])
+            self._remember(table_id, offset, len(line))
+        metrics.storage_bytes("file", "write", "history", len(line))
+
+    def read_table(self, table_id: str) -> list[dict]:
+        with self._lock:
+            self._ensure_ready()
+            self._catch_up()
+            entries = list(self._offsets.get(str(table_id), []))
+        records = []
+        if not entries:
+            return records
+        with metrics.span("history.read"):
+            with open(self.log_path, "rb") as f:
+                chunks = []
+                for offset, length in entries:
+                    f.seek(offset)
+                    chunks.append(f.read(length))
+        metrics.storage_bytes("file", "read", "history", sum(len(raw) for raw in chunks))
+        with metrics.json_parse("history"):
+            for raw in chunks:
+                record = self._decode(raw)
+                if record is not None:
+                    records.append(record)
+        return records
+
+    def read_all(self) -> list[dict]:
+        with self._lock:
+            self._ensure_ready()
+        records = []
+        if not self.log_path.exists():
+            return records
+        with open(self.log_path, "rb") as f:
+            for raw in f:
+                record = self._decode(raw)
+                if record is not None:
+                    records.append(record)
+        return records
+
+    def rebuild_index(self):
+        """丢弃旁路索引并从日志全量重建。"""
+        with self._lock:
+            self._ensure_ready()
+            self._offsets = {}
+            self._seen = set()
+            self._log_end = 0
+            tmp_path = self.index_path.with_name(INDEX_NAME + ".tmp")
+            tmp_path.write_bytes(b"")
+            os.replace(tmp_path, self.index_path)
+            self._index_pos = 0
+            self._catch_up()
+
+    # --- internals ---
+
+    @staticmethod
+    def _decode(raw: bytes) -> Optional[dict]:
+        try:
+            record = fast_json.loads(raw)
+        except (UnicodeDecodeError, json.JSONDecodeError):
+            return None
+        return record if isinstance(record, dict) else None
+
+    def _remember(self, table_id: str, offset: int, length: int):
+        if offset in self._seen:
+            return
+        self._seen.add(offset)
+        self._offsets.setdefault(table_id, []).append((offset, length))
+        self._log_end = max(self._log_end, offset + length)
+
+    def _write_index(self, entries: list):
+        if not entries:
+            return
+        data = "".join(f"{table_id}\t{offset}\t{length}\n" for table_id, offset, length in entries).encode("utf-8")
+        fd = os.open(self.index_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, data)
+        finally:
+            os.close(fd)
+
+    def _ensure_ready(self):
+        if self._ready:
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        if not self.log_path.exists() and self.legacy_path.exists():
+            with file_lock(self.lock_path):
+                # 等锁期间其它进程可能已完成迁移
+                if not self.log_path.exists() and self.legacy_path.exists():
+                    self._migrate_legacy()
+        self._ready = True
+        self._catch_up()
+
+    def _catch_up(self):
+        """读入其它进程追加的索引行；日志中尚未入索引的尾部记录补建索引。"""
+        if self.index_path.exists():
+            with open(self.index_path, "rb") as f:
+                f.seek(self._index_pos)
+                chunk = f.read()
+            complete = chunk[:chunk.rfind(b"\n") + 1]
+            self._index_pos += len(complete)
+            for line in complete.decode("utf-8").splitlines():
+                parts = line.split("\t")
+                if len(parts) != 3:
+                    continue
+                try:
+                    self._remember(parts[0], int(parts[1]), int(parts[2]))
+                except ValueError:
+                    continue
+
+        if not self.log_path.exists():
+            return
+        size = self.log_path.stat().st_size
+        if size <= self._log_end:
+            return
+        missing = []
+        with open(self.log_path, "rb") as f:
+            f.seek(self._log_end)
+            offset = self._log_end
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    break  # 未写完的行，等下次再补
+                record = self._decode(raw)
+                if record is not None and offset not in self._seen:
+                    missing.append((str(record.get("tableId")), offset, len(raw)))
+                offset += len(raw)
+        self._write_index(missing)
+        for table_id, entry_offset, length in missing:
+            self._remember(table_id, entry_offset, length)
+
+    def _migrate_legacy(self):
+        try:
+            with open(self.legacy_path, "r", encoding="utf-8-sig") as f:
+                existing = json.load(f)
+        except (json.JSONDecodeError, IOError):
+            existing = []
+        if not isinstance(existing, list):
+            existing = []
+
+        tmp_log = self.log_path.with_name(LOG_NAME + ".tmp")
+        tmp_index = self.index_path.with_name(INDEX_NAME + ".tmp")
+        offset = 0
+        with open(tmp_log, "wb") as log_f, open(tmp_index, "wb") as idx_f:
+            for record in existing:
+                if not isinstance(record, dict):
+                    continue
+                line = fast_json.dumps(record) + b"\n"
+                log_f.write(line)
+                idx_f.write(f"{record.get('tableId')}\t{offset}\t{len(line)}\n".encode("utf-8"))
+                offset += len(line)
+        os.replace(tmp_index, self.index_path)
+        os.replace(tmp_log, self.log_path)
+        os.replace(self.legacy_path, self.legacy_path.with_name(LEGACY_NAME + ".migrated"))
+
+
+_LOGS: dict[Path, HistoryLog] = {}
+_LOGS_LOCK = threading.Lock()
+
+
+def get_history_log(directory: Path) -> HistoryLog:
+    key = Path(directory)
+    with _LOGS_LOCK:
+        log = _LOGS.get(key)
+        if log is None:
+            log = HistoryLog(key)
+            _LOGS[key] = log
+        return log
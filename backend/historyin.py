@@ -1,12 +1,35 @@
-import tkinter as tk
-from tkinter import filedialog, messagebox
+"""历史数据导入工具：把 GBK 编码的 CSV（表头行包含“指标序号”）转换为表的 submit 快照。
+
+  python historyin.py
+      图形界面，逐个文件转换为 historyin/{输出文件ID}.json；
+  python historyin.py import <csv_dir> [--project heating_plan_2025-2026] [--workers N]
+      无界面批量导入：目录中的 {table_id}*.csv 由多个进程并行转换，
+      经与 API 相同的表锁与原子写入直接写入 DATA_DIR/{project}_data，并追加操作历史；
+      输出每个文件的转换/写入耗时。存储相关参数默认取与服务相同的环境变量
+      （DATA_DIR_PATH、TABLE_STORE、TABLE_STORE_DB、TABLE_STORE_FORMAT、TABLE_STORE_COMPRESS、TABLE_LOCK_DIR）。
+"""
+import argparse
 import csv
 import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 import datetime
 from zoneinfo import ZoneInfo
 import traceback
 
+try:
+    import tkinter as tk
+    from tkinter import filedialog, messagebox
+except ImportError:  # 无图形环境时只提供命令行导入
+    tk = filedialog = messagebox = None
+
+from doc_cache import DocumentCache
+from table_locks import TableLockManager
+from table_store import open_table_store
+
 # --- Configuration copied from frontend/srcs/projects/heating_plan_2025-2026/templates/subsidiaryTemplate.js ---
 # This makes the script self-contained.
 
@@ -94,6 +117,223 @@ REPORT_TEMPLATE = [
   { "id": 115, "name": '毛利', "type": 'calculated' },
 ]
 
+
+REPORT_TEMPLATE_MAP = {item['id']: item for item in REPORT_TEMPLATE}
+HEADER_MARKER = "指标序号"
+IMPORTER_USER = {"username": "history_importer"}
+BEIJING_TZ = ZoneInfo("Asia/Shanghai")
+DEFAULT_PROJECT = "heating_plan_2025-2026"
+CSV_NAME = re.compile(r"^(\d+)")
+
+
+class CsvFormatError(ValueError):
+    pass
+
+
+def _field_columns(header: list) -> list:
+    """每个字段在表头中的列号（同名列取最后一个），表头中没有的字段为 None。"""
+    positions = {label: j for j, label in enumerate(header)}
+    return [positions.get(field['label']) for field in FIELD_CONFIG]
+
+
+def _metric_object(metric_id: int, metric_def: dict, row: list, columns: list) -> dict:
+    metric_object = {
+        "metricId": metric_id,
+        "metricName": metric_def['name'],
+        "type": metric_def['type'],
+        "values": []
+    }
+    has_non_zero_data = False
+    for field, j in zip(FIELD_CONFIG, columns):
+        cell_value = row[j] if j is not None and j < len(row) else ''
+        final_value = cell_value
+        if field['component'] != 'label':
+            try:
+                num_val = float(cell_value) if cell_value and cell_value.strip() else 0
+                final_value = num_val
+                if num_val != 0:
+                    has_non_zero_data = True
+            except (ValueError, TypeError):
+                final_value = cell_value  # Keep as string if conversion fails
+        metric_object['values'].append({
+            "fieldId": field['id'],
+            "fieldName": field['name'],
+            "fieldLabel": field['label'],
+            "value": final_value
+        })
+    if has_non_zero_data:
+        metric_object['force'] = True
+    return metric_object
+
+
+def convert_csv(csv_path, output_id: str, log=None) -> dict:
+    """把一个 CSV 文件转换为 submit 快照。按行流式读取，文件不会整体载入内存。"""
+    log = log or (lambda message: None)
+    table_data = []
+    columns = None
+    with open(csv_path, mode='r', encoding='gbk', newline='') as f:
+        for i, row in enumerate(csv.reader(f)):
+            if not row or not any(row):
+                continue  # Skip empty rows
+
+            # --- Find header row ---
+            if columns is None:
+                if HEADER_MARKER in row:
+                    log(f"在第 {i+1} 行找到表头，开始处理数据...")
+                    columns = _field_columns(row)
+                continue  # Skip until header is found
+
+            # --- Process data rows ---
+            try:
+                metric_id = int(row[0])
+            except (ValueError, IndexError) as row_err:
+                log(f"警告: 跳过第 {i+1} 行，数据格式无效。错误: {row_err}")
+                continue
+            metric_def = REPORT_TEMPLATE_MAP.get(metric_id)
+            if not metric_def:
+                log(f"警告: 跳过第 {i+1} 行，未知的指标ID: {row[0]}")
+                continue
+            table_data.append(_metric_object(metric_id, metric_def, row, columns))
+
+    if columns is None:
+        raise CsvFormatError("未在CSV文件中找到有效的表头行 (需包含'指标序号')")
+
+    return {
+        "submittedAt": datetime.datetime.now(BEIJING_TZ).isoformat(),
+        "table": {
+            "id": output_id,
+            "name": f"Imported History for Table {output_id}",
+            "template": "subsidiaryTemplate"
+        },
+        "submittedBy": dict(IMPORTER_USER),
+        "tableData": table_data
+    }
+
+
+# --- 批量导入 ---
+
+def _history_record(project_id: str, table_id: str, snapshot: dict) -> dict:
+    return {
+        "projectId": project_id,
+        "tableId": table_id,
+        "tableName": snapshot["table"]["name"],
+        "action": "submit",
+        "timestamp": snapshot["submittedAt"],
+        "submittedBy": snapshot["submittedBy"],
+        "tableTemplate": snapshot["table"]["template"],
+    }
+
+
+def import_file(csv_path, project_id: str, table_id: str, store, locks: TableLockManager) -> dict:
+    """转换一个文件并写入表文档的 submit 快照（与提交接口相同：持表锁读-改-写并追加历史）。"""
+    started = time.perf_counter()
+    snapshot = convert_csv(csv_path, table_id)
+    converted = time.perf_counter()
+    with locks.hold_sync(project_id, table_id):
+        previous = store.read(project_id, table_id)
+        data = dict(previous)
+        data["submit"] = snapshot
+        store.write(project_id, table_id, data, previous)
+        store.append_history(project_id, _history_record(project_id, table_id, snapshot))
+    finished = time.perf_counter()
+    return {
+        "file": Path(csv_path).name,
+        "tableId": table_id,
+        "metrics": len(snapshot["tableData"]),
+        "convertSeconds": round(converted - started, 4),
+        "writeSeconds": round(finished - converted, 4),
+    }
+
+
+def store_options_from_env(data_dir=None) -> dict:
+    data_dir = Path(data_dir or os.getenv('DATA_DIR_PATH') or Path(__file__).resolve().parent.parent / "backend_data")
+    return {
+        "kind": os.getenv('TABLE_STORE', 'file'),
+        "data_dir": str(data_dir),
+        "db_path": os.getenv('TABLE_STORE_DB', str(data_dir / "tables.db")),
+        "fmt": os.getenv('TABLE_STORE_FORMAT', 'compact'),
+        "compression": os.getenv('TABLE_STORE_COMPRESS'),
+        "lock_dir": os.getenv('TABLE_LOCK_DIR', str(data_dir / ".locks")),
+    }
+
+
+def open_store(options: dict) -> tuple:
+    store = open_table_store(
+        options["kind"], Path(options["data_dir"]), DocumentCache(0), Path(options["db_path"]),
+        fmt=options["fmt"], compression=options["compression"],
+    )
+    return store, TableLockManager(Path(options["lock_dir"]))
+
+
+_WORKER: dict = {}
+
+
+def _init_worker(options: dict):
+    _WORKER["store"], _WORKER["locks"] = open_store(options)
+
+
+def _import_job(job: tuple) -> dict:
+    csv_path, project_id, table_id = job
+    try:
+        return import_file(csv_path, project_id, table_id, _WORKER["store"], _WORKER["locks"])
+    except Exception as e:
+        return {"file": Path(csv_path).name, "tableId": table_id, "error": f"{type(e).__name__}: {e}"}
+
+
+def find_csv_files(csv_dir) -> tuple:
+    """目录中的 {table_id}*.csv，返回 ([(path, table_id)], [无法导入的文件说明])。"""
+    jobs, skipped, seen = [], [], {}
+    for path in sorted(Path(csv_dir).iterdir()):
+        if not path.is_file() or path.suffix.lower() != ".csv":
+            continue
+        match = CSV_NAME.match(path.stem)
+        if not match:
+            skipped.append({"file": path.name, "error": "file name does not start with a table id"})
+            continue
+        table_id = str(int(match.group(1)))
+        if table_id in seen:
+            skipped.append({"file": path.name, "tableId": table_id, "error": f"table id already imported from {seen[table_id]}"})
+            continue
+        seen[table_id] = path.name
+        jobs.append((path, table_id))
+    return jobs, skipped
+
+
+def import_directory(csv_dir, project_id: str, options: dict, workers=None) -> dict:
+    """并行导入目录中的全部 CSV，返回 {"files": [...], "skipped": [...], "seconds": 总耗时}。"""
+    started = time.perf_counter()
+    jobs, skipped = find_csv_files(csv_dir)
+    files = []
+    if jobs:
+        workers = max(1, min(workers or os.cpu_count() or 1, len(jobs)))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(options,)) as pool:
+            files = list(pool.map(_import_job, [(str(path), project_id, table_id) for path, table_id in jobs]))
+    return {"files": files, "skipped": skipped, "seconds": round(time.perf_counter() - started, 4)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import history CSV files")
+    sub = parser.add_subparsers(dest="command")
+    imp = sub.add_parser("import", help="import a directory of {table_id}*.csv files into the table store")
+    imp.add_argument("csv_dir", type=Path)
+    imp.add_argument("--project", default=DEFAULT_PROJECT)
+    imp.add_argument("--data-dir", type=Path, help="default: $DATA_DIR_PATH or <repo>/backend_data")
+    imp.add_argument("--workers", type=int, help="number of worker processes (default: CPU count)")
+    args = parser.parse_args(argv)
+
+    if args.command == "import":
+        summary = import_directory(args.csv_dir, args.project, store_options_from_env(args.data_dir), args.workers)
+        print(json.dumps(summary, ensure_ascii=False, indent=2))
+        return 1 if summary["skipped"] or any("error" in f for f in summary["files"]) else 0
+
+    if tk is None:
+        parser.error("tkinter is not available; use the 'import' command")
+    root = tk.Tk()
+    HistoryImporterApp(root)
+    root.mainloop()
+    return 0
+
+
 class HistoryImporterApp:
     def __init__(self, root):
         self.root = root
@@ -157,98 +397,7 @@ class HistoryImporterApp:
 
         try:
             self.log("开始处理...")
-            # --- Main Conversion Logic ---
-            report_template_map = {item['id']: item for item in REPORT_TEMPLATE}
-            field_label_map = {field['label']: field for field in FIELD_CONFIG}
-
-            table_data = []
-            
-            with open(csv_file, mode='r', encoding='gbk') as f:
-                reader = csv.reader(f)
-                header = None
-                data_started = False
-
-                for i, row in enumerate(reader):
-                    if not row or not any(row):
-                        continue # Skip empty rows
-
-                    # --- Find header row ---
-                    if not data_started:
-                        if "指标序号" in row:
-                            self.log(f"在第 {i+1} 行找到表头，开始处理数据...")
-                            header = row
-                            data_started = True
-                        continue # Skip until header is found
-                    
-                    # --- Process data rows ---
-                    try:
-                        metric_id = int(row[0])
-                        metric_def = report_template_map.get(metric_id)
-                        if not metric_def:
-                            self.log(f"警告: 跳过第 {i+1} 行，未知的指标ID: {row[0]}")
-                            continue
-
-                        row_dict = {header[j]: cell for j, cell in enumerate(row) if j < len(header)}
-
-                        metric_object = {
-                            "metricId": metric_id,
-                            "metricName": metric_def['name'],
-                            "type": metric_def['type'],
-                            "values": []
-                        }
-                        
-                        has_non_zero_data = False
-
-                        # Populate values
-                        for field in FIELD_CONFIG:
-                            field_id = field['id']
-                            label = field['label']
-                            cell_value = row_dict.get(label, '')
-
-                            final_value = cell_value
-                            if field['component'] != 'label':
-                                try:
-                                    num_val = float(cell_value) if cell_value and cell_value.strip() else 0
-                                    final_value = num_val
-                                    if num_val != 0:
-                                        has_non_zero_data = True
-                                except (ValueError, TypeError):
-                                    final_value = cell_value # Keep as string if conversion fails
-                            
-                            metric_object['values'].append({
-                                "fieldId": field_id,
-                                "fieldName": field['name'],
-                                "fieldLabel": label,
-                                "value": final_value
-                            })
-                        
-                        if has_non_zero_data:
-                            metric_object['force'] = True
-                        
-                        table_data.append(metric_object)
-
-                    except (ValueError, IndexError) as row_err:
-                        self.log(f"警告: 跳过第 {i+1} 行，数据格式无效。错误: {row_err}")
-                        continue
-
-            if not data_started:
-                raise ValueError("未在CSV文件中找到有效的表头行 (需包含'指标序号')")
-
-            # --- Assemble final payload ---
-            payload = {
-                "submit": {
-                    "submittedAt": datetime.datetime.now(ZoneInfo("Asia/Shanghai")).isoformat(),
-                    "table": {
-                        "id": output_id,
-                        "name": f"Imported History for Table {output_id}",
-                        "template": "subsidiaryTemplate"
-                    },
-                    "submittedBy": {
-                        "username": "history_importer"
-                    },
-                    "tableData": table_data
-                }
-            }
+            payload = {"submit": convert_csv(csv_file, output_id, self.log)}
 
             # --- Write JSON file ---
             output_dir = Path("historyin")
@@ -258,7 +407,7 @@ class HistoryImporterApp:
             with open(output_path, 'w', encoding='utf-8') as f:
                 json.dump(payload, f, ensure_ascii=False, indent=4)
 
-            self.log(f"处理完成！总共处理了 {len(table_data)} 行指标。")
+            self.log(f"处理完成！总共处理了 {len(payload['submit']['tableData'])} 行指标。")
             messagebox.showinfo("成功", f"文件已成功导入并保存至：\n{output_path.resolve()}")
 
         except Exception as e:
@@ -268,6 +417,4 @@ class HistoryImporterApp:
 
 
 if __name__ == "__main__":
-    root = tk.Tk()
-    app = HistoryImporterApp(root)
-    root.mainloop()
\ No newline at end of file
+    raise SystemExit(main())
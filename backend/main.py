@@ -1,15 +1,52 @@
-﻿import json
+﻿import asyncio
+import functools
+import hashlib
+import json
 import copy
 import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
 from datetime import datetime
 from pathlib import Path
 from zoneinfo import ZoneInfo
-from fastapi import FastAPI, HTTPException, status, Body, Request
+from fastapi import FastAPI, HTTPException, status, Body, Request, Response
 from typing import List, Optional
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
+import fast_json
+import metrics
+from doc_cache import DocumentCache
+from aggregation import SummaryAggregator
+from formula import FormulaPlan
+from table_store import open_table_store
+from table_locks import TableLockManager
+from snapshots import SnapshotError, SnapshotStore, due
+from revisions import RevisionLog
+from hierarchy import MenuHierarchy
+from activity_log import ActivityLogger
+from activity_index import ActivityIndex, parse_time
+from user_directory import READ_ONLY_ROLES, UserDirectory, role_of
+from events import EventBus, sse_stream
+from cell_patch import CellPatchError, SnapshotDelta, parse_changes
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        return fast_json.dumps(content)
+
+@asynccontextmanager
+async def _lifespan(app: FastAPI):
+    # 启动时开始定时快照（见 _snapshot_schedule）；关闭时停止，并写出缓冲中的操作日志
+    schedule = asyncio.create_task(_snapshot_schedule()) if SNAPSHOT_INTERVAL_MINUTES > 0 else None
+    try:
+        yield
+    finally:
+        if schedule is not None:
+            schedule.cancel()
+        ACTIVITY_LOG.close()
 
-app = FastAPI()
+# 未直接返回 Response 的接口也用 fast_json 序列化（仍会先经过 jsonable_encoder）
+app = FastAPI(default_response_class=FastJSONResponse, lifespan=_lifespan)
 
 # Configure CORS
 app.add_middleware(
@@ -20,6 +57,9 @@ app.add_middleware(
     allow_headers=["*"],  # Allows all headers
 )
 
+# 请求耗时等指标 (GET /metrics)；PROFILE_REQUESTS=1 时允许用 ?profile=1 剖析单个请求
+app.add_middleware(metrics.MetricsMiddleware, profiling=os.getenv('PROFILE_REQUESTS') == '1')
+
 # --- App Configuration ---
 # Path for USER-GENERATED data (submissions, auth file).
 # 优先使用环境变量 DATA_DIR_PATH；未设置时，回退到仓库根目录下的 backend_data。
@@ -34,8 +74,50 @@ LOG_DIR = DATA_DIR / "logs"
 LOG_DIR.mkdir(parents=True, exist_ok=True)
 LOG_FILE = LOG_DIR / "activity.log"
 
-# Path for APPLICATION-LEVEL config files (templates, menu definitions). Always with the code.
-CONFIG_DIR = Path(__file__).resolve().parent / "app" / "data"
+# 操作日志由后台线程批量写入；超过 ACTIVITY_LOG_MAX_MB 或跨天时轮转为 gzip 压缩段
+ACTIVITY_LOG = ActivityLogger(
+    LOG_FILE,
+    tz=BEIJING_TZ,
+    max_bytes=int(os.getenv('ACTIVITY_LOG_MAX_MB', '64')) * 1024 * 1024,
+    flush_interval=float(os.getenv('ACTIVITY_LOG_FLUSH_SECONDS', '1')),
+)
+
+# /admin/activity 的查询索引，查询时增量导入日志
+ACTIVITY_INDEX = ActivityIndex(LOG_FILE, LOG_DIR / "activity_index.db")
+
+# 存储读写与大 JSON 的（反）序列化放到有界线程池中执行，避免阻塞事件循环
+IO_EXECUTOR = ThreadPoolExecutor(max_workers=int(os.getenv('IO_WORKERS', '8')), thread_name_prefix='io')
+
+async def _run_io(func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(IO_EXECUTOR, metrics.profiled(functools.partial(func, *args, **kwargs)))
+
+def _json_bytes(content) -> bytes:
+    # 紧凑、不转义非 ASCII，与 Starlette JSONResponse.render 的输出一致；安装了 orjson 时由它序列化
+    with metrics.span("response.serialize"):
+        return fast_json.dumps(content)
+
+async def _json_response(content) -> Response:
+    """直接返回序列化后的字节，跳过 FastAPI 的 jsonable_encoder。"""
+    return Response(content=await _run_io(_json_bytes, content), media_type="application/json")
+
+def _parse_request_body(body: bytes):
+    with metrics.json_parse("request"):
+        return fast_json.loads(body)
+
+async def _read_json_body(request: Request) -> dict:
+    body = await request.body()
+    try:
+        payload = await _run_io(_parse_request_body, body) if body else None
+    except ValueError:
+        raise HTTPException(status_code=422, detail="Request body is not valid JSON.")
+    if not isinstance(payload, dict):
+        raise HTTPException(status_code=422, detail="Request body must be a JSON object.")
+    return payload
+
+# Path for APPLICATION-LEVEL config files (templates, menu definitions). Always with the code;
+# CONFIG_DIR_PATH 仅供基准测试指向生成的合成配置 (benchmarks/synthetic.py)
+CONFIG_DIR = Path(os.getenv('CONFIG_DIR_PATH') or Path(__file__).resolve().parent / "app" / "data")
 
 # --- Update file paths ---
 
@@ -52,89 +134,162 @@ TEMPLATE_FILE = CONFIG_DIR / "heating_plan_2025-2026_data" / "templatecopy.json"
 with open(TEMPLATE_FILE, "r", encoding="utf-8") as f:
     REPORT_TEMPLATE = json.load(f)
 
+GROUP_TEMPLATE_FILE = CONFIG_DIR / "heating_plan_2025-2026_data" / "groupTemplate.json"
+with open(GROUP_TEMPLATE_FILE, "r", encoding="utf-8") as f:
+    GROUP_FIELD_CONFIG = json.load(f)
+
+# 前端模板 (subsidiaryTemplate.js / groupTemplate.js) 中公式部分的副本；汇总表在服务端按它重算派生单元格，
+# SUMMARY_FORMULAS=0 时关闭，汇总结果中的计算单元格留给前端计算
+FORMULA_FILE = CONFIG_DIR / "heating_plan_2025-2026_data" / "formulacopy.json"
+with open(FORMULA_FILE, "r", encoding="utf-8") as f:
+    FORMULA_CONFIG = json.load(f)
+SUMMARY_FORMULAS = os.getenv('SUMMARY_FORMULAS', '1') != '0'
+
+# 已解析表文档的进程内缓存（按磁盘字节数计量容量，默认 256MB，可用 DOC_CACHE_MAX_MB 调整）
+DOC_CACHE = DocumentCache(int(os.getenv('DOC_CACHE_MAX_MB', '256')) * 1024 * 1024)
+
+# 表文档存储：默认 file（DATA_DIR 下的 JSON 文件）；TABLE_STORE=sqlite 时使用单文件 SQLite
+# TABLE_STORE_FORMAT=compact|json 选择落盘编码，TABLE_STORE_COMPRESS=gzip|zstd 可选压缩（仅文件存储）
+TABLE_STORE_DB = Path(os.getenv('TABLE_STORE_DB', str(DATA_DIR / "tables.db")))
+STORE = open_table_store(
+    os.getenv('TABLE_STORE', 'file'), DATA_DIR, DOC_CACHE, TABLE_STORE_DB,
+    fmt=os.getenv('TABLE_STORE_FORMAT', 'compact'), compression=os.getenv('TABLE_STORE_COMPRESS'),
+)
+
+# 表文档的修订记录（见 revisions.py），供 GET data/table/{tid}?asOf= 读取历史时刻；TABLE_REVISIONS=0 时关闭
+REVISIONS = RevisionLog(
+    Path(os.getenv('REVISIONS_DB', str(DATA_DIR / "revisions.db"))),
+    int(os.getenv('REVISION_CHECKPOINT_EVERY', '32')),
+    tz=BEIJING_TZ,
+) if os.getenv('TABLE_REVISIONS', '1') != '0' else None
+
+# 同一张表的读-改-写（含历史追加）串行执行；跨 worker 进程由锁文件互斥
+TABLE_LOCKS = TableLockManager(Path(os.getenv('TABLE_LOCK_DIR', str(DATA_DIR / ".locks"))), IO_EXECUTOR)
+
+# 表文档的内容寻址快照（见 snapshots.py），未变化的表不重复存储
+# SNAPSHOT_INTERVAL_MINUTES>0 时定时为各项目拍快照（无变化时跳过），只保留最近 SNAPSHOT_KEEP 份
+SNAPSHOTS = SnapshotStore(Path(os.getenv('SNAPSHOT_DIR', str(DATA_DIR / ".snapshots"))), STORE,
+                          os.getenv('SNAPSHOT_COMPRESS') or None, tz=BEIJING_TZ)
+SNAPSHOT_INTERVAL_MINUTES = float(os.getenv('SNAPSHOT_INTERVAL_MINUTES', '0'))
+SNAPSHOT_KEEP = int(os.getenv('SNAPSHOT_KEEP', '48'))
+
 ALL_TABLES = {table["id"]: table for group in MENU_DATA for table in group["tables"]}
 TABLE_TO_GROUP = {table["id"]: group["name"] for group in MENU_DATA for table in group["tables"]}
 
-# Build child-parent relationships (direct only)
-CHILDREN_MAP: dict[str, list[str]] = {}
-PARENT_MAP: dict[str, list[str]] = {}
-for group in MENU_DATA:
-    for t in group.get("tables", []):
-        tid = str(t.get("id"))
-        children: list[str] = []
-        subs = t.get("subsidiaries")
-        if isinstance(subs, list):
-            children = [str(x) for x in subs]
-        elif isinstance(subs, dict):
-            try:
-                children = [str(v) for v in subs.values()]
-            except Exception:
-                children = []
-        if children:
-            CHILDREN_MAP[tid] = children
-            for cid in children:
-                PARENT_MAP.setdefault(cid, []).append(tid)
-
-def _load_users():
+# 汇总关系索引：直接上下级、传递闭包、拓扑序与区域范围；菜单中存在环时启动失败
+HIERARCHY = MenuHierarchy(MENU_DATA)
+CHILDREN_MAP: dict[str, list[str]] = HIERARCHY.children
+PARENT_MAP: dict[str, list[str]] = HIERARCHY.parents
+
+def _read_table_doc(project_id: str, table_id: str) -> dict:
+    """读取表文档（经由 STORE 与文档缓存）。不存在或无法解析时返回 {}。
+    返回的字典与缓存共享，不可原地修改。
+    """
+    return STORE.read(project_id, str(table_id))
+
+def _write_table_doc(project_id: str, table_id: str, data: dict, previous: Optional[dict] = None,
+                     at: Optional[str] = None):
+    """at 为这次写入对应的操作时间（提交时间、批准时间等），作为修订时间；缺省为当前时间。"""
+    before = STORE.signature(project_id, str(table_id)) if REVISIONS is not None else None
+    STORE.write(project_id, str(table_id), data, previous)
+    _record_revision(project_id, table_id, previous, data, before, at)
+    # 把该表的变化增量应用到依赖它的汇总表
+    AGGREGATOR.notify(project_id, str(table_id))
+
+def _record_revision(project_id: str, table_id: str, previous: Optional[dict], data: dict,
+                     before: Optional[tuple], at: Optional[str]):
+    # 文档已经落盘：记录失败不影响本次写入，下一次写入会因签名不连续而记为检查点
+    if REVISIONS is None:
+        return
     try:
-        with open(AUTH_FILE, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except Exception:
-        return []
+        ts = parse_time(at, BEIJING_TZ) if isinstance(at, str) else None
+    except ValueError:
+        ts = None
+    try:
+        REVISIONS.record(project_id, str(table_id), previous, data, before, STORE.signature(project_id, str(table_id)), ts)
+    except Exception as e:
+        _log_action("revision_failed", details={"projectId": project_id, "tableId": str(table_id), "error": str(e)})
+
+def _doc_revision(project_id: str, table_id: str) -> Optional[str]:
+    """表文档自身的版本号（不含下级表），供单元格级修改做乐观并发校验；文档不存在时返回 None。"""
+    signature = STORE.signature(project_id, str(table_id))
+    if signature is None:
+        return None
+    return hashlib.sha1(repr(signature).encode("ascii")).hexdigest()[:16]
+
+AGGREGATOR = SummaryAggregator(
+    ALL_TABLES,
+    REPORT_TEMPLATE,
+    GROUP_FIELD_CONFIG,
+    read_doc=_read_table_doc,
+    doc_signature=STORE.signature,
+    tz=BEIJING_TZ,
+    list_formulas=FormulaPlan(FORMULA_CONFIG["subsidiaryFields"], FORMULA_CONFIG["metrics"]) if SUMMARY_FORMULAS else None,
+    group_formulas=FormulaPlan(FORMULA_CONFIG["groupFields"], FORMULA_CONFIG["metrics"]) if SUMMARY_FORMULAS else None,
+)
+
+def _table_inputs(table_id: str) -> list:
+    """响应内容依赖的全部表：自身、全部下级表及汇总实际读取的来源表。"""
+    tids = {table_id} | HIERARCHY.descendants.get(table_id, frozenset())
+    return sorted(tids.union(*(AGGREGATOR.sources(tid) for tid in tids)))
+
+TABLE_INPUTS = {tid: _table_inputs(tid) for tid in ALL_TABLES}
+
+# 配置文件变化（重启后）会改变汇总结果，纳入 ETag
+CONFIG_DIGEST = hashlib.sha1(
+    json.dumps([MENU_DATA, REPORT_TEMPLATE, GROUP_FIELD_CONFIG, FORMULA_CONFIG, SUMMARY_FORMULAS], ensure_ascii=False, sort_keys=True).encode("utf-8")
+).hexdigest()
+
+# GET data/table 的序列化响应缓存，按 ETag 校验（默认 64MB，可用 RESPONSE_CACHE_MAX_MB 调整）
+RESPONSE_CACHE = DocumentCache(int(os.getenv('RESPONSE_CACHE_MAX_MB', '64')) * 1024 * 1024)
+
+metrics.register_cache("documents", DOC_CACHE)
+metrics.register_cache("responses", RESPONSE_CACHE)
+metrics.register_cache("aggregations", AGGREGATOR)
+
+# 表状态变化的进程内发布/订阅（GET /project/{id}/events）；每个项目保留最近 EVENT_HISTORY 条供断线续传
+EVENTS = EventBus(history=int(os.getenv('EVENT_HISTORY', '1024')))
+EVENT_HEARTBEAT_SECONDS = float(os.getenv('EVENT_HEARTBEAT_SECONDS', '15'))
+
+# POST data/tables 单次请求的表数量上限
+MAX_BATCH_TABLES = int(os.getenv('MAX_BATCH_TABLES', '200'))
+
+def _input_signatures(project_id: str, table_id: str) -> dict:
+    """{响应依赖的表: 存储签名}（文件为 mtime/size/inode，SQLite 为写入代数），跨 worker 一致。"""
+    return {tid: STORE.signature(project_id, tid) for tid in TABLE_INPUTS.get(table_id, [table_id])}
+
+def _etag_of(project_id: str, table_id: str, signatures: dict) -> str:
+    # 由存储签名得出，因此 ETag 为强校验值
+    parts = [CONFIG_DIGEST, project_id, table_id] + [f"{tid}={sig}" for tid, sig in signatures.items()]
+    return '"' + hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest() + '"'
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get('if-none-match')
+    if not header:
+        return False
+    for candidate in header.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == etag or candidate == '*':
+            return True
+    return False
+
+# auth.json 按 username 建索引，文件变化时自动重新加载
+USERS = UserDirectory(AUTH_FILE)
 
 def _get_user_from_request(request: Request):
     username = request.headers.get('X-User-Name') if hasattr(request, 'headers') else None
-    if not username:
-        return None
-    for u in _load_users():
-        if u.get('username') == username:
-            return u
-    return None
+    return USERS.get(username)
 
 def _is_read_only_user(user: Optional[dict]) -> bool:
     """只读用户判定：super_viewer 等角色不可执行任何写操作。
     允许扩展其它只读别名，保持后端兜底安全。
     """
-    if not user or not isinstance(user, dict):
-        return False
-    role = user.get('globalRole') or user.get('role')
-    return role in { 'super_viewer', 'viewer', 'read_only' }
+    return role_of(user) in READ_ONLY_ROLES
 
 def _is_table_approved(project_id: str, table_id: str) -> bool:
-    submissions_dir = DATA_DIR / f"{project_id}_data"
-    file_path = submissions_dir / f"{table_id}.json"
-    if not file_path.exists():
-        return False
-    try:
-        with open(file_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        return bool(data.get("approved"))
-    except Exception:
-        return False
-
-def _region_scope_ids(region_name: str):
-    # 所属区域的汇总表ID集合及其（递归）子表ID集合
-    region_table_ids = set()
-    child_ids = set()
-    id_to_table = {str(t["id"]): t for g in MENU_DATA for t in g.get("tables", [])}
-
-    for group in MENU_DATA:
-        if group.get('name') == region_name:
-            for t in group.get('tables', []):
-                tid = str(t.get('id'))
-                region_table_ids.add(tid)
-                subs = t.get('subsidiaries')
-                if isinstance(subs, list):
-                    stack = [str(s) for s in subs]
-                    while stack:
-                        cid = stack.pop()
-                        if cid in child_ids:
-                            continue
-                        child_ids.add(cid)
-                        ct = id_to_table.get(cid)
-                        if ct and isinstance(ct.get('subsidiaries'), list):
-                            stack.extend([str(s) for s in ct.get('subsidiaries')])
-    return region_table_ids, child_ids
+    return bool(_read_table_doc(project_id, table_id).get("approved"))
 
 def _can_approve(table_id: str, user: dict, action: str):
     # action: 'approve' or 'unapprove'
@@ -154,7 +309,7 @@ def _can_approve(table_id: str, user: dict, action: str):
 
     if role == 'regional_admin':
         # 区域管理员：批准仅限本区域汇总表；撤销仅限其下属单位表
-        region_tables, region_children = _region_scope_ids(unit or '')
+        region_tables, region_children = HIERARCHY.region_scope(unit or '')
         tid = str(table_id)
         if action == 'approve':
             return tid in region_tables
@@ -172,18 +327,15 @@ class UserLogin(BaseModel):
 
 @app.post("/login")
 def login(user_login: UserLogin, request: Request):
-    try:
-        with open(AUTH_FILE, "r", encoding="utf-8") as f:
-            users = json.load(f)
-    except FileNotFoundError:
+    if not USERS.available:
         _log_action("login", request, username=user_login.username, details={"result": "failed", "reason": "auth_file_missing"})
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Authentication file not found on the server."
         )
 
-    for user in users:
-        if user["username"] == user_login.username and user["password"] == user_login.password:
+    for user in USERS.candidates(user_login.username):
+        if user.get("password") == user_login.password:
             user_info = user.copy()
             del user_info["password"]
             _log_action("login", request, username=user_info.get("username") or user_login.username, details={"result": "success"})
@@ -196,24 +348,14 @@ def login(user_login: UserLogin, request: Request):
         headers={"WWW-Authenticate": "Bearer"},
     )
 
-def _update_data_file(file_path: Path, key: str, payload: dict):
-    data = {}
-    if file_path.exists():
-        try:
-            with open(file_path, "r", encoding="utf-8") as f:
-                content = f.read()
-                if content:
-                    data = json.loads(content)
-                if not isinstance(data, dict):
-                    data = {}
-        except (json.JSONDecodeError, IOError):
-            data = {}
-
+def _update_data_file(project_id: str, table_id: str, key: str, payload: dict):
+    # 浅拷贝缓存中的文档，只替换顶层键，不影响其它读者持有的对象
+    previous = _read_table_doc(project_id, table_id)
+    data = dict(previous)
     data[key] = payload
 
     try:
-        with open(file_path, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=4)
+        _write_table_doc(project_id, table_id, data, previous, payload.get('submittedAt') if key == 'submit' else None)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -306,14 +448,25 @@ def _log_action(action, request=None, username=None, details=None):
         if details:
             entry['details'] = details
 
-        LOG_DIR.mkdir(parents=True, exist_ok=True)
-        with open(LOG_FILE, 'a', encoding='utf-8') as log_file:
-            log_file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        ACTIVITY_LOG.log(entry)
     except Exception:
         pass
 
 
-def _append_history_record(submissions_dir: Path, project_id: str, table_id: str, payload: dict, action: str):
+def _status_event(project_id: str, table_id: str, at: Optional[str], by: Optional[str]) -> dict:
+    meta = STORE.status_meta(project_id, [str(table_id)]).get(str(table_id))
+    return {"tableId": str(table_id), "status": _table_status(meta)["status"], "at": at, "by": by}
+
+async def _publish_status(project_id: str, table_id: str, at: Optional[str], actor):
+    """写入完成后（仍持有表锁，保证同一张表的事件顺序）推送状态变化；god 的操作不推送。"""
+    if _is_god(actor):
+        return
+    by = actor.get("username") if isinstance(actor, dict) else actor
+    event = await _run_io(_status_event, project_id, table_id, at, by)
+    EVENTS.publish(project_id, event["tableId"], event)
+
+
+def _append_history_record(project_id: str, table_id: str, payload: dict, action: str):
     payload = payload if isinstance(payload, dict) else {}
     table_info = payload.get("table") if isinstance(payload.get("table"), dict) else {}
     # Derive timestamp by action type first, then fallback to generic fields, then now()
@@ -355,23 +508,8 @@ def _append_history_record(submissions_dir: Path, project_id: str, table_id: str
         if template_name:
             record["tableTemplate"] = template_name
 
-    history_file = submissions_dir / "history.json"
-    history = []
-
-    if history_file.exists():
-        try:
-            with open(history_file, "r", encoding="utf-8-sig") as f:
-                existing = json.load(f)
-                if isinstance(existing, list):
-                    history = existing
-        except (json.JSONDecodeError, IOError):
-            history = []
-
-    history.append(record)
-
     try:
-        with open(history_file, "w", encoding="utf-8") as f:
-            json.dump(history, f, ensure_ascii=False, indent=4)
+        STORE.append_history(project_id, record)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -379,14 +517,12 @@ def _append_history_record(submissions_dir: Path, project_id: str, table_id: str
         )
 
 @app.post("/project/{project_id}/table/{table_id}/submit")
-async def submit_data(project_id: str, table_id: str, request: Request, payload: dict = Body(...)):
+async def submit_data(project_id: str, table_id: str, request: Request):
+    payload = await _read_json_body(request)
     # 只读用户不可提交
-    user = _get_user_from_request(request)
+    user = await _run_io(_get_user_from_request, request)
     if _is_read_only_user(user):
         raise HTTPException(status_code=403, detail="Read-only role is not allowed to submit.")
-    submissions_dir = DATA_DIR / f"{project_id}_data"
-    submissions_dir.mkdir(parents=True, exist_ok=True)
-    file_path = submissions_dir / f"{table_id}.json"
     # Normalize submit metadata server-side to ensure accurate history
     try:
         if not isinstance(payload, dict):
@@ -394,19 +530,85 @@ async def submit_data(project_id: str, table_id: str, request: Request, payload:
         if not payload.get('submittedAt'):
             payload['submittedAt'] = datetime.now(BEIJING_TZ).isoformat()
         if not payload.get('submittedBy'):
-            user = _get_user_from_request(request)
             if user:
                 payload['submittedBy'] = user
     except Exception:
         pass
-    _update_data_file(file_path, "submit", payload)
-    _append_history_record(submissions_dir, project_id, table_id, payload, "submit")
+    async with TABLE_LOCKS.hold(project_id, table_id):
+        await _run_io(_update_data_file, project_id, table_id, "submit", payload)
+        await _run_io(_append_history_record, project_id, table_id, payload, "submit")
+        await _publish_status(project_id, table_id, payload.get('submittedAt'), user or payload.get('submittedBy'))
     _log_action("submit", request, username=_extract_username(payload, request), details={"projectId": project_id, "tableId": table_id})
     return {"message": f"Data for table ID '{table_id}' submitted successfully."}
 
+def _approve_snapshot(project_id: str, table_id: str, user: Optional[dict]) -> dict:
+    """把当前 submit 快照复制为 approved 快照并落盘，返回 approved 快照。"""
+    if not STORE.exists(project_id, str(table_id)):
+        raise HTTPException(status_code=404, detail="Table data not found.")
+
+    try:
+        previous = STORE.load(project_id, str(table_id)) or {}
+        data = dict(previous)
+    except Exception:
+        raise HTTPException(status_code=500, detail="Failed to read table file.")
+
+    submit_payload = data.get('submit')
+    if not submit_payload:
+        raise HTTPException(status_code=400, detail="No submission to approve.")
+
+    approved = copy.deepcopy(submit_payload)
+    approved['approvedAt'] = datetime.now(BEIJING_TZ).isoformat()
+    approved['approvedBy'] = user
+    data['approved'] = approved
+
+    try:
+        _write_table_doc(project_id, table_id, data, previous, approved['approvedAt'])
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to write approval: {e}")
+    return approved
+
+def _withdraw_approval(project_id: str, table_id: str, user: Optional[dict]):
+    """移除 approved 快照并落盘；返回 (unapproved 元数据, 原批准快照)，未批准时返回 None。"""
+    if not STORE.exists(project_id, str(table_id)):
+        raise HTTPException(status_code=404, detail="Table data not found.")
+
+    try:
+        previous = STORE.load(project_id, str(table_id)) or {}
+        data = dict(previous)
+    except Exception:
+        raise HTTPException(status_code=500, detail="Failed to read table file.")
+
+    if 'approved' not in data:
+        return None
+    approved_snapshot = data['approved']
+    del data['approved']
+    # 记录撤销批准的操作信息，供仪表盘显示
+    data['unapproved'] = {
+        'unapprovedAt': datetime.now(BEIJING_TZ).isoformat(),
+        'unapprovedBy': user,
+    }
+    # 若不存在提交快照，则用原批准快照回填 submit，确保状态可回退为“已提交”
+    try:
+        if 'submit' not in data and isinstance(approved_snapshot, dict):
+            restored = copy.deepcopy(approved_snapshot)
+            # 清理与批准相关的字段，保留原提交元数据
+            restored.pop('approvedAt', None)
+            restored.pop('approvedBy', None)
+            data['submit'] = restored
+    except Exception:
+        pass
+    try:
+        _write_table_doc(project_id, table_id, data, previous, data['unapproved']['unapprovedAt'])
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to remove approval: {e}")
+    return data['unapproved'], approved_snapshot
+
+async def _approved_flags(project_id: str, table_ids: list) -> list:
+    return await asyncio.gather(*(_run_io(_is_table_approved, project_id, tid) for tid in table_ids))
+
 @app.post("/project/{project_id}/table/{table_id}/approve")
 async def approve_table(project_id: str, table_id: str, request: Request):
-    user = _get_user_from_request(request)
+    user = await _run_io(_get_user_from_request, request)
     if _is_read_only_user(user):
         raise HTTPException(status_code=403, detail="Read-only role is not allowed to approve.")
     if not _can_approve(str(table_id), user, 'approve'):
@@ -416,7 +618,8 @@ async def approve_table(project_id: str, table_id: str, request: Request):
     t_id = str(table_id)
     direct_children = CHILDREN_MAP.get(t_id, [])
     if direct_children:
-        not_ready = [cid for cid in direct_children if not _is_table_approved(project_id, cid)]
+        flags = await _approved_flags(project_id, direct_children)
+        not_ready = [cid for cid, approved in zip(direct_children, flags) if not approved]
         if not_ready:
             raise HTTPException(
                 status_code=400,
@@ -426,41 +629,17 @@ async def approve_table(project_id: str, table_id: str, request: Request):
                 }
             )
 
-    submissions_dir = DATA_DIR / f"{project_id}_data"
-    submissions_dir.mkdir(parents=True, exist_ok=True)
-    file_path = submissions_dir / f"{table_id}.json"
-    if not file_path.exists():
-        raise HTTPException(status_code=404, detail="Table data not found.")
-
-    try:
-        with open(file_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-    except Exception:
-        raise HTTPException(status_code=500, detail="Failed to read table file.")
-
-    submit_payload = data.get('submit')
-    if not submit_payload:
-        raise HTTPException(status_code=400, detail="No submission to approve.")
-
-    approved = copy.deepcopy(submit_payload)
-    approved['approvedAt'] = datetime.now(BEIJING_TZ).isoformat()
-    approved['approvedBy'] = user
-    data['approved'] = approved
-
-    try:
-        with open(file_path, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=4)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to write approval: {e}")
-
-    # history uses operator and action time
-    _append_history_record(submissions_dir, project_id, table_id, {"approvedAt": approved.get("approvedAt"), "submittedBy": user}, "approve")
+    async with TABLE_LOCKS.hold(project_id, table_id):
+        approved = await _run_io(_approve_snapshot, project_id, table_id, user)
+        # history uses operator and action time
+        await _run_io(_append_history_record, project_id, table_id, {"approvedAt": approved.get("approvedAt"), "submittedBy": user}, "approve")
+        await _publish_status(project_id, table_id, approved.get("approvedAt"), user)
     _log_action("approve", request, username=_extract_username(approved, request), details={"projectId": project_id, "tableId": table_id})
     return {"message": "Approved."}
 
 @app.post("/project/{project_id}/table/{table_id}/unapprove")
 async def unapprove_table(project_id: str, table_id: str, request: Request):
-    user = _get_user_from_request(request)
+    user = await _run_io(_get_user_from_request, request)
     if _is_read_only_user(user):
         raise HTTPException(status_code=403, detail="Read-only role is not allowed to unapprove.")
     if not _can_approve(str(table_id), user, 'unapprove'):
@@ -470,7 +649,8 @@ async def unapprove_table(project_id: str, table_id: str, request: Request):
     t_id = str(table_id)
     direct_parents = PARENT_MAP.get(t_id, [])
     if direct_parents:
-        blocking = [pid for pid in direct_parents if _is_table_approved(project_id, pid)]
+        flags = await _approved_flags(project_id, direct_parents)
+        blocking = [pid for pid, approved in zip(direct_parents, flags) if approved]
         if blocking:
             raise HTTPException(
                 status_code=400,
@@ -480,391 +660,168 @@ async def unapprove_table(project_id: str, table_id: str, request: Request):
                 }
             )
 
-    submissions_dir = DATA_DIR / f"{project_id}_data"
-    submissions_dir.mkdir(parents=True, exist_ok=True)
-    file_path = submissions_dir / f"{table_id}.json"
-    if not file_path.exists():
-        raise HTTPException(status_code=404, detail="Table data not found.")
-
-    try:
-        with open(file_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-    except Exception:
-        raise HTTPException(status_code=500, detail="Failed to read table file.")
-
-    if 'approved' in data:
-        approved_snapshot = data['approved']
-        del data['approved']
-        # 记录撤销批准的操作信息，供仪表盘显示
-        data['unapproved'] = {
-            'unapprovedAt': datetime.now(BEIJING_TZ).isoformat(),
-            'unapprovedBy': user,
-        }
-        # 若不存在提交快照，则用原批准快照回填 submit，确保状态可回退为“已提交”
-        try:
-            if 'submit' not in data and isinstance(approved_snapshot, dict):
-                restored = copy.deepcopy(approved_snapshot)
-                # 清理与批准相关的字段，保留原提交元数据
-                restored.pop('approvedAt', None)
-                restored.pop('approvedBy', None)
-                data['submit'] = restored
-        except Exception:
-            pass
-        try:
-            with open(file_path, "w", encoding="utf-8") as f:
-                json.dump(data, f, ensure_ascii=False, indent=4)
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Failed to remove approval: {e}")
-        _append_history_record(submissions_dir, project_id, table_id, {"unapprovedAt": data['unapproved']['unapprovedAt'], "submittedBy": user}, "unapprove")
+    async with TABLE_LOCKS.hold(project_id, table_id):
+        withdrawn = await _run_io(_withdraw_approval, project_id, table_id, user)
+        if withdrawn is not None:
+            await _run_io(_append_history_record, project_id, table_id, {"unapprovedAt": withdrawn[0]['unapprovedAt'], "submittedBy": user}, "unapprove")
+            await _publish_status(project_id, table_id, withdrawn[0]['unapprovedAt'], user)
+    if withdrawn is not None:
+        approved_snapshot = withdrawn[1]
         _log_action("unapprove", request, username=_extract_username(approved_snapshot, request), details={"projectId": project_id, "tableId": table_id})
     return {"message": "Unapproved."}
 
 
 @app.post("/project/{project_id}/table/{table_id}/save_draft")
-async def save_draft(project_id: str, table_id: str, request: Request, payload: dict = Body(...)):
+async def save_draft(project_id: str, table_id: str, request: Request):
+    payload = await _read_json_body(request)
     # 只读用户不可暂存到服务器
-    user = _get_user_from_request(request)
+    user = await _run_io(_get_user_from_request, request)
     if _is_read_only_user(user):
         raise HTTPException(status_code=403, detail="Read-only role is not allowed to save draft.")
-    submissions_dir = DATA_DIR / f"{project_id}_data"
-    submissions_dir.mkdir(parents=True, exist_ok=True)
-    file_path = submissions_dir / f"{table_id}.json"
-    _update_data_file(file_path, "temp", payload)
-    _append_history_record(submissions_dir, project_id, table_id, {"savedAt": datetime.now(BEIJING_TZ).isoformat(), "submittedBy": _get_user_from_request(request) or _extract_username(payload, request)}, "save_draft")
+    async with TABLE_LOCKS.hold(project_id, table_id):
+        await _run_io(_update_data_file, project_id, table_id, "temp", payload)
+        saved_at = datetime.now(BEIJING_TZ).isoformat()
+        actor = user or _extract_username(payload, request)
+        await _run_io(_append_history_record, project_id, table_id, {"savedAt": saved_at, "submittedBy": actor}, "save_draft")
+        await _publish_status(project_id, table_id, saved_at, actor)
     _log_action("save_draft", request, username=_extract_username(payload, request), details={"projectId": project_id, "tableId": table_id})
     return {"message": f"Draft for table ID '{table_id}' saved successfully."}
 
 
-async def get_table_0_data(project_id: str):
+PATCH_ACTIONS = {"submit": "submit", "save_draft": "temp"}
+
+def _patch_table_doc(project_id: str, table_id: str, kind: str, changes: list, base_revision: str, meta: dict) -> tuple:
+    """在 base_revision 上应用单元格修改并落盘，返回 (新快照, 变化的单元格数, 新版本号)。"""
+    signature = STORE.signature(project_id, str(table_id))
+    revision = _doc_revision(project_id, table_id)
+    if revision is None or revision != base_revision:
+        raise HTTPException(
+            status_code=409,
+            detail={"message": "Table data has changed since baseRevision.", "revision": revision},
+        )
+    try:
+        previous = STORE.load(project_id, str(table_id)) or {}
+    except Exception:
+        raise HTTPException(status_code=500, detail="Failed to read table file.")
+    try:
+        delta = SnapshotDelta.build(previous, kind, changes, meta)
+    except CellPatchError as e:
+        if not e.cells:
+            raise HTTPException(status_code=409, detail=f"{e} Send the full table via submit or save_draft.")
+        raise HTTPException(status_code=422, detail={"message": str(e), "cells": e.cells})
+    data = delta.apply(previous)
+    try:
+        STORE.patch(project_id, str(table_id), delta, data, previous)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"An unexpected error occurred during file write: {str(e)}"
+        )
+    _record_revision(project_id, table_id, previous, data, signature, meta.get('submittedAt') or meta.get('savedAt'))
+    AGGREGATOR.notify(project_id, str(table_id), delta.changes(previous, data))
+    return data[kind], len(delta.cells), _doc_revision(project_id, table_id)
+
+@app.patch("/project/{project_id}/table/{table_id}/cells")
+async def patch_cells(project_id: str, table_id: str, request: Request):
+    """只提交变化的单元格：{"action": "submit"|"save_draft", "baseRevision": ..., "changes": [{metricId, fieldId, value}]}。
+
+    baseRevision 为 GET data/table 响应头 X-Table-Revision（也可用 If-Match 头传递）；
+    文档在此之后被修改过时返回 409 及当前版本号，客户端应重新加载后再提交。
+    """
+    payload = await _read_json_body(request)
+    user = await _run_io(_get_user_from_request, request)
+    action = payload.get('action')
+    if action not in PATCH_ACTIONS:
+        raise HTTPException(status_code=422, detail="action must be 'submit' or 'save_draft'.")
+    if _is_read_only_user(user):
+        raise HTTPException(status_code=403, detail=f"Read-only role is not allowed to {action.replace('_', ' ')}.")
+    base_revision = payload.get('baseRevision') or (request.headers.get('if-match') or '').strip().strip('"')
+    if not base_revision:
+        raise HTTPException(status_code=422, detail="baseRevision is required.")
+    try:
+        changes = parse_changes(payload.get('changes'))
+    except CellPatchError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    actor = user or payload.get('submittedBy') or _extract_username(payload, request)
+    at = datetime.now(BEIJING_TZ).isoformat()
+    # 草稿与 save_draft 的历史记录一致，只记暂存时间，不改动快照的提交时间；取不到操作人时保留原快照的 submittedBy
+    meta = {'submittedAt': at} if action == 'submit' else {'savedAt': at}
+    if actor:
+        meta['submittedBy'] = actor
+    async with TABLE_LOCKS.hold(project_id, table_id):
+        snapshot, cells, revision = await _run_io(
+            _patch_table_doc, project_id, table_id, PATCH_ACTIONS[action], changes, base_revision, meta
+        )
+        history = snapshot if action == 'submit' else {"savedAt": at, "submittedBy": actor}
+        await _run_io(_append_history_record, project_id, table_id, history, action)
+        await _publish_status(project_id, table_id, at, actor)
+    _log_action(action, request, username=_extract_username(snapshot, request),
+                details={"projectId": project_id, "tableId": table_id, "cells": cells})
+    if action == 'submit':
+        message = f"Data for table ID '{table_id}' submitted successfully."
+    else:
+        message = f"Draft for table ID '{table_id}' saved successfully."
+    return {"message": message, "revision": revision, "cells": cells}
+
+
+async def get_table_0_data(project_id: str, snapshot: Optional[dict] = None):
     """
     Special function to aggregate data for Table 0.
-    Reads data directly from subsidiary JSON files while preserving manual overrides on the summary table itself.
+    Served from the materialized group view; manual overrides on the summary table itself are preserved.
     """
-    table_config = ALL_TABLES.get('0')
-    if not table_config:
+    if not ALL_TABLES.get('0'):
         return {}
+    return await _aggregate(project_id, '0', snapshot)
 
-    report_template = REPORT_TEMPLATE
-    GROUP_TEMPLATE_FILE = CONFIG_DIR / "heating_plan_2025-2026_data" / "groupTemplate.json"
-    with open(GROUP_TEMPLATE_FILE, "r", encoding="utf-8") as f:
-        field_config = json.load(f)
-
-    field_label_map = {field['id']: field.get('label') for field in field_config}
-    metric_name_map = {row['id']: row['name'] for row in report_template}
-
-    key_to_plan_field_id = {field['name'].split('.')[0]: field['id'] for field in field_config if '.plan' in field['name']}
-    key_to_same_period_field_id = {field['name'].split('.')[0]: field['id'] for field in field_config if '.samePeriod' in field['name']}
 
-    table_data = []
-    for row_template in report_template:
-        new_row = {
-            "metricId": row_template['id'],
-            "name": row_template['name'],
-            "unit": row_template['unit'],
-            "values": []
-        }
-        for field in field_config:
-            field_id = field['id']
-            value = 0
-            if field_id == 1001:
-                value = row_template['name']
-            elif field_id == 1002:
-                value = row_template['unit']
-            new_row["values"].append({"fieldId": field_id, "value": value})
-        table_data.append(new_row)
-
-    subsidiaries_map = table_config.get("subsidiaries", {})
-    submissions_dir = DATA_DIR / f"{project_id}_data"
-
-    def _load_table_json(table_file_id: str) -> dict:
-        file_path = submissions_dir / f"{table_file_id}.json"
-        if not file_path.exists():
-            return {}
-        try:
-            with open(file_path, "r", encoding="utf-8") as f:
-                content = f.read()
-                if content:
-                    return json.loads(content)
-        except (json.JSONDecodeError, IOError):
-            return {}
-        return {}
+def _read_snapshot_entry(project_id: str, table_id: str) -> tuple:
+    # 先取存储签名再读文档，见 SummaryAggregator._read_source
+    signature = STORE.signature(project_id, table_id)
+    return _read_table_doc(project_id, table_id), signature
 
-    def _select_latest_payload(content):
-        if not isinstance(content, dict):
-            return None
-        approved_payload = content.get("approved")
-        submit_payload = content.get("submit")
-        candidates: list[tuple[dict, str]] = []
-        if isinstance(approved_payload, dict) and isinstance(approved_payload.get("tableData"), list):
-            ts_a = approved_payload.get("approvedAt") or approved_payload.get("timestamp") or ""
-            candidates.append((approved_payload, ts_a))
-        if isinstance(submit_payload, dict) and isinstance(submit_payload.get("tableData"), list):
-            ts_s = submit_payload.get("submittedAt") or submit_payload.get("timestamp") or ""
-            candidates.append((submit_payload, ts_s))
-        if not candidates:
-            return None
-
-        def _parse_ts(ts: str):
-            try:
-                ts_norm = ts.replace('Z', '+00:00') if isinstance(ts, str) else ""
-                return datetime.fromisoformat(ts_norm)
-            except Exception:
-                return None
-
-        return max(
-            candidates,
-            key=lambda item: _parse_ts(item[1]) or datetime.min.replace(tzinfo=BEIJING_TZ)
-        )[0]
-
-    for sub_key, sub_id in subsidiaries_map.items():
-        target_plan_id = key_to_plan_field_id.get(sub_key)
-        target_same_period_id = key_to_same_period_field_id.get(sub_key)
-        if not target_plan_id or not target_same_period_id:
-            continue
+async def _fill_snapshot(project_id: str, table_ids: list, snapshot: dict):
+    """把 snapshot 中还没有的文档并发读入：{table_id: (文档, 存储签名)}，同一请求内每份文档只读取一次。"""
+    missing = [tid for tid in dict.fromkeys(table_ids) if tid not in snapshot]
+    entries = await asyncio.gather(*(_run_io(_read_snapshot_entry, project_id, tid) for tid in missing))
+    snapshot.update(zip(missing, entries))
 
-        if sub_key == "heating_company":
-            aggregated_values: dict[int, dict[str, float]] = {}
-            for source_id in ("9", "10"):
-                source_data = _select_latest_payload(_load_table_json(str(source_id)))
-                if not source_data:
-                    continue
-                for row in source_data.get("tableData", []):
-                    metric_id = row.get("metricId")
-                    if not metric_id:
-                        continue
-                    plan_val = 0.0
-                    same_period_val = 0.0
-                    for cell in row.get("values", []):
-                        field_id = cell.get("fieldId")
-                        value = cell.get("value", 0) if isinstance(cell.get("value"), (int, float)) else 0
-                        if field_id == 1003:
-                            plan_val += value
-                        elif field_id == 1004:
-                            same_period_val += value
-                    aggregated_values.setdefault(metric_id, {"plan": 0.0, "samePeriod": 0.0})
-                    aggregated_values[metric_id]["plan"] += plan_val
-                    aggregated_values[metric_id]["samePeriod"] += same_period_val
-            if not aggregated_values:
-                continue
-            for agg_row in table_data:
-                metric_id = agg_row.get("metricId")
-                if metric_id in aggregated_values:
-                    for agg_cell in agg_row.get("values", []):
-                        field_id = agg_cell.get("fieldId")
-                        if field_id == target_plan_id:
-                            agg_cell["value"] = aggregated_values[metric_id]["plan"]
-                        elif field_id == target_same_period_id:
-                            agg_cell["value"] = aggregated_values[metric_id]["samePeriod"]
-            continue
 
-        sub_data = _select_latest_payload(_load_table_json(str(sub_id)))
-        if not sub_data:
-            continue
+async def _aggregate(project_id: str, table_id: str, snapshot: Optional[dict] = None) -> dict:
+    # 先并发读入各子表文档，再在线程池中增量聚合
+    snapshot = {} if snapshot is None else snapshot
+    await _fill_snapshot(project_id, AGGREGATOR.sources(table_id), snapshot)
+    return await _run_io(AGGREGATOR.get, project_id, table_id, snapshot)
 
-        sub_values = {}
-        for row in sub_data.get("tableData", []):
-            metric_id = row.get("metricId")
-            if not metric_id:
-                continue
-            plan_val = 0.0
-            same_period_val = 0.0
-            for cell in row.get("values", []):
-                field_id = cell.get("fieldId")
-                value = cell.get("value", 0) if isinstance(cell.get("value"), (int, float)) else 0
-                if field_id == 1003:
-                    plan_val = value
-                elif field_id == 1004:
-                    same_period_val = value
-            sub_values[metric_id] = {"plan": plan_val, "samePeriod": same_period_val}
-
-        for agg_row in table_data:
-            metric_id = agg_row.get("metricId")
-            if metric_id in sub_values:
-                for agg_cell in agg_row.get("values", []):
-                    field_id = agg_cell.get("fieldId")
-                    if field_id == target_plan_id:
-                        agg_cell["value"] = sub_values[metric_id]["plan"]
-                    elif field_id == target_same_period_id:
-                        agg_cell["value"] = sub_values[metric_id]["samePeriod"]
-
-    aggregated_payload = {
-        "table": {"id": table_config.get("id"), "name": table_config.get("name")},
-        "tableData": table_data,
-        "submittedAt": None,
-        "submittedBy": None
-    }
 
-    file_path = submissions_dir / "0.json"
-    if file_path.exists():
-        try:
-            with open(file_path, "r", encoding="utf-8") as f:
-                summary_content = json.load(f)
-        except Exception:
-            summary_content = {}
-        summary_data = summary_content.get("submit") or summary_content.get("temp")
-        if summary_data and isinstance(summary_data.get("tableData"), list):
-            aggregated_payload["submittedAt"] = summary_data.get("submittedAt")
-            aggregated_payload["submittedBy"] = summary_data.get("submittedBy")
-            summary_data_map = {row["metricId"]: row for row in summary_data.get("tableData", []) if row.get("metricId")}
-            for agg_row in aggregated_payload.get("tableData", []):
-                metric_id = agg_row.get("metricId")
-                summary_row = summary_data_map.get(metric_id)
-                if not summary_row:
-                    continue
-                summary_row_cells = {cell.get("fieldId"): cell for cell in summary_row.get("values", []) if cell.get("fieldId")}
-                for i, agg_cell in enumerate(agg_row.get("values", [])):
-                    field_id = agg_cell.get("fieldId")
-                    if field_id in summary_row_cells:
-                        agg_row["values"][i] = summary_row_cells[field_id]
-
-    return {"submit": aggregated_payload, "explanationSummary": []}
-
-
-async def get_table_data_recursive(project_id: str, table_id: str):
+async def get_table_data_recursive(project_id: str, table_id: str, snapshot: Optional[dict] = None):
     # Table 0 is the group summary table – uses its own logic
     if table_id == '0':
-        return await get_table_0_data(project_id)
+        return await get_table_0_data(project_id, snapshot)
 
     table_config = ALL_TABLES.get(table_id)
     if not table_config:
         return {}
 
-    # --- UNIFIED LOGIC: All tables read from files, no recursion --- 
-
-    submissions_dir = DATA_DIR / f"{project_id}_data"
-    file_path = submissions_dir / f"{table_id}.json"
-
     # If the table is NOT a summary table, just read its own file and return.
     if table_config.get("type") != "summary" or not table_config.get("subsidiaries"):
-        if not file_path.exists(): return {}
-        try:
-            with open(file_path, "r", encoding="utf-8") as f: return json.load(f)
-        except Exception: return {}
-
-    # If the table IS a summary table, aggregate from direct subsidiary files.
-    if table_config.get("type") == "summary" and isinstance(table_config.get("subsidiaries"), list):
-        aggregated_payload = None
-        subsidiary_ids = table_config.get("subsidiaries", [])
-        exclusion_set = set(table_config.get("aggregationExclusions", []))
-
-        calculated_field_ids = {1004, 1005}
-        calculated_metric_ids = {
-            7, 18, 25, 28, 29, 32, 35, 36, 40, 42, 62, 63, 65, 68, 75, 76, 77, 78, 79, 80, 81,
-            82, 83, 84, 85, 86, 87, 88, 89, 90, 91, 92, 93, 94, 96, 98, 100, 102, 104, 106,
-            108, 110, 112, 115
-        }
+        if snapshot is None:
+            return await _run_io(_read_table_doc, project_id, table_id)
+        await _fill_snapshot(project_id, [table_id], snapshot)
+        return snapshot[table_id][0]
 
-        for sub_id in subsidiary_ids:
-            sub_content = {}
-            sub_file_path = submissions_dir / f"{sub_id}.json"
-            if sub_file_path.exists():
-                try:
-                    with open(sub_file_path, "r", encoding="utf-8") as f:
-                        content = f.read()
-                        if content:
-                            sub_content = json.loads(content)
-                except (json.JSONDecodeError, IOError):
-                    sub_content = {}
-
-            if table_id == '1':
-                sub_data = sub_content.get("approved") or sub_content.get("submit")
-            elif table_id in ('2', '3'):
-                sub_data = sub_content.get("submit")
-            else:
-                sub_data = sub_content.get("submit") or sub_content.get("temp")
-            if not sub_data or not isinstance(sub_data.get("tableData"), list):
-                continue
+    # Summary tables are aggregated from direct subsidiary files, incrementally maintained by AGGREGATOR.
+    if AGGREGATOR.is_summary(table_id):
+        return await _aggregate(project_id, table_id, snapshot)
 
-            if aggregated_payload is None:
-                aggregated_payload = copy.deepcopy(sub_data)
-                aggregated_payload["submittedAt"] = None
-                aggregated_payload["submittedBy"] = None
-                if aggregated_payload.get("table"):
-                    aggregated_payload["table"]["id"] = table_config.get("id")
-                    aggregated_payload["table"]["name"] = table_config.get("name")
-                for row in aggregated_payload.get("tableData", []):
-                    if row.get("metricId") not in exclusion_set:
-                        clean_values = []
-                        for cell in row.get("values", []):
-                            field_id = cell.get("fieldId")
-                            new_cell = {"fieldId": field_id, "value": 0}
-                            if field_id in (1001, 1002):
-                                new_cell["value"] = cell.get("value")
-                            clean_values.append(new_cell)
-                        row["values"] = clean_values
-
-            sub_data_map = {row["metricId"]: row for row in sub_data.get("tableData", []) if row.get("metricId")}
-            sub_table_config = ALL_TABLES.get(sub_id, {})
-            be_aggregated_exclusions = set(sub_table_config.get("beAggregatedExclusions", []))
-
-            for agg_row in aggregated_payload.get("tableData", []):
-                metric_id = agg_row.get("metricId")
-                if not metric_id or metric_id in exclusion_set or metric_id in be_aggregated_exclusions:
-                    continue
-
-                sub_row = sub_data_map.get(metric_id)
-                if not sub_row:
-                    continue
-
-                if metric_id in calculated_metric_ids and not sub_row.get("force"):
-                    continue
-
-                sub_cell_map = {cell["fieldId"]: cell.get("value", 0) for cell in sub_row.get("values", []) if cell.get("fieldId")}
-
-                for agg_cell in agg_row.get("values", []):
-                    field_id = agg_cell.get("fieldId")
-                    if not field_id or field_id in calculated_field_ids:
-                        continue
-
-                    if isinstance(agg_cell.get("value"), (int, float)):
-                        current_val = agg_cell.get("value", 0)
-                        val_to_add = sub_cell_map.get(field_id, 0)
-                        if not isinstance(val_to_add, (int, float)):
-                            val_to_add = 0
-                        agg_cell["value"] = current_val + val_to_add
-
-        if aggregated_payload is None:
-            return {}
-
-        if file_path.exists():
-            try:
-                with open(file_path, "r", encoding="utf-8") as f:
-                    summary_content = json.load(f)
-            except Exception:
-                summary_content = {}
-            summary_data = summary_content.get("submit") or summary_content.get("temp")
-            if summary_data and isinstance(summary_data.get("tableData"), list):
-                aggregated_payload["submittedAt"] = summary_data.get("submittedAt")
-                aggregated_payload["submittedBy"] = summary_data.get("submittedBy")
-                summary_data_map = {row["metricId"]: row for row in summary_data.get("tableData", []) if row.get("metricId")}
-                for agg_row in aggregated_payload.get("tableData", []):
-                    metric_id = agg_row.get("metricId")
-                    if metric_id and metric_id in summary_data_map:
-                        summary_row_cells = {cell.get("fieldId"): cell for cell in summary_data_map[metric_id].get("values", []) if cell.get("fieldId")}
-                        for i, agg_cell in enumerate(agg_row.get("values", [])):
-                            field_id = agg_cell.get("fieldId")
-                            if field_id and field_id in summary_row_cells:
-                                agg_row["values"][i] = summary_row_cells[field_id]
-
-        return {"submit": aggregated_payload, "explanationSummary": []}
-
-    
     return {}
 
 
 @app.get("/project/{project_id}/table/{table_id}/history")
 async def get_table_history(project_id: str, table_id: str):
-    submissions_dir = DATA_DIR / f"{project_id}_data"
-    history_file = submissions_dir / "history.json"
-
-    if not history_file.exists():
-        return []
-
+    # 只读取该表的记录（文件存储经由旁路索引，SQLite 经由索引查询）
     try:
-        with open(history_file, "r", encoding="utf-8-sig") as f:
-            records = json.load(f)
-        if not isinstance(records, list):
-            return []
+        records = await _run_io(STORE.table_history, project_id, str(table_id))
     except Exception:
         return []
 
@@ -900,14 +857,31 @@ async def get_table_history(project_id: str, table_id: str):
         filtered.append(entry)
 
     filtered.sort(key=lambda item: item.get("timestamp") or "", reverse=True)
-    return filtered
+    return await _json_response(filtered)
+
+async def _table_response(project_id: str, table_id: str, snapshot: Optional[dict] = None) -> tuple:
+    """(序列化后的响应体, 是否有 temp, 是否有 submit, ETag)；ETag 为 None 表示结果不能确定对应某一组输入版本。"""
+    key = (project_id, table_id)
+    signatures = await _run_io(_input_signatures, project_id, table_id)
+    etag = _etag_of(project_id, table_id, signatures)
+    cached = RESPONSE_CACHE.cached(key, etag)
+    if cached is None:
+        snapshot = {} if snapshot is None else snapshot
+        result = await get_table_data_recursive(project_id, table_id, snapshot)
+        body = await _run_io(_json_bytes, result)
+        cached = (body, isinstance(result, dict) and bool(result.get('temp')), isinstance(result, dict) and bool(result.get('submit')))
+        # 只缓存完全由 signatures 这组版本构建的结果：实际读入的文档（批量请求中可能是之前读入的）
+        # 与构建结束时的签名都须与之一致，否则可能混合了新旧数据
+        used = {tid: entry[1] for tid, entry in snapshot.items() if tid in signatures}
+        if all(signatures[tid] == sig for tid, sig in used.items()) and \
+                await _run_io(_input_signatures, project_id, table_id) == signatures:
+            RESPONSE_CACHE.store(key, etag, cached, len(body))
+        else:
+            etag = None
+    return cached + (etag,)
 
-@app.get("/project/{project_id}/data/table/{table_id}")
-async def get_table_data(project_id: str, table_id: str, request: Request):
-    result = await get_table_data_recursive(project_id, table_id)
+def _log_table_load(request: Request, project_id: str, table_id: str, has_temp: bool, has_submit: bool):
     username = _extract_username(None, request)
-    has_temp = isinstance(result, dict) and bool(result.get('temp'))
-    has_submit = isinstance(result, dict) and bool(result.get('submit'))
     details = {
         'projectId': project_id,
         'tableId': table_id,
@@ -917,63 +891,284 @@ async def get_table_data(project_id: str, table_id: str, request: Request):
     _log_action('load_table', request, username=username, details=details)
     if has_temp:
         _log_action('retrieve_draft', request, username=username, details=details)
-    return result
+
+def _read_table_doc_at(project_id: str, table_id: str, at: float) -> dict:
+    # 部署以来没有写入过的表还没有修订记录，其当前文档即为任何时刻的内容
+    if not REVISIONS.has_revisions(project_id, str(table_id)):
+        return _read_table_doc(project_id, table_id)
+    return REVISIONS.document(project_id, str(table_id), at) or {}
+
+async def get_table_data_as_of(project_id: str, table_id: str, at: float) -> dict:
+    """与 get_table_data_recursive 相同的规则，但表文档取自修订记录中 at 时刻的版本；汇总表按当时的子表重新汇总。"""
+    if AGGREGATOR.is_summary(table_id):
+        source_ids = AGGREGATOR.sources(table_id)
+        docs = await asyncio.gather(*(_run_io(_read_table_doc_at, project_id, sid, at) for sid in source_ids))
+        return await _run_io(AGGREGATOR.build_detached, table_id, dict(zip(source_ids, docs)))
+    table_config = ALL_TABLES.get(table_id)
+    if not table_config or (table_config.get("type") == "summary" and table_config.get("subsidiaries")):
+        return {}
+    return await _run_io(_read_table_doc_at, project_id, table_id, at)
+
+@app.get("/project/{project_id}/data/table/{table_id}")
+async def get_table_data(project_id: str, table_id: str, request: Request, asOf: Optional[str] = None):
+    """asOf（ISO 8601，不带时区时按北京时间）给出时返回该时刻的表数据（见 revisions.py），不带版本号与 ETag。"""
+    if asOf:
+        if REVISIONS is None:
+            raise HTTPException(status_code=400, detail="Table revisions are disabled.")
+        try:
+            at = parse_time(asOf, BEIJING_TZ)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        result = await get_table_data_as_of(project_id, table_id, at)
+        _log_action('load_table', request, username=_extract_username(None, request),
+                    details={'projectId': project_id, 'tableId': table_id, 'asOf': asOf})
+        return await _json_response(result)
+    # 先取版本号再读内容：期间发生写入时客户端拿到的是旧版本号，之后的 PATCH 会被判为冲突
+    revision = await _run_io(_doc_revision, project_id, table_id)
+    body, has_temp, has_submit, etag = await _table_response(project_id, table_id)
+    _log_table_load(request, project_id, table_id, has_temp, has_submit)
+    revision_headers = {"X-Table-Revision": revision} if revision else {}
+    if etag is None:
+        return Response(content=body, media_type="application/json", headers=revision_headers)
+    headers = {"ETag": etag, "Cache-Control": "no-cache", **revision_headers}
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@app.post("/project/{project_id}/data/tables")
+async def get_tables_data(project_id: str, request: Request, table_ids: List[str] = Body(...)):
+    """一次返回多张表：{table_id: 与 GET data/table 相同的内容}。
+
+    同一批次共用一份文档快照，多张汇总表依赖同一子表时该子表只读取一次；
+    响应逐表流式写出，任一时刻只持有一张表的序列化结果。
+    """
+    ids = list(dict.fromkeys(str(t) for t in table_ids))
+    if len(ids) > MAX_BATCH_TABLES:
+        raise HTTPException(status_code=422, detail=f"At most {MAX_BATCH_TABLES} tables per request.")
+    snapshot: dict = {}
+
+    async def _stream():
+        yield b"{"
+        for n, table_id in enumerate(ids):
+            body, has_temp, has_submit, _ = await _table_response(project_id, table_id, snapshot)
+            _log_table_load(request, project_id, table_id, has_temp, has_submit)
+            yield (b"," if n else b"") + _json_bytes(table_id) + b":" + body
+        yield b"}"
+
+    return StreamingResponse(_stream(), media_type="application/json")
+
+def _is_god(user) -> bool:
+    return isinstance(user, dict) and (user.get("username") == "ww870411" or user.get("globalRole") == "god")
+
+def _table_status(data: Optional[dict]) -> dict:
+    """由快照元数据 {kind: meta} 得出 table_statuses 中单张表的状态。"""
+    status_info = {"status": "new", "submittedAt": None, "submittedBy": None, "approvedAt": None, "approvedBy": None, "unapprovedAt": None, "unapprovedBy": None}
+
+    if data:
+        try:
+            # Default to 'saved' if a temp copy exists
+            if "temp" in data:
+                status_info["status"] = "saved"
+
+            # Approved has highest priority
+            if "approved" in data:
+                status_info["status"] = "approved"
+                status_info["approvedAt"] = data["approved"].get("approvedAt")
+                status_info["approvedBy"] = data["approved"].get("approvedBy")
+                # also surface submitted info if present
+                if "submit" in data:
+                    status_info["submittedAt"] = data["submit"].get("submittedAt")
+                    status_info["submittedBy"] = data["submit"].get("submittedBy")
+
+            # Capture unapprove (withdraw) meta for display, without changing status
+            if "unapproved" in data:
+                status_info["unapprovedAt"] = data["unapproved"].get("unapprovedAt")
+                status_info["unapprovedBy"] = data["unapproved"].get("unapprovedBy")
+
+            # Check for a valid submission if not approved
+            if status_info["status"] != "approved" and "submit" in data:
+                submitted_by = data["submit"].get("submittedBy") or {}
+                # god 提交必须隐身：当提交者为 god 时，不记为“已提交”
+                is_god_submit = (
+                    submitted_by.get("username") == "ww870411" or
+                    submitted_by.get("globalRole") == "god"
+                )
+                if not is_god_submit:
+                    status_info["status"] = "submitted"
+                    status_info["submittedAt"] = data["submit"].get("submittedAt")
+                    status_info["submittedBy"] = submitted_by
+
+        except Exception:
+            pass
+
+    return status_info
+
+@app.get("/project/{project_id}/events")
+async def table_events(project_id: str, request: Request, lastEventId: Optional[str] = None):
+    """表状态变化的 SSE 推送：event: status，data 为 {tableId, status, at, by}。
+
+    断线重连时浏览器自动带上 Last-Event-ID（也可用 lastEventId 参数）补发错过的事件；
+    收到 event: reset 时应重新请求一次 table_statuses。
+    """
+    last_event_id = request.headers.get('last-event-id') or lastEventId
+    return StreamingResponse(
+        sse_stream(EVENTS, project_id, last_event_id, "status", heartbeat=EVENT_HEARTBEAT_SECONDS),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 @app.post("/project/{project_id}/table_statuses")
 async def get_table_statuses(project_id: str, table_ids: List[str] = Body(...)):
     statuses = {}
-    submissions_dir = DATA_DIR / f"{project_id}_data"
+    # {table_id: {kind: meta}}：只含非空快照的元数据（不含 tableData）
+    metas = await _run_io(STORE.status_meta, project_id, [str(t) for t in table_ids])
     for table_id in table_ids:
-        file_path = submissions_dir / f"{table_id}.json"
-        status_info = {"status": "new", "submittedAt": None, "submittedBy": None, "approvedAt": None, "approvedBy": None, "unapprovedAt": None, "unapprovedBy": None}
-
-        if file_path.exists():
-            try:
-                with open(file_path, "r", encoding="utf-8") as f:
-                    content = f.read()
-                    if not content:
-                        statuses[table_id] = status_info
-                        continue
-                    data = json.loads(content)
-                
-                # Default to 'saved' if a temp copy exists
-                if data.get("temp"):
-                    status_info["status"] = "saved"
-
-                # Approved has highest priority
-                if data.get("approved"):
-                    status_info["status"] = "approved"
-                    status_info["approvedAt"] = data["approved"].get("approvedAt")
-                    status_info["approvedBy"] = data["approved"].get("approvedBy")
-                    # also surface submitted info if present
-                    if data.get("submit"):
-                        status_info["submittedAt"] = data["submit"].get("submittedAt")
-                        status_info["submittedBy"] = data["submit"].get("submittedBy")
-
-                # Capture unapprove (withdraw) meta for display, without changing status
-                if data.get("unapproved"):
-                    status_info["unapprovedAt"] = data["unapproved"].get("unapprovedAt")
-                    status_info["unapprovedBy"] = data["unapproved"].get("unapprovedBy")
-
-                # Check for a valid submission if not approved
-                if status_info["status"] != "approved" and data.get("submit"):
-                    submitted_by = data["submit"].get("submittedBy") or {}
-                    # god 提交必须隐身：当提交者为 god 时，不记为“已提交”
-                    is_god_submit = (
-                        submitted_by.get("username") == "ww870411" or
-                        submitted_by.get("globalRole") == "god"
-                    )
-                    if not is_god_submit:
-                        status_info["status"] = "submitted"
-                        status_info["submittedAt"] = data["submit"].get("submittedAt")
-                        status_info["submittedBy"] = submitted_by
-
-            except Exception:
-                pass
-        
-        statuses[table_id] = status_info
-
-    return statuses
+        statuses[table_id] = _table_status(metas.get(str(table_id)))
+
+    return await _json_response(statuses)
+
+def _split_param(value: Optional[str]) -> Optional[list]:
+    if not value:
+        return None
+    return [v.strip() for v in value.split(',') if v.strip()]
+
+def _query_activity(filters: dict, limit: int, cursor: Optional[str], aggregate: bool) -> dict:
+    # 让队列中尚未落盘的条目也能被查到
+    ACTIVITY_LOG.flush(timeout=2)
+    return ACTIVITY_INDEX.query(limit=limit, cursor=cursor, aggregate=aggregate, **filters)
+
+@app.get("/admin/activity")
+async def get_activity(
+    request: Request,
+    action: Optional[str] = None,
+    username: Optional[str] = None,
+    tableId: Optional[str] = None,
+    projectId: Optional[str] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    aggregate: bool = False,
+):
+    """按操作、用户、表与时间范围 [start, end) 查询操作日志（时间倒序，游标分页）。
+    action/username/tableId 可用逗号分隔多个值；aggregate=true 时附带按表/用户/操作/小时的计数。
+    """
+    user = await _run_io(_get_user_from_request, request)
+    if role_of(user) not in ('god', 'super_admin'):
+        raise HTTPException(status_code=403, detail="Not allowed to query activity logs.")
+    try:
+        filters = {
+            "actions": _split_param(action),
+            "usernames": _split_param(username),
+            "table_ids": _split_param(tableId),
+            "project_id": projectId,
+            "start": parse_time(start, BEIJING_TZ),
+            "end": parse_time(end, BEIJING_TZ),
+        }
+        result = await _run_io(_query_activity, filters, limit, cursor, aggregate)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return await _json_response(result)
+
+def _require_snapshot_admin(user):
+    if role_of(user) not in ('god', 'super_admin'):
+        raise HTTPException(status_code=403, detail="Not allowed to manage snapshots.")
+
+def _take_scheduled_snapshots():
+    interval = SNAPSHOT_INTERVAL_MINUTES * 60
+    for project_id in STORE.projects():
+        if due(SNAPSHOTS, project_id, interval):
+            SNAPSHOTS.take(project_id, "scheduled", skip_unchanged=True)
+    SNAPSHOTS.prune(SNAPSHOT_KEEP)
+
+async def _snapshot_schedule():
+    while True:
+        try:
+            await _run_io(_take_scheduled_snapshots)
+        except Exception as e:
+            _log_action("snapshot_failed", details={"error": str(e)})
+        await asyncio.sleep(SNAPSHOT_INTERVAL_MINUTES * 60)
+
+def _snapshot_summary(manifest: dict) -> dict:
+    return {
+        "id": manifest["id"],
+        "createdAt": manifest["createdAt"],
+        "label": manifest.get("label"),
+        "tables": len(manifest["tables"]),
+        "reusedTables": manifest.get("reused", 0),
+        "addedBytes": manifest.get("added", 0),
+        "unchanged": manifest.get("unchanged", False),
+    }
+
+@app.get("/project/{project_id}/snapshots")
+async def list_snapshots(project_id: str, request: Request):
+    user = await _run_io(_get_user_from_request, request)
+    _require_snapshot_admin(user)
+    return await _json_response(await _run_io(SNAPSHOTS.list, project_id))
+
+@app.post("/project/{project_id}/snapshots")
+async def take_snapshot(project_id: str, request: Request):
+    """立即拍一份快照（例如批量操作之前），body 可带 {"label": "..."}。"""
+    user = await _run_io(_get_user_from_request, request)
+    _require_snapshot_admin(user)
+    body = await request.body()
+    label = (await _read_json_body(request)).get("label") if body else None
+    manifest = await _run_io(SNAPSHOTS.take, project_id, str(label) if label else None)
+    _log_action("snapshot", request, username=_extract_username(None, request),
+                details={"projectId": project_id, "snapshotId": manifest["id"]})
+    return _snapshot_summary(manifest)
+
+@app.get("/project/{project_id}/snapshots/{snapshot_id}/table/{table_id}")
+async def get_snapshot_table(project_id: str, snapshot_id: str, table_id: str, request: Request):
+    user = await _run_io(_get_user_from_request, request)
+    _require_snapshot_admin(user)
+    try:
+        doc = await _run_io(SNAPSHOTS.read_table, project_id, snapshot_id, table_id)
+    except SnapshotError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return await _json_response(doc)
+
+def _restore_table_doc(project_id: str, table_id: str, doc: dict) -> bool:
+    previous = _read_table_doc(project_id, table_id)
+    if previous == doc:
+        return False
+    _write_table_doc(project_id, table_id, doc, previous)
+    return True
+
+@app.post("/project/{project_id}/snapshots/{snapshot_id}/restore")
+async def restore_snapshot(project_id: str, snapshot_id: str, request: Request):
+    """恢复快照中的表：body {"tableIds": [...]} 时只恢复这些表，否则恢复快照中的全部表。
+    恢复前自动拍一份快照，恢复本身也可以撤销。
+    """
+    user = await _run_io(_get_user_from_request, request)
+    _require_snapshot_admin(user)
+    body = await request.body()
+    table_ids = (await _read_json_body(request)).get("tableIds") if body else None
+    if table_ids is not None and not isinstance(table_ids, list):
+        raise HTTPException(status_code=422, detail="tableIds must be a list.")
+    try:
+        docs, missing = await _run_io(SNAPSHOTS.documents, project_id, snapshot_id, table_ids)
+    except SnapshotError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    before = await _run_io(SNAPSHOTS.take, project_id, f"before restore {snapshot_id}", True)
+
+    at = datetime.now(BEIJING_TZ).isoformat()
+    restored, unchanged = [], []
+    for table_id, doc in docs.items():
+        async with TABLE_LOCKS.hold(project_id, table_id):
+            if await _run_io(_restore_table_doc, project_id, table_id, doc):
+                restored.append(table_id)
+                await _publish_status(project_id, table_id, at, user)
+            else:
+                unchanged.append(table_id)
+    _log_action("restore_snapshot", request, username=_extract_username(None, request),
+                details={"projectId": project_id, "snapshotId": snapshot_id, "tableIds": restored})
+    return {"before": before["id"], "restored": restored, "unchanged": unchanged, "missing": missing}
+
+@app.get("/metrics")
+def get_metrics():
+    """Prometheus 文本格式的进程内指标（见 metrics.py）。"""
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
 
 @app.get("/")
 def read_root():
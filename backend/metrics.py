@@ -0,0 +1,330 @@
+"""进程内指标 (GET /metrics，Prometheus 文本格式 0.0.4) 与单个请求的性能剖析 (?profile=1)。
+
+不依赖 prometheus_client：计数器、仪表与直方图都是带锁的字典，一次观测只是一次加锁与二分查找。
+
+- span(name)：计时一段代码，记入 nestling_span_seconds{span=name}；
+  json_parse(source)：JSON 解析（含解压与紧凑格式解码）的耗时，记入 nestling_json_parse_seconds{source}；
+- storage_bytes(...)：存储层实际读写的字节数；
+- register_cache(name, cache)：导出 cache.hits / cache.misses 及命中率；
+- MetricsMiddleware：按路由模板（而非实际路径）统计请求耗时与响应字节数；SSE 长连接不计入耗时。
+  profiling=True 时，带 ?profile=1 的请求在 cProfile 下执行，返回文本摘要（各 span 合计与函数耗时排名）代替原响应。
+  事件循环线程上同时运行的其它请求也会计入剖析结果；线程池中的工作经 profiled() 包装后单独剖析再合并。
+  SSE 接口不要带 profile=1（响应不会结束）。剖析中的请求不计入上述指标。
+"""
+import asyncio
+import bisect
+import contextvars
+import cProfile
+import functools
+import io
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Optional
+from urllib.parse import parse_qs
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_METRICS: list = []
+_CACHES: dict = {}
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels(pairs) -> str:
+    pairs = list(pairs)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in pairs) + "}"
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values: dict = {}
+        self._lock = threading.Lock()
+        _METRICS.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self):
+        """[(名称后缀, [(标签名, 值)], 数值)]"""
+        raise NotImplementedError
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, labels, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_labels(labels)} {_number(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [("", list(zip(self.labelnames, key)), value) for key, value in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][i] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def samples(self):
+        with self._lock:
+            items = sorted((key, (list(counts), total, count)) for key, (counts, total, count) in self._values.items())
+        result = []
+        for key, (counts, total, count) in items:
+            labels = list(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                result.append(("_bucket", labels + [("le", _number(bound))], cumulative))
+            result.append(("_sum", labels, total))
+            result.append(("_count", labels, count))
+        return result
+
+
+REQUEST_SECONDS = Histogram("nestling_http_request_duration_seconds", "HTTP request latency by route template.",
+                            ("method", "route", "status"))
+RESPONSE_BYTES = Counter("nestling_http_response_bytes_total", "HTTP response body bytes by route template.",
+                         ("method", "route"))
+SPAN_SECONDS = Histogram("nestling_span_seconds", "Time spent in instrumented storage, history and aggregation code.",
+                         ("span",))
+JSON_PARSE_SECONDS = Histogram("nestling_json_parse_seconds", "JSON decode time (including decompression).",
+                               ("source",))
+STORAGE_BYTES = Counter("nestling_storage_bytes_total", "Bytes read from and written to the table store.",
+                        ("store", "direction", "kind"))
+AGGREGATION_FANOUT = Gauge("nestling_aggregation_fanout", "Documents a summary table is built from (children plus itself).",
+                           ("table",))
+AGGREGATION_REFRESHES = Counter("nestling_aggregation_source_refreshes_total",
+                                "Source documents folded into a summary view (rebuild, whole source or changed cells).",
+                                ("table", "mode"))
+
+
+def register_cache(name: str, cache):
+    """cache 需要有 hits / misses 两个计数属性（DocumentCache、SummaryAggregator）。"""
+    _CACHES[name] = cache
+
+
+def _render_caches() -> list:
+    lines = [
+        "# HELP nestling_cache_requests_total Cache lookups by result.",
+        "# TYPE nestling_cache_requests_total counter",
+    ]
+    ratios = []
+    for name, cache in sorted(_CACHES.items()):
+        hits, misses = cache.hits, cache.misses
+        lines.append(f'nestling_cache_requests_total{{cache="{name}",result="hit"}} {hits}')
+        lines.append(f'nestling_cache_requests_total{{cache="{name}",result="miss"}} {misses}')
+        ratios.append(f'nestling_cache_hit_ratio{{cache="{name}"}} {_number(hits / (hits + misses) if hits + misses else 0.0)}')
+    lines += ["# HELP nestling_cache_hit_ratio Cache hits over lookups since start.",
+              "# TYPE nestling_cache_hit_ratio gauge"] + ratios
+    return lines
+
+
+def render() -> bytes:
+    lines = []
+    for metric in _METRICS:
+        lines += metric.render()
+    lines += _render_caches()
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+# --- spans 与请求剖析 ---
+
+_PROFILE: contextvars.ContextVar = contextvars.ContextVar("nestling_profile", default=None)
+
+
+@contextmanager
+def _timed(histogram: Histogram, name: str, **labels):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        histogram.observe(elapsed, **labels)
+        profile = _PROFILE.get()
+        if profile is not None:
+            profile.add_span(name, elapsed)
+
+
+def span(name: str):
+    return _timed(SPAN_SECONDS, name, span=name)
+
+
+def json_parse(source: str):
+    return _timed(JSON_PARSE_SECONDS, f"json.parse.{source}", source=source)
+
+
+def storage_bytes(store: str, direction: str, kind: str, size: int):
+    STORAGE_BYTES.inc(size, store=store, direction=direction, kind=kind)
+
+
+class RequestProfile:
+    def __init__(self):
+        self.profiler = cProfile.Profile()
+        self.spans: dict = {}
+        self._threads: list = []
+        self._lock = threading.Lock()
+
+    def add_span(self, name: str, seconds: float):
+        with self._lock:
+            entry = self.spans.setdefault(name, [0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+
+    def run(self, func: Callable, *args, **kwargs):
+        """在工作线程中执行并单独剖析，结束后并入本请求的结果。"""
+        token = _PROFILE.set(self)
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profiler.disable()
+            _PROFILE.reset(token)
+            with self._lock:
+                self._threads.append(profiler)
+
+    def report(self, title: str, limit: int) -> str:
+        out = io.StringIO()
+        out.write(title + "\n\n")
+        if self.spans:
+            out.write(f"{'span':<32} {'count':>7} {'total ms':>10}\n")
+            for name, (count, total) in sorted(self.spans.items(), key=lambda item: -item[1][1]):
+                out.write(f"{name:<32} {count:>7} {total * 1000:>10.3f}\n")
+            out.write("\n")
+        stats = pstats.Stats(self.profiler, stream=out)
+        with self._lock:
+            for profiler in self._threads:
+                stats.add(profiler)
+        stats.sort_stats("cumulative").print_stats(limit)
+        return out.getvalue()
+
+
+def profiled(func: Callable) -> Callable:
+    """交给线程池执行的 func：当前请求正在剖析时包装为在工作线程中剖析。"""
+    profile = _PROFILE.get()
+    return func if profile is None else functools.partial(profile.run, func)
+
+
+def _wants_profile(scope) -> bool:
+    query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+    return query.get("profile", [""])[-1] in ("1", "true")
+
+
+def _route(scope) -> str:
+    return getattr(scope.get("route"), "path", None) or "unmatched"
+
+
+class MetricsMiddleware:
+    def __init__(self, app, profiling: bool = False, profile_limit: int = 40):
+        self.app = app
+        self.profiling = profiling
+        self.profile_limit = profile_limit
+        self._profile_lock: Optional[asyncio.Lock] = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        if self.profiling and _wants_profile(scope):
+            await self._profile(scope, receive, send)
+            return
+
+        info = {"status": 500, "bytes": 0, "stream": False}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                info["status"] = message["status"]
+                info["stream"] = any(k == b"content-type" and v.startswith(b"text/event-stream")
+                                     for k, v in message.get("headers", []))
+            elif message["type"] == "http.response.body":
+                info["bytes"] += len(message.get("body", b""))
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = _route(scope)
+            if not info["stream"]:
+                REQUEST_SECONDS.observe(time.perf_counter() - start, method=scope["method"], route=route,
+                                        status=info["status"])
+            RESPONSE_BYTES.inc(info["bytes"], method=scope["method"], route=route)
+
+    async def _profile(self, scope, receive, send):
+        # 同一线程上只能有一个 cProfile 在运行：剖析请求依次执行
+        if self._profile_lock is None:
+            self._profile_lock = asyncio.Lock()
+        profile = RequestProfile()
+        info = {"status": 500, "bytes": 0}
+
+        async def capture(message):
+            if message["type"] == "http.response.start":
+                info["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                info["bytes"] += len(message.get("body", b""))
+
+        async with self._profile_lock:
+            token = _PROFILE.set(profile)
+            start = time.perf_counter()
+            profile.profiler.enable()
+            try:
+                await self.app(scope, receive, capture)
+            finally:
+                profile.profiler.disable()
+                _PROFILE.reset(token)
+            elapsed = time.perf_counter() - start
+        title = (f"{scope['method']} {scope['path']} -> {info['status']} in {elapsed * 1000:.3f} ms "
+                 f"({info['bytes']} response bytes)")
+        body = profile.report(title, self.profile_limit).encode("utf-8")
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", b"text/plain; charset=utf-8"),
+                                (b"content-length", str(len(body)).encode("ascii"))]})
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,339 @@
+"""表文档的修订记录：按时间读取任意一张表在过去某一时刻的内容 (GET data/table/{tid}?asOf=...)。
+
+history.jsonl 只记录发生过提交/批准，而表文档的每次写入都会覆盖之前的快照。
+这里把每次写入后的文档保存为一条修订，存于单文件 SQLite（默认 DATA_DIR/revisions.db，WAL 模式）：
+
+- 检查点 (checkpoint)：完整文档，snapshot_codec 紧凑编码并 gzip 压缩；
+- 增量 (delta)：相对上一条修订的差异，形如
+    {"keys": [写入后的顶层键顺序], "drop": [被删除的快照],
+     "put": {kind: 完整快照}, "edit": {kind: {"from": 上一版中的快照, "set": {...}, "unset": [...],
+                                              "rows": [[行下标, 行]], "cells": [[行下标, 单元格下标, 单元格]]}}}
+  批准（approved 由 submit 复制而来）、单元格级修改与逐格修改后的整表提交都只保存变化的部分。
+
+同一张表自上一个检查点起累计 checkpoint_every 条增量，或增量总大小超过检查点本身时，下一条写为检查点，
+因此读取某一时刻只需要最近的检查点加上其后不超过 checkpoint_every 条增量。
+
+修订时间 at 取写入对应的操作时间（提交时间、批准时间等，不晚于当前时间），同一张表内单调不减；
+读取时取 at <= asOf 的最后一条修订。每条修订记下写入后的存储端签名，写入前的签名与上一条修订不一致时
+（修订记录关闭期间或命令行工具改写过该表），该次写入记为检查点而不是增量，期间的变化不可见。
+一张表首次记录修订时，写入前的文档先记为检查点，时间取文档中最晚的提交/批准/撤销批准时间；
+还没有任何修订的表，读取时由调用方回退到当前文档。`python revisions.py seed` 可预先为全部表记录当前文档。
+
+命令行：
+  python revisions.py seed --data-dir <DATA_DIR> [--db tables.db] [--revisions-db revisions.db]
+      为还没有修订记录的表记录当前文档（持表锁逐张进行，可在服务运行时执行）；
+  python revisions.py show --data-dir <DATA_DIR> --project ID --table ID [--as-of 时间]
+      列出修订，或输出某一时刻的文档。
+"""
+import argparse
+import gzip
+import json
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+import fast_json
+import metrics
+from doc_cache import DocumentCache
+from snapshot_codec import GZIP_MAGIC, dumps_document, loads_document
+from activity_index import parse_time
+from table_locks import TableLockManager
+from table_store import TableStore, open_table_store
+
+DEFAULT_CHECKPOINT_EVERY = 32
+# 超过这个大小的增量 gzip 压缩后保存
+COMPRESS_DELTA_BYTES = 4096
+# 估计文档自身时间（首次记录时写入前文档的修订时间）所用的快照时间字段
+DOCUMENT_TIME_KEYS = ("submittedAt", "approvedAt", "unapprovedAt", "savedAt")
+
+
+def _edit(base, snapshot) -> Optional[dict]:
+    """snapshot 相对 base 的修改；tableData 行数不同或超过一半的行结构有变化时返回 None（整份保存）。"""
+    if not isinstance(base, dict) or not isinstance(snapshot, dict):
+        return None
+    edit = {
+        "set": {k: v for k, v in snapshot.items() if k != "tableData" and (k not in base or base[k] != v)},
+        "unset": [k for k in base if k not in snapshot],
+    }
+    old_rows, new_rows = base.get("tableData"), snapshot.get("tableData")
+    if "tableData" not in snapshot or old_rows is new_rows:
+        return edit
+    if not isinstance(old_rows, list) or not isinstance(new_rows, list) or len(old_rows) != len(new_rows):
+        return None
+    rows, cells = [], []
+    for i, (old, new) in enumerate(zip(old_rows, new_rows)):
+        if old is new:
+            continue
+        old_values = old.get("values") if isinstance(old, dict) else None
+        new_values = new.get("values") if isinstance(new, dict) else None
+        if isinstance(old_values, list) and isinstance(new_values, list) and len(old_values) == len(new_values) \
+                and old.keys() == new.keys() and all(old[k] == new[k] for k in old if k != "values"):
+            cells += [[i, j, cell] for j, (was, cell) in enumerate(zip(old_values, new_values)) if was != cell]
+        elif old != new:
+            rows.append([i, new])
+    if len(rows) * 2 > len(new_rows):
+        return None
+    if rows:
+        edit["rows"] = rows
+    if cells:
+        edit["cells"] = cells
+    return edit
+
+
+def _edit_size(edit: dict) -> int:
+    return len(edit.get("rows", ())) * 16 + len(edit.get("cells", ())) + len(edit["set"]) + len(edit["unset"])
+
+
+def diff_documents(previous: dict, data: dict) -> dict:
+    """data 相对 previous 的增量（格式见模块说明）。每个变化的快照取 previous 中改动最少的快照作为基准。"""
+    delta = {"keys": list(data)}
+    drop = [kind for kind in previous if kind not in data]
+    if drop:
+        delta["drop"] = drop
+    for kind, snapshot in data.items():
+        if kind in previous and (previous[kind] is snapshot or previous[kind] == snapshot):
+            continue
+        best = None
+        for source in [kind] + [k for k in previous if k != kind]:
+            if source not in previous:
+                continue
+            edit = _edit(previous[source], snapshot)
+            if edit is not None and (best is None or _edit_size(edit) < _edit_size(best)):
+                best = {"from": source, **edit}
+        if best is None:
+            delta.setdefault("put", {})[kind] = snapshot
+        else:
+            delta.setdefault("edit", {})[kind] = best
+    return delta
+
+
+def apply_delta(doc: dict, delta: dict) -> dict:
+    """返回 doc 应用增量后的新文档；未变化的快照、行与单元格与 doc 共享。"""
+    result = {k: v for k, v in doc.items() if k not in delta.get("drop", ())}
+    for kind, edit in delta.get("edit", {}).items():
+        base = doc[edit["from"]]
+        unset = set(edit["unset"])
+        snapshot = {k: v for k, v in base.items() if k not in unset}
+        snapshot.update(edit["set"])
+        if "rows" in edit or "cells" in edit:
+            table_data = list(base["tableData"])
+            for i, row in edit.get("rows", ()):
+                table_data[i] = row
+            copied = set()
+            for i, j, cell in edit.get("cells", ()):
+                if i not in copied:
+                    table_data[i] = {**table_data[i], "values": list(table_data[i]["values"])}
+                    copied.add(i)
+                table_data[i]["values"][j] = cell
+            snapshot["tableData"] = table_data
+        result[kind] = snapshot
+    result.update(delta.get("put", {}))
+    return {k: result[k] for k in delta["keys"]}
+
+
+def _pack_delta(delta: dict) -> bytes:
+    raw = fast_json.dumps(delta)
+    return gzip.compress(raw, compresslevel=6) if len(raw) > COMPRESS_DELTA_BYTES else raw
+
+
+def _unpack_delta(data: bytes) -> dict:
+    if data.startswith(GZIP_MAGIC):
+        data = gzip.decompress(data)
+    return fast_json.loads(data)
+
+
+def document_time(doc: dict, tz=None) -> Optional[float]:
+    """文档各快照中最晚的操作时间；没有可解析的时间时返回 None。"""
+    times = []
+    for snapshot in doc.values():
+        if not isinstance(snapshot, dict):
+            continue
+        for key in DOCUMENT_TIME_KEYS:
+            value = snapshot.get(key)
+            if isinstance(value, str):
+                try:
+                    times.append(parse_time(value, tz))
+                except ValueError:
+                    pass
+    return max(times) if times else None
+
+
+def _signature_text(signature) -> Optional[str]:
+    return None if signature is None else json.dumps(list(signature))
+
+
+class RevisionLog:
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS revisions (
+        project_id TEXT NOT NULL,
+        table_id TEXT NOT NULL,
+        seq INTEGER NOT NULL,
+        at REAL NOT NULL,
+        checkpoint INTEGER NOT NULL,
+        signature TEXT,
+        data BLOB NOT NULL,
+        PRIMARY KEY (project_id, table_id, seq)
+    );
+    CREATE INDEX IF NOT EXISTS revisions_by_time ON revisions (project_id, table_id, at);
+    CREATE INDEX IF NOT EXISTS revisions_checkpoints ON revisions (project_id, table_id, checkpoint, seq);
+    """
+
+    def __init__(self, db_path: Path, checkpoint_every: int = DEFAULT_CHECKPOINT_EVERY, tz=None):
+        self.db_path = Path(db_path)
+        self.checkpoint_every = max(1, checkpoint_every)
+        self.tz = tz
+        self._local = threading.local()
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn().executescript(self.SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.db_path), timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def record(self, project_id: str, table_id: str, previous: Optional[dict], data: dict,
+               before: Optional[tuple], after: Optional[tuple], at: Optional[float] = None) -> int:
+        """记录一次写入（调用方持有表锁）：previous 为写入前的文档，before / after 为写入前后的存储端签名，
+        at 为操作时间戳（缺省为当前时间）。返回新修订的序号。"""
+        key = (project_id, str(table_id))
+        now = time.time()
+        at = now if at is None else min(at, now)
+        conn = self._conn()
+        with metrics.span("revisions.record"), conn:
+            last = conn.execute(
+                "SELECT seq, at, signature FROM revisions WHERE project_id = ? AND table_id = ? ORDER BY seq DESC LIMIT 1",
+                key,
+            ).fetchone()
+            if last is None and isinstance(previous, dict) and previous:
+                # 首次记录：先保存写入前的文档，本次写入再作为它的增量
+                base_at = min(document_time(previous, self.tz) or at, at)
+                self._insert(conn, key, 0, base_at, True, before, dumps_document(previous, "compact", "gzip"))
+                last = (0, base_at, _signature_text(before))
+            seq = 0 if last is None else last[0] + 1
+            if last is not None:
+                at = max(at, last[1])
+            blob = None
+            if last is not None and previous is not None and last[2] == _signature_text(before):
+                checkpoint_seq, checkpoint_size = conn.execute(
+                    "SELECT seq, LENGTH(data) FROM revisions WHERE project_id = ? AND table_id = ? AND checkpoint = 1 "
+                    "ORDER BY seq DESC LIMIT 1", key,
+                ).fetchone()
+                count, size = conn.execute(
+                    "SELECT COUNT(*), COALESCE(SUM(LENGTH(data)), 0) FROM revisions "
+                    "WHERE project_id = ? AND table_id = ? AND seq > ?", key + (checkpoint_seq,),
+                ).fetchone()
+                blob = _pack_delta(diff_documents(previous, data))
+                if count + 1 >= self.checkpoint_every or size + len(blob) > checkpoint_size:
+                    blob = None
+            checkpoint = blob is None
+            if checkpoint:
+                blob = dumps_document(data, "compact", "gzip")
+            self._insert(conn, key, seq, at, checkpoint, after, blob)
+        return seq
+
+    @staticmethod
+    def _insert(conn: sqlite3.Connection, key: tuple, seq: int, at: float, checkpoint: bool,
+                signature: Optional[tuple], blob: bytes):
+        conn.execute(
+            "INSERT INTO revisions (project_id, table_id, seq, at, checkpoint, signature, data) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            key + (seq, at, int(checkpoint), _signature_text(signature), blob),
+        )
+        metrics.storage_bytes("revisions", "write", "checkpoint" if checkpoint else "delta", len(blob))
+
+    def has_revisions(self, project_id: str, table_id: str) -> bool:
+        return self._conn().execute(
+            "SELECT 1 FROM revisions WHERE project_id = ? AND table_id = ? LIMIT 1", (project_id, str(table_id)),
+        ).fetchone() is not None
+
+    def document(self, project_id: str, table_id: str, at: float) -> Optional[dict]:
+        """at 时刻的文档：最近的检查点加其后的增量；该时刻之前没有修订时返回 None。"""
+        key = (project_id, str(table_id))
+        conn = self._conn()
+        with metrics.span("revisions.read"):
+            upper = conn.execute(
+                "SELECT seq FROM revisions WHERE project_id = ? AND table_id = ? AND at <= ? "
+                "ORDER BY at DESC, seq DESC LIMIT 1", key + (at,),
+            ).fetchone()
+            if upper is None:
+                return None
+            (base,) = conn.execute(
+                "SELECT MAX(seq) FROM revisions WHERE project_id = ? AND table_id = ? AND checkpoint = 1 AND seq <= ?",
+                key + upper,
+            ).fetchone()
+            rows = conn.execute(
+                "SELECT checkpoint, data FROM revisions WHERE project_id = ? AND table_id = ? AND seq BETWEEN ? AND ? "
+                "ORDER BY seq", key + (base, upper[0]),
+            ).fetchall()
+        metrics.storage_bytes("revisions", "read", "revisions", sum(len(data) for _, data in rows))
+        with metrics.json_parse("revisions"):
+            doc = loads_document(rows[0][1])
+            for _, data in rows[1:]:
+                doc = apply_delta(doc, _unpack_delta(data))
+        return doc
+
+    def revisions(self, project_id: str, table_id: str) -> list:
+        """[{"seq", "at", "checkpoint", "size"}]，按时间先后。"""
+        rows = self._conn().execute(
+            "SELECT seq, at, checkpoint, LENGTH(data) FROM revisions WHERE project_id = ? AND table_id = ? ORDER BY seq",
+            (project_id, str(table_id)),
+        ).fetchall()
+        return [{"seq": seq, "at": at, "checkpoint": bool(checkpoint), "size": size} for seq, at, checkpoint, size in rows]
+
+
+def seed(log: RevisionLog, store: TableStore, locks: TableLockManager) -> dict:
+    """为 store 中还没有修订记录的表记录当前文档（持表锁逐张进行），返回 {project_id: [table_id]}。"""
+    result = {}
+    for project_id in store.projects():
+        seeded = []
+        for table_id in store.tables(project_id):
+            with locks.hold_sync(project_id, table_id):
+                if log.has_revisions(project_id, table_id):
+                    continue
+                signature = store.signature(project_id, table_id)
+                doc = store.read(project_id, table_id)
+                if signature is None or not doc:
+                    continue
+                log.record(project_id, table_id, None, doc, None, signature)
+            seeded.append(table_id)
+        result[project_id] = seeded
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Table revision log")
+    sub = parser.add_subparsers(dest="command", required=True)
+    for name in ("seed", "show"):
+        cmd = sub.add_parser(name)
+        cmd.add_argument("--data-dir", required=True, type=Path)
+        cmd.add_argument("--db", type=Path, help="use the SQLite store at this path instead of the file store")
+        cmd.add_argument("--revisions-db", type=Path, help="default: <data-dir>/revisions.db")
+        if name == "seed":
+            cmd.add_argument("--lock-dir", type=Path, help="table lock directory (default: <data-dir>/.locks)")
+        if name == "show":
+            cmd.add_argument("--project", required=True)
+            cmd.add_argument("--table", required=True)
+            cmd.add_argument("--as-of", help="ISO 8601 time; print the document at that time")
+    args = parser.parse_args()
+
+    log = RevisionLog(args.revisions_db or args.data_dir / "revisions.db")
+    if args.command == "seed":
+        store = open_table_store("sqlite" if args.db else "file", args.data_dir, DocumentCache(0), args.db)
+        result = seed(log, store, TableLockManager(args.lock_dir or args.data_dir / ".locks"))
+    elif args.as_of:
+        result = log.document(args.project, args.table, datetime.fromisoformat(args.as_of).timestamp())
+    else:
+        result = [{**r, "at": datetime.fromtimestamp(r["at"]).astimezone().isoformat()}
+                  for r in log.revisions(args.project, args.table)]
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
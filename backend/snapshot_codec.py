@@ -0,0 +1,215 @@
+"""表文档的紧凑存储编码。
+
+原始快照中每个单元格都重复携带 fieldId/fieldName/fieldLabel，且文档以 indent=4 落盘，
+一份 117 行的表可达 1.8MB。紧凑格式在不丢失任何信息的前提下：
+
+- 把单元格中除 value 以外的键提取为列模板 (schema)，每行的 values 只保存按列排列的值；
+  与模板不一致的行原样保存为 {"cells": [...]}；
+- 与之前某个快照 tableData 相同的快照（批准快照、撤销批准后回填的提交快照等）
+  只保存对该快照的引用及不同的顶层键；
+- 以无缩进 JSON 写出（经由 fast_json，安装了 orjson 时使用它），可选 gzip / zstd 压缩（zstd 需要安装 zstandard）。
+
+容器结构：
+  {"$format": "compact-1", "schemas": [[{cell 模板}, ...], ...],
+   "snapshots": {kind: {"schema": i, "data": {...}} | {"ref": kind, "keys": [...], "set": {...}} | {"data": ...}}}
+
+读取时按文件头自动识别压缩方式与格式，旧的纯 JSON 文档原样返回；解码结果与原文档
+（含键顺序、int/float 类型）完全一致。引用得到的快照与被引用快照共享 tableData 对象。
+"""
+import gzip
+import json
+from typing import Optional
+
+import fast_json
+
+FORMAT = "compact-1"
+FORMATS = ("compact", "json")
+COMPRESSIONS = (None, "gzip", "zstd")
+
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+try:
+    import zstandard
+except ImportError:  # 可选依赖
+    zstandard = None
+
+
+def check_options(fmt: str, compression: Optional[str]):
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown table document format: {fmt}")
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Unknown table document compression: {compression}")
+    if compression and fmt != "compact":
+        raise ValueError("Compression requires the compact format")
+    if compression == "zstd" and zstandard is None:
+        raise ValueError("zstd compression requires the 'zstandard' package")
+
+
+# --- rows ---
+
+def _template(cell) -> Optional[tuple]:
+    """单元格去掉 value 后的 (key, value) 序列；value 不是最后一个键时无法按位置还原。"""
+    if not isinstance(cell, dict) or not cell:
+        return None
+    items = tuple(cell.items())
+    if items[-1][0] != "value":
+        return None
+    return items[:-1]
+
+
+def _row_schema(table_data: list) -> Optional[list]:
+    for row in table_data:
+        if isinstance(row, dict) and isinstance(row.get("values"), list) and row["values"]:
+            templates = [_template(cell) for cell in row["values"]]
+            if all(t is not None for t in templates):
+                return templates
+    return None
+
+
+def _pack_row(row, schema: list):
+    if not isinstance(row, dict) or "values" not in row:
+        return row
+    cells = row["values"]
+    packed = dict(row)
+    if (isinstance(cells, list) and len(cells) == len(schema)
+            and all(_template(cell) == template for cell, template in zip(cells, schema))):
+        packed["values"] = [cell["value"] for cell in cells]
+    else:
+        packed["values"] = {"cells": cells}
+    return packed
+
+
+def _unpack_row(row, schema: list):
+    if not isinstance(row, dict) or "values" not in row:
+        return row
+    values = row["values"]
+    unpacked = dict(row)
+    if isinstance(values, list):
+        unpacked["values"] = [{**template, "value": value} for template, value in zip(schema, values)]
+    else:
+        unpacked["values"] = values["cells"]
+    return unpacked
+
+
+class _SchemaTable:
+    def __init__(self):
+        self.items: list = []
+        self._index: dict = {}
+
+    def add(self, schema: list) -> int:
+        key = tuple(schema)
+        idx = self._index.get(key)
+        if idx is None:
+            idx = self._index[key] = len(self.items)
+            self.items.append([dict(template) for template in schema])
+        return idx
+
+
+def _pack_snapshot(snapshot, schemas: _SchemaTable) -> dict:
+    if not isinstance(snapshot, dict) or not isinstance(snapshot.get("tableData"), list):
+        return {"data": snapshot}
+    schema = _row_schema(snapshot["tableData"])
+    if schema is None:
+        return {"data": snapshot}
+    data = dict(snapshot)
+    data["tableData"] = [_pack_row(row, schema) for row in snapshot["tableData"]]
+    return {"schema": schemas.add(schema), "data": data}
+
+
+def _unpack_snapshot(data: dict, schema: list) -> dict:
+    snapshot = dict(data)
+    snapshot["tableData"] = [_unpack_row(row, schema) for row in data["tableData"]]
+    return snapshot
+
+
+def _find_base(snapshot, earlier: dict) -> Optional[str]:
+    if not isinstance(snapshot, dict) or "tableData" not in snapshot:
+        return None
+    table_data = snapshot["tableData"]
+    for kind, other in earlier.items():
+        if isinstance(other, dict) and "tableData" in other and (
+                other["tableData"] is table_data or other["tableData"] == table_data):
+            return kind
+    return None
+
+
+# --- documents ---
+
+def encode_document(doc: dict) -> dict:
+    schemas = _SchemaTable()
+    snapshots = {}
+    earlier = {}
+    for kind, snapshot in doc.items():
+        base = _find_base(snapshot, earlier)
+        if base is not None:
+            base_snapshot = earlier[base]
+            snapshots[kind] = {
+                "ref": base,
+                "keys": list(snapshot),
+                "set": {k: v for k, v in snapshot.items() if k not in base_snapshot or base_snapshot[k] != v},
+            }
+        else:
+            snapshots[kind] = _pack_snapshot(snapshot, schemas)
+        earlier[kind] = snapshot
+    return {"$format": FORMAT, "schemas": schemas.items, "snapshots": snapshots}
+
+
+def decode_document(container):
+    """解码紧凑容器；旧格式文档原样返回。"""
+    if not isinstance(container, dict) or "$format" not in container:
+        return container
+    if container["$format"] != FORMAT:
+        raise ValueError(f"Unsupported table document format: {container['$format']}")
+    schemas = container.get("schemas", [])
+    doc = {}
+    for kind, encoded in container.get("snapshots", {}).items():
+        if "ref" in encoded:
+            base = doc[encoded["ref"]]
+            overrides = encoded.get("set", {})
+            doc[kind] = {k: overrides[k] if k in overrides else base[k] for k in encoded["keys"]}
+        elif "schema" in encoded:
+            doc[kind] = _unpack_snapshot(encoded["data"], schemas[encoded["schema"]])
+        else:
+            doc[kind] = encoded["data"]
+    return doc
+
+
+def dumps_document(doc: dict, fmt: str = "compact", compression: Optional[str] = None) -> bytes:
+    if fmt == "json":
+        return json.dumps(doc, ensure_ascii=False, indent=4).encode("utf-8")
+    raw = fast_json.dumps(encode_document(doc))
+    if compression == "gzip":
+        return gzip.compress(raw, compresslevel=6)
+    if compression == "zstd":
+        return zstandard.ZstdCompressor(level=6).compress(raw)
+    return raw
+
+
+def loads_document(raw: bytes):
+    """按文件头识别压缩方式并解码；内容为空时返回 {}。"""
+    if raw.startswith(GZIP_MAGIC):
+        raw = gzip.decompress(raw)
+    elif raw.startswith(ZSTD_MAGIC):
+        if zstandard is None:
+            raise ValueError("zstd-compressed table document requires the 'zstandard' package")
+        raw = zstandard.ZstdDecompressor().decompress(raw)
+    if not raw:
+        return {}
+    return decode_document(fast_json.loads(raw))
+
+
+# --- single snapshots (SQLite payload 列) ---
+
+def encode_snapshot(snapshot):
+    schemas = _SchemaTable()
+    packed = _pack_snapshot(snapshot, schemas)
+    if "schema" not in packed:
+        return snapshot
+    return {"$schema": schemas.items[0], "data": packed["data"]}
+
+
+def decode_snapshot(stored):
+    if isinstance(stored, dict) and "$schema" in stored:
+        return _unpack_snapshot(stored["data"], stored["$schema"])
+    return stored
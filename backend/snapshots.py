@@ -0,0 +1,300 @@
+"""表文档的内容寻址快照，取代手工复制整个 *_data 目录的备份（9.19远程原始、9.23本地备份 等）。
+
+SNAPSHOT_DIR（默认 DATA_DIR/.snapshots）下：
+  blobs/ab/<sha256>                  一份表文档：snapshot_codec 紧凑编码后压缩（zstd，未安装 zstandard 时 gzip），
+                                     以未压缩编码的 SHA-256 命名，内容相同的文档只存一份；
+  manifests/<project_id>/<id>.json   一次快照：{id, projectId, createdAt, label, store, tables: {table_id: 条目}}，
+                                     条目为 {blob, size（未压缩字节）, stored（压缩后字节）, sig（存储端签名）}。
+
+拍快照时先比较各表当前的存储端签名与上一份清单：签名未变的表直接沿用上一份的 blob，不读取也不编码，
+所以没有变化的表不花任何代价，只有改动过的表会被读取、哈希并写入新 blob。
+每张表各自一致（写入是原子替换），不同表之间不是同一时刻的截面。
+
+恢复可以只恢复一张表或整个项目，经由调用方提供的 write(project_id, table_id, doc) 写回
+（由它持表锁、跳过内容未变的表并返回是否写入）；快照中没有的表保持不动。操作历史 (history.jsonl) 不在快照范围内。
+
+拍快照、清理与回收共用 snapshots.lock 文件锁，多个 worker 进程与命令行工具可同时使用同一目录。
+
+命令行：
+  python snapshots.py take --data-dir <DATA_DIR> [--db tables.db] [--project ID] [--label 文本]
+  python snapshots.py list --data-dir <DATA_DIR> --project ID
+  python snapshots.py restore --data-dir <DATA_DIR> [--db tables.db] --project ID --snapshot ID [--tables 1 9]
+  python snapshots.py prune --data-dir <DATA_DIR> [--keep 48]      # 每个项目保留最近 keep 份，并回收无引用的 blob
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Iterable, Optional
+
+import fast_json
+from doc_cache import DocumentCache
+from snapshot_codec import encode_document, loads_document, zstandard
+from table_locks import TableLockManager, file_lock
+from table_store import TableStore, atomic_write_bytes, open_table_store
+
+LOCK_NAME = "snapshots.lock"
+
+
+class SnapshotError(ValueError):
+    pass
+
+
+def _compress(raw: bytes, compression: str) -> bytes:
+    if compression == "zstd":
+        return zstandard.ZstdCompressor(level=6).compress(raw)
+    return gzip.compress(raw, compresslevel=6, mtime=0)
+
+
+class SnapshotStore:
+    def __init__(self, root: Path, store: TableStore, compression: Optional[str] = None, tz=None):
+        self.root = Path(root)
+        self.store = store
+        self.compression = compression or ("zstd" if zstandard is not None else "gzip")
+        if self.compression not in ("gzip", "zstd"):
+            raise ValueError(f"Unknown snapshot compression: {self.compression}")
+        if self.compression == "zstd" and zstandard is None:
+            raise ValueError("zstd compression requires the 'zstandard' package")
+        self.tz = tz
+        self._lock = threading.Lock()
+
+    def blob_path(self, digest: str) -> Path:
+        return self.root / "blobs" / digest[:2] / digest
+
+    def manifest_dir(self, project_id: str) -> Path:
+        return self.root / "manifests" / project_id
+
+    def _locked(self):
+        self.root.mkdir(parents=True, exist_ok=True)
+        return file_lock(self.root / LOCK_NAME)
+
+    # --- manifests ---
+
+    def snapshot_ids(self, project_id: str) -> list:
+        """按时间先后排列的快照 id。"""
+        directory = self.manifest_dir(project_id)
+        if not directory.exists():
+            return []
+        return sorted(p.stem for p in directory.glob("*.json"))
+
+    def manifest(self, project_id: str, snapshot_id: str) -> dict:
+        path = self.manifest_dir(project_id) / f"{snapshot_id}.json"
+        if path.parent != self.manifest_dir(project_id) or not path.is_file():
+            raise SnapshotError(f"Snapshot '{snapshot_id}' not found.")
+        return fast_json.loads(path.read_bytes())
+
+    def latest(self, project_id: str) -> Optional[dict]:
+        ids = self.snapshot_ids(project_id)
+        return self.manifest(project_id, ids[-1]) if ids else None
+
+    def list(self, project_id: str) -> list:
+        """最新的在前；不含各表条目，只给出表数量与字节数。"""
+        result = []
+        for snapshot_id in reversed(self.snapshot_ids(project_id)):
+            m = self.manifest(project_id, snapshot_id)
+            entries = m["tables"].values()
+            result.append({
+                "id": m["id"], "createdAt": m["createdAt"], "label": m.get("label"),
+                "tables": len(m["tables"]), "size": sum(e["size"] for e in entries),
+                "stored": sum(e["stored"] for e in entries), "added": m.get("added", 0),
+            })
+        return result
+
+    def _new_id(self, project_id: str) -> str:
+        stamp = datetime.now(self.tz).strftime("%Y%m%dT%H%M%S")
+        existing = set(self.snapshot_ids(project_id))
+        seq = 0
+        while f"{stamp}-{seq:03d}" in existing:
+            seq += 1
+        return f"{stamp}-{seq:03d}"
+
+    # --- take ---
+
+    def _store_blob(self, doc: dict) -> tuple:
+        """(digest, 未压缩字节数, 压缩后字节数, 是否新写入)。"""
+        raw = fast_json.dumps(encode_document(doc))
+        digest = hashlib.sha256(raw).hexdigest()
+        path = self.blob_path(digest)
+        if path.exists():
+            return digest, len(raw), path.stat().st_size, False
+        data = _compress(raw, self.compression)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        atomic_write_bytes(path, data)
+        return digest, len(raw), len(data), True
+
+    def take(self, project_id: str, label: Optional[str] = None, skip_unchanged: bool = False) -> dict:
+        """拍一份快照并返回其清单；skip_unchanged 时若与上一份完全相同则不新建，返回上一份。
+
+        返回的清单附带 reused（按签名沿用的表数）与 added（新写入的 blob 字节数）。
+        """
+        store_kind = type(self.store).__name__
+        with self._lock, self._locked():
+            previous = self.latest(project_id)
+            earlier = previous["tables"] if previous and previous.get("store") == store_kind else {}
+            tables, reused, added = {}, 0, 0
+            for table_id in self.store.tables(project_id):
+                signature = self.store.signature(project_id, table_id)
+                if signature is None:
+                    continue
+                entry = earlier.get(table_id)
+                if entry is not None and entry.get("sig") == list(signature) and self.blob_path(entry["blob"]).exists():
+                    tables[table_id] = entry
+                    reused += 1
+                    continue
+                # 先取签名再读文档：其间发生的写入只会让下一次快照多读一次这张表
+                try:
+                    doc = self.store.load(project_id, table_id)
+                except Exception:
+                    continue
+                if not isinstance(doc, dict):
+                    continue
+                digest, size, stored, new = self._store_blob(doc)
+                added += stored if new else 0
+                tables[table_id] = {"blob": digest, "size": size, "stored": stored, "sig": list(signature)}
+            if skip_unchanged and previous is not None and \
+                    {t: e["blob"] for t, e in tables.items()} == {t: e["blob"] for t, e in previous["tables"].items()}:
+                return {**previous, "reused": reused, "added": 0, "unchanged": True}
+            manifest = {
+                "id": self._new_id(project_id),
+                "projectId": project_id,
+                "createdAt": datetime.now(self.tz).isoformat(),
+                "label": label,
+                "store": store_kind,
+                "added": added,
+                "tables": tables,
+            }
+            path = self.manifest_dir(project_id) / f"{manifest['id']}.json"
+            path.parent.mkdir(parents=True, exist_ok=True)
+            atomic_write_bytes(path, json.dumps(manifest, ensure_ascii=False, indent=1).encode("utf-8"))
+            return {**manifest, "reused": reused}
+
+    # --- read / restore ---
+
+    def read_table(self, project_id: str, snapshot_id: str, table_id: str) -> dict:
+        entry = self.manifest(project_id, snapshot_id)["tables"].get(str(table_id))
+        if entry is None:
+            raise SnapshotError(f"Table '{table_id}' is not in snapshot '{snapshot_id}'.")
+        return loads_document(self.blob_path(entry["blob"]).read_bytes())
+
+    def documents(self, project_id: str, snapshot_id: str, table_ids: Optional[Iterable[str]] = None) -> tuple:
+        """解码快照中的表文档（table_ids 为 None 时为全部表），返回 ({table_id: doc}, 快照中没有的表)。"""
+        tables = self.manifest(project_id, snapshot_id)["tables"]
+        wanted = list(tables) if table_ids is None else [str(t) for t in table_ids]
+        docs = {t: loads_document(self.blob_path(tables[t]["blob"]).read_bytes()) for t in wanted if t in tables}
+        return docs, [t for t in wanted if t not in tables]
+
+    def restore(self, project_id: str, snapshot_id: str, write: Callable,
+                table_ids: Optional[Iterable[str]] = None) -> dict:
+        """把快照中的表经 write(project_id, table_id, doc) 写回，内容与当前文档相同的表跳过。
+
+        先解码全部要恢复的文档再逐张写入，blob 损坏时不会只恢复一部分。
+        返回 {"restored": [...], "unchanged": [...], "missing": [快照中没有的表]}。
+        """
+        docs, missing = self.documents(project_id, snapshot_id, table_ids)
+        restored, unchanged = [], []
+        for table_id, doc in docs.items():
+            if write(project_id, table_id, doc):
+                restored.append(table_id)
+            else:
+                unchanged.append(table_id)
+        return {"restored": restored, "unchanged": unchanged, "missing": missing}
+
+    # --- retention ---
+
+    def prune(self, keep: int, project_ids: Optional[Iterable[str]] = None) -> dict:
+        """每个项目只保留最近 keep 份快照，再删除不再被任何清单引用的 blob。"""
+        with self._lock, self._locked():
+            removed = 0
+            manifests_root = self.root / "manifests"
+            projects = list(project_ids) if project_ids is not None else \
+                ([p.name for p in manifests_root.iterdir() if p.is_dir()] if manifests_root.exists() else [])
+            for project_id in projects:
+                ids = self.snapshot_ids(project_id)
+                for snapshot_id in ids[:max(0, len(ids) - keep)]:
+                    os.unlink(self.manifest_dir(project_id) / f"{snapshot_id}.json")
+                    removed += 1
+            freed = self._collect_garbage()
+        return {"manifests": removed, "blobBytes": freed}
+
+    def _collect_garbage(self) -> int:
+        referenced = set()
+        manifests_root = self.root / "manifests"
+        if manifests_root.exists():
+            for path in manifests_root.glob("*/*.json"):
+                referenced.update(e["blob"] for e in fast_json.loads(path.read_bytes())["tables"].values())
+        freed = 0
+        blobs_root = self.root / "blobs"
+        if blobs_root.exists():
+            for path in blobs_root.glob("*/*"):
+                if path.name not in referenced and not path.name.endswith(".tmp"):
+                    freed += path.stat().st_size
+                    path.unlink()
+        return freed
+
+
+def due(snapshots: SnapshotStore, project_id: str, interval_seconds: float) -> bool:
+    """定时快照：最近一份快照早于 interval_seconds 之前（多个 worker 只有一个会真正去拍）。"""
+    latest = snapshots.latest(project_id)
+    if latest is None:
+        return True
+    created = datetime.fromisoformat(latest["createdAt"]).timestamp()
+    return time.time() - created >= interval_seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Content-addressed table snapshots")
+    sub = parser.add_subparsers(dest="command", required=True)
+    for name in ("take", "list", "restore", "prune"):
+        cmd = sub.add_parser(name)
+        cmd.add_argument("--data-dir", required=True, type=Path)
+        cmd.add_argument("--snapshot-dir", type=Path, help="default: <data-dir>/.snapshots")
+        cmd.add_argument("--db", type=Path, help="use the SQLite store at this path instead of the file store")
+        if name in ("list", "restore"):
+            cmd.add_argument("--project", required=True)
+        if name == "take":
+            cmd.add_argument("--project", help="default: every project")
+            cmd.add_argument("--label")
+            cmd.add_argument("--compress", choices=["gzip", "zstd"])
+        if name == "restore":
+            cmd.add_argument("--snapshot", required=True)
+            cmd.add_argument("--tables", nargs="+", help="default: every table in the snapshot")
+            cmd.add_argument("--lock-dir", type=Path, help="table lock directory (default: <data-dir>/.locks)")
+        if name == "prune":
+            cmd.add_argument("--keep", type=int, default=48)
+    args = parser.parse_args()
+
+    store = open_table_store("sqlite" if args.db else "file", args.data_dir, DocumentCache(0), args.db)
+    snapshots = SnapshotStore(args.snapshot_dir or args.data_dir / ".snapshots", store, getattr(args, "compress", None))
+    if args.command == "take":
+        projects = [args.project] if args.project else store.projects()
+        result = {}
+        for project_id in projects:
+            m = snapshots.take(project_id, args.label)
+            result[project_id] = {"id": m["id"], "tables": len(m["tables"]), "reused": m["reused"], "added": m["added"]}
+    elif args.command == "list":
+        result = snapshots.list(args.project)
+    elif args.command == "restore":
+        locks = TableLockManager(args.lock_dir or args.data_dir / ".locks")
+        before = snapshots.take(args.project, f"before restore {args.snapshot}", skip_unchanged=True)
+
+        def write(project_id, table_id, doc):
+            with locks.hold_sync(project_id, table_id):
+                previous = store.read(project_id, table_id)
+                if previous == doc:
+                    return False
+                store.write(project_id, table_id, doc, previous)
+                return True
+
+        result = {"before": before["id"], **snapshots.restore(args.project, args.snapshot, write, args.tables)}
+    else:
+        result = snapshots.prune(args.keep)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""按 (project_id, table_id) 串行化表文档的读-改-写。
+
+进程内用 asyncio.Lock 保证同一张表的写入依次进行、不同表之间互不阻塞；
+进程间（多个 uvicorn worker 或离线导入工具）用锁文件上的操作系统文件锁
+（POSIX flock / Windows msvcrt.locking）互斥。锁文件位于
+{lock_dir}/{project_id}/{table_id}.lock，与存储后端无关，且不会被原子替换，
+因此不能直接锁表文档本身。
+"""
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager, contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+def _lock_fd(fd: int):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        return
+    while True:
+        try:
+            msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+            return
+        except OSError:
+            # LK_LOCK 只重试约 10 秒，持锁方写大文件时可能更久
+            time.sleep(0.05)
+
+
+def _unlock_fd(fd: int):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    else:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+
+def acquire_file_lock(path: Path) -> int:
+    """阻塞直到取得 path 上的排他锁，返回需交给 release_file_lock 的描述符。"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        _lock_fd(fd)
+    except BaseException:
+        os.close(fd)
+        raise
+    return fd
+
+
+def release_file_lock(fd: int):
+    try:
+        _unlock_fd(fd)
+    finally:
+        os.close(fd)
+
+
+@contextmanager
+def file_lock(path: Path):
+    fd = acquire_file_lock(path)
+    try:
+        yield
+    finally:
+        release_file_lock(fd)
+
+
+class TableLockManager:
+    """每张表一把锁；无人持有或等待时自动回收，锁表不会随表数量无限增长。"""
+
+    def __init__(self, lock_dir: Path, executor=None):
+        self.lock_dir = Path(lock_dir)
+        self.executor = executor
+        self._locks: dict[tuple, list] = {}  # key -> [asyncio.Lock, 持有及等待者数量]
+
+    def lock_path(self, project_id: str, table_id: str) -> Path:
+        return self.lock_dir / str(project_id) / f"{table_id}.lock"
+
+    @contextmanager
+    def hold_sync(self, project_id: str, table_id: str):
+        """供离线工具使用：只取操作系统文件锁。"""
+        with file_lock(self.lock_path(project_id, table_id)):
+            yield
+
+    @asynccontextmanager
+    async def hold(self, project_id: str, table_id: str):
+        key = (str(project_id), str(table_id))
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                loop = asyncio.get_running_loop()
+                # 文件锁可能要等待其它进程，放到线程池中获取
+                future = loop.run_in_executor(self.executor, acquire_file_lock, self.lock_path(*key))
+                try:
+                    fd = await asyncio.shield(future)
+                except asyncio.CancelledError:
+                    # 请求被取消时锁仍可能随后取得，取得后立即释放
+                    future.add_done_callback(lambda f: f.cancelled() or f.exception() or release_file_lock(f.result()))
+                    raise
+                try:
+                    yield
+                finally:
+                    release_file_lock(fd)
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[key]
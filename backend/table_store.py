@@ -0,0 +1,681 @@
+"""表文档存储层。
+
+表文档形如 {"submit": {...}, "temp": {...}, "approved": {...}, "unapproved": {...}}，
+每个顶层键称为一个快照 (snapshot)。TableStore 统一了文档与操作历史的读写：
+
+- FileTableStore：默认实现，DATA_DIR/{project_id}_data/{table_id}.json + history.jsonl；
+  单元格级修改追加到 {table_id}.delta.jsonl，读取时叠加，累计大小超过文档本身时合并回文档；
+- SqliteTableStore：单文件 SQLite（WAL 模式），每个快照一行，历史记录存于同库。
+
+两种存储默认都以 snapshot_codec 的紧凑格式写入（TABLE_STORE_FORMAT=json 时
+文件存储仍写旧的 indent=4 JSON），读取时兼容旧格式。
+
+状态查询 (table_statuses) 只使用快照元数据：文件存储维护每个项目的
+_status.json 状态索引，SQLite 存储使用 snapshots.meta 列。
+
+命令行：
+  python table_store.py import --data-dir <DATA_DIR> --db <tables.db>
+      把现有的 *_data 目录批量导入 SQLite；
+  python table_store.py rebuild-status --data-dir <DATA_DIR> [--db <tables.db>]
+      从表文档重建状态索引（索引与文档不一致时使用）；
+  python table_store.py rewrite --data-dir <DATA_DIR> [--format compact|json] [--compress gzip|zstd]
+      按指定格式重写文件存储中的全部表文档并合并单元格增量（持表锁逐张进行，可在服务运行时执行）。
+"""
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Iterable, Optional
+
+import fast_json
+import metrics
+from doc_cache import DocumentCache, file_signature
+from history_store import LEGACY_NAME, LOG_NAME, get_history_log
+from cell_patch import SnapshotDelta
+from snapshot_codec import (check_options, decode_snapshot, dumps_document, encode_snapshot,
+                            loads_document)
+from table_locks import TableLockManager, file_lock
+
+STATUS_INDEX_NAME = "_status.json"
+STATUS_LOCK_NAME = "_status.lock"
+DELTA_SUFFIX = ".delta.jsonl"
+
+
+def atomic_write_bytes(path: Path, content: bytes):
+    """先写同目录下的临时文件再 os.replace，读者只会看到旧文档或完整的新文档。"""
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def atomic_write_json(path: Path, data, **dump_kwargs):
+    atomic_write_bytes(path, json.dumps(data, ensure_ascii=False, **dump_kwargs).encode("utf-8"))
+
+
+def snapshot_meta(snapshot) -> dict:
+    """快照中除 tableData 以外的元数据（submittedAt/approvedBy 等）。"""
+    if not isinstance(snapshot, dict):
+        return {}
+    return {k: v for k, v in snapshot.items() if k != "tableData"}
+
+
+def status_meta_of(doc: dict) -> dict:
+    """{kind: meta}，只包含内容非空的快照，供状态查询使用。"""
+    if not isinstance(doc, dict):
+        return {}
+    return {kind: snapshot_meta(snapshot) for kind, snapshot in doc.items() if snapshot}
+
+
+class TableStore:
+    """表文档与操作历史的持久化接口。
+
+    load/read 返回的文档可能与缓存共享，调用方不得原地修改。
+    """
+
+    cache: DocumentCache
+
+    def load(self, project_id: str, table_id: str) -> Optional[dict]:
+        """读取文档；不存在时返回 None，内容损坏时抛出异常。"""
+        raise NotImplementedError
+
+    def read(self, project_id: str, table_id: str) -> dict:
+        """读取文档；不存在或无法解析时返回 {}。"""
+        try:
+            data = self.load(project_id, str(table_id))
+        except Exception:
+            return {}
+        return data if isinstance(data, dict) else {}
+
+    def exists(self, project_id: str, table_id: str) -> bool:
+        raise NotImplementedError
+
+    def write(self, project_id: str, table_id: str, data: dict, previous: Optional[dict] = None):
+        """整体写入文档。previous 为写入前读到的文档，实现可据此跳过未变化的快照。"""
+        raise NotImplementedError
+
+    def patch(self, project_id: str, table_id: str, delta: SnapshotDelta, data: dict, previous: dict):
+        """写入 previous 应用 delta 后得到的文档 data。默认整体写入（SQLite 只重写变化的快照行），
+        实现可以只持久化增量。"""
+        self.write(project_id, table_id, data, previous)
+
+    def generation(self, project_id: str, table_id: str) -> int:
+        return self.cache.generation((project_id, str(table_id)))
+
+    def signature(self, project_id: str, table_id: str) -> Optional[tuple]:
+        """不读取文档即可得到的版本标识，跨进程一致；文档不存在时返回 None。"""
+        raise NotImplementedError
+
+    def status_meta(self, project_id: str, table_ids: Iterable[str]) -> dict:
+        """{table_id: {kind: meta}}；不存在的表不出现在结果中。"""
+        result = {}
+        for table_id in table_ids:
+            doc = self.read(project_id, str(table_id))
+            if doc:
+                result[str(table_id)] = status_meta_of(doc)
+        return result
+
+    def rebuild_status_index(self, project_id: str) -> int:
+        """从表文档重建状态元数据，返回涉及的表数量。"""
+        raise NotImplementedError
+
+    def append_history(self, project_id: str, record: dict):
+        raise NotImplementedError
+
+    def table_history(self, project_id: str, table_id: str) -> list:
+        raise NotImplementedError
+
+    def projects(self) -> list:
+        raise NotImplementedError
+
+    def tables(self, project_id: str) -> list:
+        raise NotImplementedError
+
+
+class FileTableStore(TableStore):
+    """每张表一个 JSON 文件。
+
+    表文档以临时文件 + os.replace 原子落盘；同一张表的读-改-写由调用方
+    通过 TableLockManager 串行化。
+
+    单元格级修改以 {"on": 文档签名, **SnapshotDelta 记录} 逐行追加到 {table_id}.delta.jsonl，
+    读取时叠加在文档上；"on" 与当前文档签名不一致的行（整体写入后残留的）被忽略。
+    增量文件累计超过文档大小时改为整体写入，整体写入后删除增量文件。
+    表的签名为文档签名，存在增量文件时再加上增量文件的签名。
+
+    状态索引 {project}_data/_status.json 的结构为
+    {table_id: {"sig": 表的签名, "meta": {kind: meta}}}，
+    每次写入时在 _status.lock 文件锁内同步更新；查询时用 stat 得到的签名校验每个条目，
+    不一致（被外部修改或其它进程写入）的条目会自动从文档重新生成。
+    """
+
+    def __init__(self, data_dir: Path, cache: DocumentCache, fmt: str = "compact", compression: Optional[str] = None):
+        check_options(fmt, compression)
+        self.data_dir = Path(data_dir)
+        self.cache = cache
+        self.format = fmt
+        self.compression = compression
+        self._status: dict[str, tuple] = {}
+        self._status_lock = threading.RLock()
+
+    def project_dir(self, project_id: str) -> Path:
+        return self.data_dir / f"{project_id}_data"
+
+    def path(self, project_id: str, table_id: str) -> Path:
+        return self.project_dir(project_id) / f"{table_id}.json"
+
+    def delta_path(self, project_id: str, table_id: str) -> Path:
+        return self.project_dir(project_id) / f"{table_id}{DELTA_SUFFIX}"
+
+    def _signature(self, project_id: str, table_id: str) -> Optional[tuple]:
+        signature = file_signature(self.path(project_id, table_id))
+        if signature is None:
+            return None
+        delta_signature = file_signature(self.delta_path(project_id, table_id))
+        return signature if delta_signature is None else signature + delta_signature
+
+    def load(self, project_id: str, table_id: str) -> Optional[dict]:
+        key = (project_id, str(table_id))
+        path = self.path(project_id, table_id)
+        signature = self._signature(project_id, table_id)
+        if signature is None:
+            self.cache.forget(key)
+            return None
+
+        def _load():
+            with metrics.span("store.read"):
+                with open(path, "rb") as f:
+                    raw = f.read()
+            metrics.storage_bytes("file", "read", "document", len(raw))
+            with metrics.json_parse("document"):
+                doc = loads_document(raw)
+            if len(signature) == 3:
+                return doc, len(raw)
+            doc, delta_size = self._apply_deltas(project_id, table_id, doc, list(signature[:3]))
+            return doc, len(raw) + delta_size
+
+        return self.cache.lookup(key, signature, _load)
+
+    def _apply_deltas(self, project_id: str, table_id: str, doc: dict, on: list) -> tuple:
+        try:
+            with open(self.delta_path(project_id, table_id), "rb") as f:
+                raw = f.read()
+        except FileNotFoundError:
+            return doc, 0
+        metrics.storage_bytes("file", "read", "delta", len(raw))
+        with metrics.json_parse("delta"):
+            records = [fast_json.loads(line) for line in raw[:raw.rfind(b"\n") + 1].splitlines()]  # 未写完的行忽略
+        for record in records:
+            if record.get("on") == on:
+                doc = SnapshotDelta.from_record(record).apply(doc)
+        return doc, len(raw)
+
+    def exists(self, project_id: str, table_id: str) -> bool:
+        return self.path(project_id, table_id).exists()
+
+    def signature(self, project_id: str, table_id: str) -> Optional[tuple]:
+        return self._signature(project_id, table_id)
+
+    def write(self, project_id: str, table_id: str, data: dict, previous: Optional[dict] = None):
+        file_path = self.path(project_id, table_id)
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        with metrics.span("store.encode"):
+            content = dumps_document(data, self.format, self.compression)
+        with metrics.span("store.write"):
+            atomic_write_bytes(file_path, content)
+        metrics.storage_bytes("file", "write", "document", len(content))
+        # 新文档已包含全部增量；删除前残留的增量行因 "on" 不匹配而被忽略
+        try:
+            os.unlink(self.delta_path(project_id, table_id))
+        except FileNotFoundError:
+            pass
+        self.cache.put((project_id, str(table_id)), file_path, data)
+        self._update_status_entry(project_id, str(table_id), data)
+
+    def patch(self, project_id: str, table_id: str, delta: SnapshotDelta, data: dict, previous: dict):
+        on = file_signature(self.path(project_id, table_id))
+        if on is None:
+            self.write(project_id, table_id, data, previous)
+            return
+        line = fast_json.dumps({"on": list(on), **delta.to_record()}) + b"\n"
+        delta_path = self.delta_path(project_id, table_id)
+        existing = file_signature(delta_path)
+        if (existing[1] if existing else 0) + len(line) > on[1]:
+            # 叠加增量的代价已超过重新读取整个文档：合并回文档
+            self.write(project_id, table_id, data, previous)
+            return
+        with metrics.span("store.write"):
+            fd = os.open(delta_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, line)
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        metrics.storage_bytes("file", "write", "delta", len(line))
+        key = (project_id, str(table_id))
+        signature = self._signature(project_id, table_id)
+        self.cache.store(key, signature, data, on[1] + signature[4])
+        self._update_status_entry(project_id, str(table_id), data)
+
+    # --- status index ---
+
+    def status_index_path(self, project_id: str) -> Path:
+        return self.project_dir(project_id) / STATUS_INDEX_NAME
+
+    def _status_index(self, project_id: str) -> dict:
+        path = self.status_index_path(project_id)
+        signature = file_signature(path)
+        cached = self._status.get(project_id)
+        if signature is not None and cached is not None and cached[0] == signature:
+            return cached[1]
+        index = None
+        if signature is not None:
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    index = json.load(f)
+            except (json.JSONDecodeError, IOError):
+                index = None
+        if not isinstance(index, dict):
+            return self._build_status_index(project_id)
+        self._status[project_id] = (signature, index)
+        return index
+
+    def _save_status_index(self, project_id: str, index: dict):
+        path = self.status_index_path(project_id)
+        if not path.parent.exists():
+            return
+        atomic_write_json(path, index, separators=(",", ":"))
+        self._status[project_id] = (file_signature(path), index)
+
+    @staticmethod
+    def _status_entry(signature: tuple, doc: dict) -> dict:
+        return {"sig": list(signature), "meta": status_meta_of(doc)}
+
+    def _build_status_index(self, project_id: str) -> dict:
+        index = {}
+        for table_id in self.tables(project_id):
+            signature = self._signature(project_id, table_id)
+            if signature is not None:
+                index[table_id] = self._status_entry(signature, self.read(project_id, table_id))
+        self._save_status_index(project_id, index)
+        return index
+
+    def _update_status_entry(self, project_id: str, table_id: str, doc: dict):
+        # 其它进程也会改写索引：持文件锁重新读取后再合并本条目
+        with self._status_lock, file_lock(self.project_dir(project_id) / STATUS_LOCK_NAME):
+            index = dict(self._status_index(project_id))
+            signature = self._signature(project_id, table_id)
+            if signature is None:
+                index.pop(table_id, None)
+            else:
+                index[table_id] = self._status_entry(signature, doc)
+            self._save_status_index(project_id, index)
+
+    def status_meta(self, project_id: str, table_ids: Iterable[str]) -> dict:
+        result = {}
+        with metrics.span("store.status_meta"), self._status_lock:
+            index = self._status_index(project_id)
+            updated = None
+            for table_id in (str(t) for t in table_ids):
+                signature = self._signature(project_id, table_id)
+                entry = index.get(table_id)
+                if signature is None:
+                    if entry is not None:
+                        updated = updated if updated is not None else dict(index)
+                        updated.pop(table_id, None)
+                    continue
+                if entry is None or entry.get("sig") != list(signature):
+                    # 索引与文档不一致：仅重新解析这一张表
+                    entry = self._status_entry(signature, self.read(project_id, table_id))
+                    updated = updated if updated is not None else dict(index)
+                    updated[table_id] = entry
+                if entry.get("meta"):
+                    result[table_id] = entry["meta"]
+            if updated is not None:
+                self._save_status_index(project_id, updated)
+        return result
+
+    def rebuild_status_index(self, project_id: str) -> int:
+        with self._status_lock:
+            return len(self._build_status_index(project_id))
+
+    def append_history(self, project_id: str, record: dict):
+        get_history_log(self.project_dir(project_id)).append(record)
+
+    def table_history(self, project_id: str, table_id: str) -> list:
+        if not self.project_dir(project_id).exists():
+            return []
+        return get_history_log(self.project_dir(project_id)).read_table(str(table_id))
+
+    def history_records(self, project_id: str) -> list:
+        """读取全部历史记录，不触发旧格式迁移（供导入工具使用）。"""
+        project_dir = self.project_dir(project_id)
+        if (project_dir / LOG_NAME).exists():
+            return get_history_log(project_dir).read_all()
+        legacy = project_dir / LEGACY_NAME
+        if not legacy.exists():
+            return []
+        try:
+            with open(legacy, "r", encoding="utf-8-sig") as f:
+                records = json.load(f)
+        except (json.JSONDecodeError, IOError):
+            return []
+        return [r for r in records if isinstance(r, dict)] if isinstance(records, list) else []
+
+    def projects(self) -> list:
+        if not self.data_dir.exists():
+            return []
+        return sorted(p.name[:-len("_data")] for p in self.data_dir.iterdir() if p.is_dir() and p.name.endswith("_data"))
+
+    def tables(self, project_id: str) -> list:
+        project_dir = self.project_dir(project_id)
+        if not project_dir.exists():
+            return []
+        return sorted(p.stem for p in project_dir.glob("*.json") if p.name != LEGACY_NAME and not p.name.startswith("_"))
+
+
+class SqliteTableStore(TableStore):
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS tables (
+        project_id TEXT NOT NULL,
+        table_id TEXT NOT NULL,
+        generation INTEGER NOT NULL DEFAULT 0,
+        updated_at REAL,
+        PRIMARY KEY (project_id, table_id)
+    );
+    CREATE TABLE IF NOT EXISTS snapshots (
+        project_id TEXT NOT NULL,
+        table_id TEXT NOT NULL,
+        kind TEXT NOT NULL,
+        position INTEGER NOT NULL,
+        truthy INTEGER NOT NULL,
+        size INTEGER NOT NULL,
+        meta TEXT NOT NULL,
+        payload TEXT NOT NULL,
+        PRIMARY KEY (project_id, table_id, kind)
+    );
+    CREATE TABLE IF NOT EXISTS history (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        project_id TEXT NOT NULL,
+        table_id TEXT NOT NULL,
+        record TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS history_by_table ON history (project_id, table_id, id);
+    """
+
+    def __init__(self, db_path: Path, cache: DocumentCache, fmt: str = "compact"):
+        check_options(fmt, None)
+        self.db_path = Path(db_path)
+        self.cache = cache
+        self.format = fmt
+        self._local = threading.local()
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = self._conn()
+        conn.executescript(self.SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.db_path), timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _generation_row(self, project_id: str, table_id: str) -> Optional[int]:
+        row = self._conn().execute(
+            "SELECT generation FROM tables WHERE project_id = ? AND table_id = ?",
+            (project_id, str(table_id)),
+        ).fetchone()
+        return row[0] if row else None
+
+    def load(self, project_id: str, table_id: str) -> Optional[dict]:
+        key = (project_id, str(table_id))
+        generation = self._generation_row(project_id, table_id)
+        if generation is None:
+            self.cache.forget(key)
+            return None
+
+        def _load():
+            with metrics.span("store.read"):
+                rows = self._conn().execute(
+                    "SELECT kind, payload FROM snapshots WHERE project_id = ? AND table_id = ? ORDER BY position",
+                    key,
+                ).fetchall()
+            size = sum(len(payload) for _, payload in rows)
+            metrics.storage_bytes("sqlite", "read", "document", size)
+            with metrics.json_parse("document"):
+                return {kind: decode_snapshot(fast_json.loads(payload)) for kind, payload in rows}, size
+
+        return self.cache.lookup(key, (generation,), _load)
+
+    def exists(self, project_id: str, table_id: str) -> bool:
+        return self._generation_row(project_id, table_id) is not None
+
+    def signature(self, project_id: str, table_id: str) -> Optional[tuple]:
+        generation = self._generation_row(project_id, table_id)
+        return None if generation is None else (generation,)
+
+    def write(self, project_id: str, table_id: str, data: dict, previous: Optional[dict] = None):
+        key = (project_id, str(table_id))
+        conn = self._conn()
+        written = 0
+        with metrics.span("store.write"), conn:
+            for position, (kind, snapshot) in enumerate(data.items()):
+                if previous is not None and kind in previous and previous[kind] is snapshot:
+                    # 未变化的快照只更新顺序，不重写内容
+                    conn.execute(
+                        "UPDATE snapshots SET position = ? WHERE project_id = ? AND table_id = ? AND kind = ?",
+                        (position, key[0], key[1], kind),
+                    )
+                    continue
+                if self.format == "compact":
+                    payload = fast_json.dumps_text(encode_snapshot(snapshot))
+                else:
+                    payload = json.dumps(snapshot, ensure_ascii=False)
+                written += len(payload)
+                conn.execute(
+                    "INSERT OR REPLACE INTO snapshots (project_id, table_id, kind, position, truthy, size, meta, payload) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (key[0], key[1], kind, position, 1 if snapshot else 0, len(payload),
+                     json.dumps(snapshot_meta(snapshot), ensure_ascii=False), payload),
+                )
+            kinds = list(data.keys())
+            if kinds:
+                conn.execute(
+                    f"DELETE FROM snapshots WHERE project_id = ? AND table_id = ? AND kind NOT IN ({','.join('?' * len(kinds))})",
+                    (key[0], key[1], *kinds),
+                )
+            else:
+                conn.execute("DELETE FROM snapshots WHERE project_id = ? AND table_id = ?", key)
+            conn.execute(
+                "INSERT INTO tables (project_id, table_id, generation, updated_at) VALUES (?, ?, 1, ?) "
+                "ON CONFLICT (project_id, table_id) DO UPDATE SET generation = generation + 1, updated_at = excluded.updated_at",
+                (key[0], key[1], time.time()),
+            )
+            generation = conn.execute(
+                "SELECT generation FROM tables WHERE project_id = ? AND table_id = ?", key
+            ).fetchone()[0]
+            size = conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM snapshots WHERE project_id = ? AND table_id = ?", key
+            ).fetchone()[0]
+        metrics.storage_bytes("sqlite", "write", "document", written)
+        self.cache.store(key, (generation,), data, size)
+
+    def status_meta(self, project_id: str, table_ids: Iterable[str]) -> dict:
+        ids = [str(t) for t in table_ids]
+        result: dict = {}
+        conn = self._conn()
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            rows = conn.execute(
+                f"SELECT table_id, kind, meta FROM snapshots WHERE project_id = ? AND truthy = 1 "
+                f"AND table_id IN ({','.join('?' * len(chunk))}) ORDER BY table_id, position",
+                (project_id, *chunk),
+            ).fetchall()
+            for table_id, kind, meta in rows:
+                result.setdefault(table_id, {})[kind] = fast_json.loads(meta)
+        return result
+
+    def rebuild_status_index(self, project_id: str) -> int:
+        conn = self._conn()
+        rows = conn.execute(
+            "SELECT table_id, kind, payload FROM snapshots WHERE project_id = ?", (project_id,)
+        ).fetchall()
+        with conn:
+            for table_id, kind, payload in rows:
+                snapshot = decode_snapshot(fast_json.loads(payload))
+                conn.execute(
+                    "UPDATE snapshots SET truthy = ?, meta = ? WHERE project_id = ? AND table_id = ? AND kind = ?",
+                    (1 if snapshot else 0, json.dumps(snapshot_meta(snapshot), ensure_ascii=False), project_id, table_id, kind),
+                )
+        return len({row[0] for row in rows})
+
+    def append_history(self, project_id: str, record: dict):
+        conn = self._conn()
+        line = json.dumps(record, ensure_ascii=False)
+        with metrics.span("history.append"), conn:
+            conn.execute(
+                "INSERT INTO history (project_id, table_id, record) VALUES (?, ?, ?)",
+                (project_id, str(record.get("tableId")), line),
+            )
+        metrics.storage_bytes("sqlite", "write", "history", len(line))
+
+    def table_history(self, project_id: str, table_id: str) -> list:
+        with metrics.span("history.read"):
+            rows = self._conn().execute(
+                "SELECT record FROM history WHERE project_id = ? AND table_id = ? ORDER BY id",
+                (project_id, str(table_id)),
+            ).fetchall()
+        metrics.storage_bytes("sqlite", "read", "history", sum(len(record) for (record,) in rows))
+        with metrics.json_parse("history"):
+            return [fast_json.loads(record) for (record,) in rows]
+
+    def replace_history(self, project_id: str, records: list):
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM history WHERE project_id = ?", (project_id,))
+            conn.executemany(
+                "INSERT INTO history (project_id, table_id, record) VALUES (?, ?, ?)",
+                [(project_id, str(r.get("tableId")), json.dumps(r, ensure_ascii=False)) for r in records],
+            )
+
+    def projects(self) -> list:
+        rows = self._conn().execute("SELECT DISTINCT project_id FROM tables ORDER BY project_id").fetchall()
+        return [r[0] for r in rows]
+
+    def tables(self, project_id: str) -> list:
+        rows = self._conn().execute(
+            "SELECT table_id FROM tables WHERE project_id = ? ORDER BY table_id", (project_id,)
+        ).fetchall()
+        return [r[0] for r in rows]
+
+
+def open_table_store(kind: str, data_dir: Path, cache: DocumentCache, db_path: Optional[Path] = None,
+                     fmt: str = "compact", compression: Optional[str] = None) -> TableStore:
+    kind = (kind or "file").lower()
+    if kind == "file":
+        return FileTableStore(data_dir, cache, fmt, compression or None)
+    if kind == "sqlite":
+        return SqliteTableStore(db_path or Path(data_dir) / "tables.db", cache, fmt)
+    raise ValueError(f"Unknown table store: {kind}")
+
+
+def import_file_tree(data_dir: Path, target: SqliteTableStore) -> dict:
+    """把 data_dir 下所有 *_data 目录中的表文档与历史记录导入 target（可重复执行）。
+
+    只读取各 *_data 目录顶层的 {table_id}.json，备份子目录不会被导入。
+    """
+    source = FileTableStore(data_dir, DocumentCache(0))
+    summary = {}
+    for project_id in source.projects():
+        imported = []
+        skipped = []
+        for table_id in source.tables(project_id):
+            try:
+                doc = source.load(project_id, table_id)
+            except Exception:
+                skipped.append(table_id)
+                continue
+            if not isinstance(doc, dict):
+                skipped.append(table_id)
+                continue
+            target.write(project_id, table_id, doc)
+            imported.append(table_id)
+        history = source.history_records(project_id)
+        target.replace_history(project_id, history)
+        summary[project_id] = {"tables": imported, "skipped": skipped, "history": len(history)}
+    return summary
+
+
+def rewrite_file_tree(store: FileTableStore, locks: TableLockManager) -> dict:
+    """按 store 的格式重写全部表文档，返回 {project_id: {"tables": n, "before": 字节数, "after": 字节数}}。"""
+    summary = {}
+    for project_id in store.projects():
+        count = before = after = 0
+        for table_id in store.tables(project_id):
+            with locks.hold_sync(project_id, table_id):
+                path = store.path(project_id, table_id)
+                size = path.stat().st_size
+                try:
+                    doc = store.load(project_id, table_id)
+                except Exception:
+                    continue
+                if not isinstance(doc, dict):
+                    continue
+                store.write(project_id, table_id, doc)
+            count += 1
+            before += size
+            after += path.stat().st_size
+        summary[project_id] = {"tables": count, "before": before, "after": after}
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Table store maintenance")
+    sub = parser.add_subparsers(dest="command", required=True)
+    imp = sub.add_parser("import", help="import *_data directories into a SQLite store")
+    imp.add_argument("--data-dir", required=True, type=Path)
+    imp.add_argument("--db", required=True, type=Path)
+    rebuild = sub.add_parser("rebuild-status", help="rebuild the status index from the stored documents")
+    rebuild.add_argument("--data-dir", required=True, type=Path)
+    rebuild.add_argument("--db", type=Path, help="rebuild a SQLite store instead of the file store")
+    rewrite = sub.add_parser("rewrite", help="rewrite all file-store documents in the given encoding")
+    rewrite.add_argument("--data-dir", required=True, type=Path)
+    rewrite.add_argument("--format", default="compact", choices=["compact", "json"])
+    rewrite.add_argument("--compress", choices=["gzip", "zstd"])
+    rewrite.add_argument("--lock-dir", type=Path, help="table lock directory (default: <data-dir>/.locks)")
+    args = parser.parse_args()
+
+    if args.command == "import":
+        store = SqliteTableStore(args.db, DocumentCache(0))
+        summary = import_file_tree(args.data_dir, store)
+        print(json.dumps(summary, ensure_ascii=False, indent=2))
+    elif args.command == "rebuild-status":
+        if args.db:
+            store = SqliteTableStore(args.db, DocumentCache(0))
+        else:
+            store = FileTableStore(args.data_dir, DocumentCache(0))
+        summary = {project_id: store.rebuild_status_index(project_id) for project_id in store.projects()}
+        print(json.dumps(summary, ensure_ascii=False, indent=2))
+    elif args.command == "rewrite":
+        store = FileTableStore(args.data_dir, DocumentCache(0), args.format, args.compress)
+        locks = TableLockManager(args.lock_dir or args.data_dir / ".locks")
+        summary = rewrite_file_tree(store, locks)
+        print(json.dumps(summary, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
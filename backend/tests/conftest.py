@@ -0,0 +1,34 @@
+"""测试共用的应用实例：main 在进程内只导入一次，数据目录为 backend_data 的临时副本。"""
+import importlib
+import os
+import shutil
+import sys
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+SOURCE_DATA_DIR = BACKEND_DIR.parent / "backend_data"
+sys.path.insert(0, str(BACKEND_DIR))
+
+
+@pytest.fixture(scope="session")
+def app(tmp_path_factory):
+    data_dir = tmp_path_factory.mktemp("data")
+    shutil.copytree(SOURCE_DATA_DIR, data_dir, dirs_exist_ok=True)
+    os.environ["DATA_DIR_PATH"] = str(data_dir)
+    os.environ.pop("TABLE_STORE", None)
+    main = importlib.import_module("main")
+    yield main
+    main.ACTIVITY_LOG.close()
+
+
+@pytest.fixture(scope="session")
+def client(app):
+    return TestClient(app.app)
+
+
+@pytest.fixture(scope="session")
+def project_id(app):
+    return app.STORE.projects()[0]
@@ -0,0 +1,83 @@
+"""PATCH table/{tid}/cells（cell_patch.py）：版本冲突、快照元数据与增量文件的读取。"""
+from doc_cache import DocumentCache
+from table_store import open_table_store
+
+TABLE_ID = "14"
+
+
+def _get(client, project_id, table_id=TABLE_ID):
+    response = client.get(f"/project/{project_id}/data/table/{table_id}")
+    assert response.status_code == 200
+    return response
+
+
+def _first_numeric_cell(snapshot):
+    for row in snapshot["tableData"]:
+        for cell in row["values"]:
+            if isinstance(cell.get("value"), (int, float)) and not isinstance(cell["value"], bool):
+                return row["metricId"], cell["fieldId"], cell["value"]
+    raise AssertionError("no numeric cell")
+
+
+def _patch(client, project_id, action, base_revision, changes, headers=None):
+    return client.patch(f"/project/{project_id}/table/{TABLE_ID}/cells",
+                        json={"action": action, "baseRevision": base_revision, "changes": changes},
+                        headers=headers or {})
+
+
+def test_stale_base_revision_conflicts(client, project_id):
+    response = _get(client, project_id)
+    stale = response.headers["X-Table-Revision"]
+    metric_id, field_id, value = _first_numeric_cell(response.json()["submit"])
+    change = [{"metricId": metric_id, "fieldId": field_id, "value": value + 1}]
+    first = _patch(client, project_id, "submit", stale, change, {"X-User-Name": "group_admin"})
+    assert first.status_code == 200
+
+    second = _patch(client, project_id, "submit", stale, change, {"X-User-Name": "group_admin"})
+    assert second.status_code == 409
+    assert second.json()["detail"]["revision"] == first.json()["revision"]
+    assert _get(client, project_id).headers["X-Table-Revision"] == first.json()["revision"]
+
+
+def test_snapshot_meta(client, project_id):
+    response = _get(client, project_id)
+    doc = response.json()
+    metric_id, field_id, value = _first_numeric_cell(doc["submit"])
+    submitted_by = doc["submit"].get("submittedBy")
+
+    # 取不到操作人时保留原快照的 submittedBy
+    result = _patch(client, project_id, "submit", response.headers["X-Table-Revision"],
+                    [{"metricId": metric_id, "fieldId": field_id, "value": value + 1}])
+    assert result.status_code == 200
+    submit = _get(client, project_id).json()["submit"]
+    assert submit.get("submittedBy") == submitted_by
+    assert submit["submittedAt"] != doc["submit"]["submittedAt"]
+
+    # 草稿只记录暂存时间，提交时间不变
+    response = _get(client, project_id)
+    result = _patch(client, project_id, "save_draft", response.headers["X-Table-Revision"],
+                    [{"metricId": metric_id, "fieldId": field_id, "value": value + 2}],
+                    {"X-User-Name": "group_admin"})
+    assert result.status_code == 200
+    after = _get(client, project_id).json()
+    assert after["temp"]["submittedBy"]["username"] == "group_admin"
+    assert "savedAt" in after["temp"]
+    assert after["temp"].get("submittedAt") == response.json()["submit"]["submittedAt"]
+    assert after["submit"] == response.json()["submit"]
+
+
+def test_cold_reader_applies_delta_file(app, client, project_id):
+    response = _get(client, project_id)
+    metric_id, field_id, value = _first_numeric_cell(response.json()["submit"])
+    result = _patch(client, project_id, "submit", response.headers["X-Table-Revision"],
+                    [{"metricId": metric_id, "fieldId": field_id, "value": value + 3}],
+                    {"X-User-Name": "group_admin"})
+    assert result.status_code == 200
+    assert app.STORE.delta_path(project_id, TABLE_ID).exists()
+
+    # 新进程的读取方：空的文档缓存，须从文档 + delta.jsonl 得到同样的内容
+    cold = open_table_store("file", app.STORE.data_dir, DocumentCache(1 << 20),
+                            fmt=app.STORE.format, compression=app.STORE.compression)
+    doc = cold.read(project_id, TABLE_ID)
+    assert doc == app.STORE.read(project_id, TABLE_ID)
+    assert _first_numeric_cell(doc["submit"])[2] == value + 3
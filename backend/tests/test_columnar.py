@@ -0,0 +1,71 @@
+"""columnar.py：列式编码与逐行构建 {metricId: {fieldId: value}} 的语义一致。"""
+import json
+
+import numpy as np
+
+from columnar import ColumnarTable, TableLayout, encode_table
+from conftest import SOURCE_DATA_DIR
+
+
+def _as_dict(table_data):
+    rows = {}
+    for row in table_data:
+        if isinstance(row, dict) and row.get("metricId"):
+            rows[row["metricId"]] = {c["fieldId"]: c.get("value", 0) for c in row.get("values", [])
+                                     if isinstance(c, dict) and c.get("fieldId")}
+    return rows
+
+
+def _decode(table: ColumnarTable, layout: TableLayout):
+    rows = {}
+    for metric_id, i in layout.metric_index.items():
+        if not table.present[i]:
+            continue
+        rows[metric_id] = {}
+        for field_id, j in layout.field_index.items():
+            if table.numeric[i, j]:
+                value = table.values[i, j]
+                rows[metric_id][field_id] = float(value) if table.is_float[i, j] else int(value)
+    return rows
+
+
+def _numeric_only(rows):
+    return {m: {f: v for f, v in cells.items() if isinstance(v, (int, float))} for m, cells in rows.items()}
+
+
+def test_encode_matches_row_semantics():
+    table_data = [
+        {"metricId": "a", "values": [{"fieldId": "x", "value": 1}, {"fieldId": "y", "value": 2.5}]},
+        {"metricId": "b", "force": True, "values": [{"fieldId": "x", "value": "n/a"}, {"fieldId": "z", "value": 3}]},
+        # 重复的 metricId 以最后一行为准，行内重复的 fieldId 以最后一个单元格为准
+        {"metricId": "a", "values": [{"fieldId": "y", "value": 4}, {"fieldId": "y", "value": 5.0}]},
+        {"values": [{"fieldId": "x", "value": 9}]},
+    ]
+    layout = TableLayout()
+    table = encode_table(table_data, layout)
+    assert layout.metric_ids == ["a", "b"] and layout.field_ids == ["x", "y", "z"]
+    assert _decode(table, layout) == {"a": {"y": 5.0}, "b": {"z": 3}}
+    assert isinstance(_decode(table, layout)["a"]["y"], float)
+    assert table.force.tolist() == [False, True]
+
+
+def test_real_tables_round_trip():
+    layout = TableLayout()
+    for path in sorted((SOURCE_DATA_DIR / "heating_plan_2025-2026_data").glob("*.json")):
+        doc = json.loads(path.read_text(encoding="utf-8-sig"))
+        if not isinstance(doc, dict):
+            continue
+        for snapshot in doc.values():
+            if isinstance(snapshot, dict) and isinstance(snapshot.get("tableData"), list):
+                table = encode_table(snapshot["tableData"], layout)
+                assert _decode(table, layout) == _numeric_only(_as_dict(snapshot["tableData"]))
+
+
+def test_fit_pads_after_layout_grows():
+    layout = TableLayout(["a"], ["x"])
+    table = encode_table([{"metricId": "a", "values": [{"fieldId": "x", "value": 7}]}], layout)
+    layout.ensure(["b"], ["y"])
+    table.fit(layout.shape)
+    assert table.values.shape == (2, 2)
+    assert np.array_equal(table.values, [[7, 0], [0, 0]])
+    assert table.present.tolist() == [True, False]
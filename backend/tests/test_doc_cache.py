@@ -0,0 +1,75 @@
+"""doc_cache.DocumentCache：按文件签名校验缓存，外部写入视为一次新的写入。"""
+import json
+import os
+
+from doc_cache import DocumentCache
+
+KEY = ("project", "1")
+
+
+def _replace(path, data):
+    # 其它进程的写入方式：临时文件 + 原子替换
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(data), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def test_unchanged_file_is_served_from_cache(tmp_path):
+    path = tmp_path / "1.json"
+    _replace(path, {"submit": {"n": 1}})
+    cache = DocumentCache(1 << 20)
+    first = cache.get(KEY, path)
+    generation = cache.generation(KEY)
+    assert cache.get(KEY, path) is first
+    assert cache.generation(KEY) == generation
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_external_write_bumps_generation(tmp_path):
+    path = tmp_path / "1.json"
+    _replace(path, {"submit": {"n": 1}})
+    cache = DocumentCache(1 << 20)
+    cache.get(KEY, path)
+    generation = cache.generation(KEY)
+
+    _replace(path, {"submit": {"n": 1}})  # 内容相同、大小相同，仍是一次新的写入
+    assert cache.get(KEY, path) == {"submit": {"n": 1}}
+    assert cache.generation(KEY) == generation + 1
+
+    _replace(path, {"submit": {"n": 22}})
+    assert cache.get(KEY, path) == {"submit": {"n": 22}}
+    assert cache.generation(KEY) == generation + 2
+
+
+def test_put_and_removal(tmp_path):
+    path = tmp_path / "1.json"
+    cache = DocumentCache(1 << 20)
+    assert cache.get(KEY, path) is None
+
+    doc = {"submit": {"n": 3}}
+    _replace(path, doc)
+    generation = cache.put(KEY, path, doc)
+    assert cache.get(KEY, path) is doc
+    assert cache.misses == 0
+
+    os.unlink(path)
+    assert cache.get(KEY, path) is None
+    assert cache.generation(KEY) == generation + 1
+
+
+def test_evicts_least_recently_used(tmp_path):
+    paths = []
+    for i in range(3):
+        path = tmp_path / f"{i}.json"
+        _replace(path, {"data": "x" * 100})
+        paths.append(path)
+    cache = DocumentCache(2 * paths[0].stat().st_size)
+    cache.get(("p", "0"), paths[0])
+    cache.get(("p", "1"), paths[1])
+    cache.get(("p", "0"), paths[0])
+    cache.get(("p", "2"), paths[2])
+    assert cache.evictions == 1
+    assert cache.cached(("p", "1"), None) is None
+    hits = cache.hits
+    cache.get(("p", "0"), paths[0])
+    assert cache.hits == hits + 1
@@ -0,0 +1,68 @@
+"""history_store.HistoryLog：偏移索引读取与全量扫描一致；旧 history.json 的迁移只执行一次。"""
+import json
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+from conftest import BACKEND_DIR, SOURCE_DATA_DIR
+from history_store import LEGACY_NAME, HistoryLog
+
+LEGACY_SOURCE = SOURCE_DATA_DIR / "heating_plan_2025-2026_data" / LEGACY_NAME
+
+
+@pytest.fixture
+def history_dir(tmp_path):
+    shutil.copy(LEGACY_SOURCE, tmp_path / LEGACY_NAME)
+    return tmp_path
+
+
+def _legacy_records():
+    with open(LEGACY_SOURCE, "r", encoding="utf-8-sig") as f:
+        return [r for r in json.load(f) if isinstance(r, dict)]
+
+
+def _scan(log, table_id):
+    return [r for r in log.read_all() if str(r.get("tableId")) == table_id]
+
+
+def test_index_matches_full_scan(history_dir):
+    log = HistoryLog(history_dir)
+    # 另一个进程的实例：追加的记录须经索引文件被第一个实例看到
+    other = HistoryLog(history_dir)
+    other.append({"tableId": "11", "action": "submit", "n": 1})
+    log.append({"tableId": "12", "action": "save_draft", "n": 2})
+    other.append({"tableId": "new", "action": "submit", "n": 3})
+
+    records = log.read_all()
+    assert records[:len(_legacy_records())] == _legacy_records()
+    table_ids = {str(r.get("tableId")) for r in records}
+    assert {"11", "12", "new"} <= table_ids
+    for table_id in table_ids:
+        assert log.read_table(table_id) == _scan(log, table_id)
+
+    log.rebuild_index()
+    for table_id in table_ids:
+        assert log.read_table(table_id) == _scan(log, table_id)
+
+
+MIGRATE = """
+import sys
+sys.path.insert(0, sys.argv[1])
+from history_store import HistoryLog
+print(len(HistoryLog(sys.argv[2]).read_all()))
+"""
+
+
+def test_concurrent_migration_runs_once(history_dir):
+    workers = [subprocess.Popen([sys.executable, "-c", MIGRATE, str(BACKEND_DIR), str(history_dir)],
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+               for _ in range(6)]
+    expected = len(_legacy_records())
+    for worker in workers:
+        out, err = worker.communicate(timeout=60)
+        assert worker.returncode == 0, err.decode()
+        assert int(out) == expected
+    assert not (history_dir / LEGACY_NAME).exists()
+    assert len(HistoryLog(history_dir).read_all()) == expected
@@ -0,0 +1,48 @@
+"""?asOf= 读取（revisions.py）：部署后未写入过的表与首次写入前的内容。"""
+import copy
+import time
+from datetime import datetime
+
+import pytest
+
+
+def _now(app) -> str:
+    return datetime.now(app.BEIJING_TZ).isoformat()
+
+
+def _get(client, project_id, table_id, as_of=None):
+    params = {"asOf": as_of} if as_of else None
+    response = client.get(f"/project/{project_id}/data/table/{table_id}", params=params)
+    assert response.status_code == 200
+    return response.json()
+
+
+@pytest.mark.parametrize("table_id", ["11", "4", "1", "0"])
+def test_as_of_now_matches_live_without_revisions(app, client, project_id, table_id):
+    # 11 为单位表，4、1、0 为汇总表；部署后都还没有写入过
+    assert not app.REVISIONS.has_revisions(project_id, table_id)
+    assert _get(client, project_id, table_id, _now(app)) == _get(client, project_id, table_id)
+
+
+def test_first_write_keeps_previous_document(app, client, project_id):
+    table_id = "12"
+    before = _get(client, project_id, table_id)
+    summary_id = app.PARENT_MAP[table_id][0]
+    summary_before = _get(client, project_id, summary_id)
+    time.sleep(0.01)
+    written_after = _now(app)
+    time.sleep(0.01)
+
+    payload = copy.deepcopy(before["submit"])
+    payload.pop("submittedAt", None)
+    row = next(r for r in payload["tableData"] if any(isinstance(c.get("value"), (int, float)) for c in r["values"]))
+    cell = next(c for c in row["values"] if isinstance(c.get("value"), (int, float)))
+    cell["value"] += 1
+    response = client.post(f"/project/{project_id}/table/{table_id}/submit", json=payload,
+                           headers={"X-User-Name": "group_admin"})
+    assert response.status_code == 200
+
+    assert _get(client, project_id, table_id, written_after) == before
+    assert _get(client, project_id, summary_id, written_after) == summary_before
+    assert _get(client, project_id, table_id, _now(app)) == _get(client, project_id, table_id)
+    assert _get(client, project_id, summary_id, _now(app)) == _get(client, project_id, summary_id)
@@ -0,0 +1,66 @@
+"""snapshot_codec.py：紧凑编码往返后与原文档完全一致（含键顺序与 int/float 类型）。"""
+import json
+
+import pytest
+
+from conftest import SOURCE_DATA_DIR
+from snapshot_codec import (
+    decode_document,
+    decode_snapshot,
+    dumps_document,
+    encode_snapshot,
+    loads_document,
+    zstandard,
+)
+
+DATA_FILES = sorted((SOURCE_DATA_DIR / "heating_plan_2025-2026_data").glob("*.json"))
+OPTIONS = [("json", None), ("compact", None), ("compact", "gzip")] + \
+          ([("compact", "zstd")] if zstandard is not None else [])
+
+
+def _load(path):
+    return json.loads(path.read_text(encoding="utf-8-sig"))
+
+
+def _same(a, b):
+    # json.dumps 区分键顺序与 1 / 1.0，比 == 更严格
+    return json.dumps(a, ensure_ascii=False) == json.dumps(b, ensure_ascii=False)
+
+
+@pytest.mark.parametrize("fmt, compression", OPTIONS)
+def test_documents_round_trip(fmt, compression):
+    for path in DATA_FILES:
+        doc = _load(path)
+        if not isinstance(doc, dict):
+            continue
+        raw = dumps_document(doc, fmt, compression)
+        assert _same(loads_document(raw), doc), path.name
+        if fmt == "compact":
+            assert len(raw) < path.stat().st_size
+
+
+def test_irregular_snapshots_round_trip():
+    row = {"metricId": "m1", "values": [{"fieldId": "a", "fieldName": "A", "value": 1},
+                                        {"fieldId": "b", "fieldName": "B", "value": 2.0}]}
+    doc = {
+        "submit": {"submittedAt": "t1", "tableData": [
+            row,
+            # 与列模板不一致的行
+            {"metricId": "m2", "values": [{"fieldId": "b", "fieldName": "B", "value": None, "explanation": "x"}]},
+            {"metricId": "m3", "values": []},
+        ]},
+        "approved": {"approvedAt": "t2", "tableData": [row]},
+        "unapproved": None,
+        "temp": {},
+        "copy": {"tableData": [row], "approvedAt": "t3"},
+    }
+    assert _same(loads_document(dumps_document(doc)), doc)
+    for snapshot in doc.values():
+        assert _same(decode_snapshot(json.loads(json.dumps(encode_snapshot(snapshot)))), snapshot)
+
+
+def test_legacy_documents_are_read_as_is():
+    path = DATA_FILES[0]
+    assert _same(loads_document(path.read_bytes().removeprefix(b"\xef\xbb\xbf")), _load(path))
+    assert loads_document(b"") == {}
+    assert decode_document([1, 2]) == [1, 2]
@@ -0,0 +1,78 @@
+"""表快照（snapshots.py）：未变化的表沿用上一份快照的 blob；按表恢复；应用启动时的定时快照。"""
+import time
+
+from fastapi.testclient import TestClient
+
+from activity_log import ActivityLogger
+
+ADMIN = {"X-User-Name": "group_admin"}
+TABLE_ID = "13"
+
+
+def _take(client, project_id, label):
+    response = client.post(f"/project/{project_id}/snapshots", json={"label": label}, headers=ADMIN)
+    assert response.status_code == 200
+    return response.json()
+
+
+def _change_table(client, project_id, table_id=TABLE_ID):
+    response = client.get(f"/project/{project_id}/data/table/{table_id}")
+    for row in response.json()["submit"]["tableData"]:
+        for cell in row["values"]:
+            if isinstance(cell.get("value"), (int, float)) and not isinstance(cell["value"], bool):
+                change = {"metricId": row["metricId"], "fieldId": cell["fieldId"], "value": cell["value"] + 1}
+                result = client.patch(f"/project/{project_id}/table/{table_id}/cells",
+                                      json={"action": "submit", "changes": [change],
+                                            "baseRevision": response.headers["X-Table-Revision"]},
+                                      headers=ADMIN)
+                assert result.status_code == 200
+                return
+    raise AssertionError("no numeric cell")
+
+
+def _table(client, project_id, table_id=TABLE_ID):
+    return client.get(f"/project/{project_id}/data/table/{table_id}").json()
+
+
+def test_take_reuses_unchanged_tables_and_restores(app, client, project_id):
+    first = _take(client, project_id, "first")
+    saved = _table(client, project_id)
+
+    _change_table(client, project_id)
+    second = _take(client, project_id, "second")
+    assert second["tables"] == first["tables"]
+    assert second["reusedTables"] == first["tables"] - 1
+    assert 0 < second["addedBytes"]
+    assert app.SNAPSHOTS.take(project_id, skip_unchanged=True)["unchanged"]
+
+    snapshot_doc = client.get(f"/project/{project_id}/snapshots/{first['id']}/table/{TABLE_ID}", headers=ADMIN)
+    assert snapshot_doc.status_code == 200
+
+    url = f"/project/{project_id}/snapshots/{first['id']}/restore"
+    restored = client.post(url, json={"tableIds": [TABLE_ID, "missing"]}, headers=ADMIN)
+    assert restored.status_code == 200
+    assert restored.json()["restored"] == [TABLE_ID]
+    assert restored.json()["missing"] == ["missing"]
+    assert _table(client, project_id) == saved
+    assert app.STORE.read(project_id, TABLE_ID) == snapshot_doc.json()
+    # 恢复前自动拍的快照保存了被覆盖的内容
+    before = client.get(f"/project/{project_id}/snapshots/{restored.json()['before']}/table/{TABLE_ID}",
+                        headers=ADMIN)
+    assert before.json() != snapshot_doc.json()
+
+    again = client.post(url, json={"tableIds": [TABLE_ID]}, headers=ADMIN)
+    assert again.json()["restored"] == [] and again.json()["unchanged"] == [TABLE_ID]
+
+
+def test_lifespan_starts_snapshot_schedule(app, client, project_id, monkeypatch, tmp_path):
+    _change_table(client, project_id)
+    monkeypatch.setattr(app, "SNAPSHOT_INTERVAL_MINUTES", 0.001)
+    # 关闭时会关闭操作日志：换成这个测试自己的，不影响其它测试
+    activity_log = ActivityLogger(tmp_path / "activity.log", tz=app.BEIJING_TZ)
+    monkeypatch.setattr(app, "ACTIVITY_LOG", activity_log)
+    with TestClient(app.app):
+        deadline = time.monotonic() + 10
+        while not any(s["label"] == "scheduled" for s in app.SNAPSHOTS.list(project_id)):
+            assert time.monotonic() < deadline
+            time.sleep(0.05)
+    assert activity_log._closed
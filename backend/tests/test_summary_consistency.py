@@ -0,0 +1,60 @@
+"""汇总表与响应缓存对其它进程写入的可见性（aggregation.py、main._table_response）。"""
+import subprocess
+import sys
+
+from conftest import BACKEND_DIR
+
+EXTERNAL_WRITE = """
+import sys
+from pathlib import Path
+sys.path.insert(0, sys.argv[1])
+from doc_cache import DocumentCache
+from table_store import open_table_store
+
+data_dir, fmt, project_id, table_id = sys.argv[2:6]
+compression = sys.argv[6] or None
+store = open_table_store("file", Path(data_dir), DocumentCache(1 << 20), fmt=fmt, compression=compression)
+doc = store.read(project_id, table_id)
+for snapshot in doc.values():
+    for row in (snapshot.get("tableData") or []) if isinstance(snapshot, dict) else []:
+        for cell in row["values"]:
+            if isinstance(cell.get("value"), (int, float)) and not isinstance(cell["value"], bool):
+                cell["value"] += 1000
+store.write(project_id, table_id, doc, doc)
+"""
+
+
+def _external_write(app, project_id, table_id):
+    # 另一个进程：独立的文档缓存，不经过本进程的 STORE / AGGREGATOR
+    subprocess.run(
+        [sys.executable, "-c", EXTERNAL_WRITE, str(BACKEND_DIR), str(app.STORE.data_dir), app.STORE.format,
+         project_id, table_id, app.STORE.compression or ""],
+        check=True,
+    )
+
+
+def _expected(app, project_id, table_id):
+    contents = {sid: app.STORE.read(project_id, sid) for sid in app.AGGREGATOR.sources(table_id) + [table_id]}
+    return app.AGGREGATOR.build_detached(table_id, contents)
+
+
+def test_summary_sees_out_of_process_write(app, client, project_id):
+    # 表0 没有自身保存的文档（不会被覆盖），结果完全由子表决定
+    child_id, summary_id = "11", "0"
+    assert summary_id in app.PARENT_MAP[child_id]
+    url = f"/project/{project_id}/data/table/{summary_id}"
+    first = client.get(url)
+    assert first.status_code == 200
+
+    _external_write(app, project_id, child_id)
+
+    second = client.get(url)
+    assert second.status_code == 200
+    assert second.headers["ETag"] != first.headers["ETag"]
+    assert second.json() != first.json()
+    assert second.json()["submit"] == _expected(app, project_id, summary_id)["submit"]
+    # 缓存的响应体与新 ETag 对应
+    third = client.get(url)
+    assert third.headers["ETag"] == second.headers["ETag"]
+    assert third.json() == second.json()
+    assert client.get(url, headers={"If-None-Match": second.headers["ETag"]}).status_code == 304
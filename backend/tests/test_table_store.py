@@ -0,0 +1,77 @@
+"""table_store.py：文件存储与 SQLite 存储读写结果一致；另一个实例（进程）的写入可见。"""
+import shutil
+
+import pytest
+
+from cell_patch import SnapshotDelta, parse_changes
+from conftest import SOURCE_DATA_DIR
+from doc_cache import DocumentCache
+from table_store import SqliteTableStore, import_file_tree, open_table_store
+
+PROJECT_ID = "heating_plan_2025-2026"
+
+
+@pytest.fixture
+def stores(tmp_path):
+    data_dir = tmp_path / "data"
+    shutil.copytree(SOURCE_DATA_DIR, data_dir)
+    file_store = open_table_store("file", data_dir, DocumentCache(1 << 24))
+    sqlite_store = SqliteTableStore(tmp_path / "tables.db", DocumentCache(1 << 24))
+    import_file_tree(data_dir, sqlite_store)
+    return file_store, sqlite_store
+
+
+def _reopen(store):
+    # 同一份数据上的新实例：空的文档缓存，相当于另一个 worker 进程
+    if isinstance(store, SqliteTableStore):
+        return SqliteTableStore(store.db_path, DocumentCache(1 << 24), store.format)
+    return open_table_store("file", store.data_dir, DocumentCache(1 << 24), fmt=store.format,
+                            compression=store.compression)
+
+
+def _first_numeric_cell(snapshot):
+    for row in snapshot["tableData"]:
+        for cell in row["values"]:
+            if isinstance(cell.get("value"), (int, float)) and not isinstance(cell["value"], bool):
+                return row["metricId"], cell["fieldId"], cell["value"]
+    raise AssertionError("no numeric cell")
+
+
+def test_import_matches_file_store(stores):
+    file_store, sqlite_store = stores
+    assert sqlite_store.projects() == file_store.projects() == [PROJECT_ID]
+    assert sorted(sqlite_store.tables(PROJECT_ID)) == sorted(file_store.tables(PROJECT_ID))
+    for table_id in file_store.tables(PROJECT_ID):
+        doc = file_store.read(PROJECT_ID, table_id)
+        assert sqlite_store.read(PROJECT_ID, table_id) == doc
+        # 快照顺序同样保留
+        assert list(sqlite_store.read(PROJECT_ID, table_id)) == list(doc)
+    table_ids = file_store.tables(PROJECT_ID)
+    assert sqlite_store.status_meta(PROJECT_ID, table_ids) == file_store.status_meta(PROJECT_ID, table_ids)
+    assert sqlite_store.table_history(PROJECT_ID, "11") == file_store.table_history(PROJECT_ID, "11")
+
+
+@pytest.mark.parametrize("kind", ["file", "sqlite"])
+def test_writes_are_visible_to_other_instances(stores, kind):
+    store = stores[0] if kind == "file" else stores[1]
+    other = _reopen(store)
+    table_id = "11"
+    previous = store.read(PROJECT_ID, table_id)
+    assert other.read(PROJECT_ID, table_id) == previous
+    signature = other.signature(PROJECT_ID, table_id)
+
+    metric_id, field_id, value = _first_numeric_cell(previous["submit"])
+    changes = parse_changes([{"metricId": metric_id, "fieldId": field_id, "value": value + 1}])
+    delta = SnapshotDelta.build(previous, "submit", changes, {"submittedAt": "2025-10-01T08:00:00+08:00"})
+    data = delta.apply(previous)
+    store.patch(PROJECT_ID, table_id, delta, data, previous)
+    assert other.signature(PROJECT_ID, table_id) != signature
+    assert other.read(PROJECT_ID, table_id) == data
+
+    rewritten = {**data, "temp": data["submit"]}
+    store.write(PROJECT_ID, table_id, rewritten, data)
+    assert other.read(PROJECT_ID, table_id) == rewritten
+    assert other.status_meta(PROJECT_ID, [table_id]) == store.status_meta(PROJECT_ID, [table_id])
+
+    store.append_history(PROJECT_ID, {"tableId": table_id, "action": "submit", "n": 1})
+    assert other.table_history(PROJECT_ID, table_id)[-1] == {"tableId": table_id, "action": "submit", "n": 1}
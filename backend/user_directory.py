@@ -0,0 +1,67 @@
+"""auth.json 的内存索引。
+
+auth.json 只在文件签名 (mtime/size/inode) 变化时重新解析，用户按 username 建立字典索引，
+每次请求的用户查找为一次 stat 加一次字典查找。返回的用户字典为共享对象，调用方不得修改。
+"""
+import json
+import threading
+from pathlib import Path
+from typing import Optional
+
+from doc_cache import file_signature
+
+READ_ONLY_ROLES = frozenset({'super_viewer', 'viewer', 'read_only'})
+
+
+def role_of(user: Optional[dict]) -> Optional[str]:
+    if not user or not isinstance(user, dict):
+        return None
+    return user.get('globalRole') or user.get('role')
+
+
+class UserDirectory:
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._signature = None
+        self._by_name: dict[str, list] = {}
+
+    def _refresh(self):
+        signature = file_signature(self.path)
+        if signature == self._signature:
+            return
+        with self._lock:
+            if signature == self._signature:
+                return
+            users = []
+            if signature is not None:
+                try:
+                    with open(self.path, "r", encoding="utf-8") as f:
+                        users = json.load(f)
+                except Exception:
+                    users = []
+            by_name: dict[str, list] = {}
+            for user in users if isinstance(users, list) else []:
+                if isinstance(user, dict):
+                    # 同名用户保留文件中的顺序，与逐条扫描时的匹配结果一致
+                    by_name.setdefault(user.get('username'), []).append(user)
+            self._by_name = by_name
+            self._signature = signature
+
+    @property
+    def available(self) -> bool:
+        self._refresh()
+        return self._signature is not None
+
+    def get(self, username: Optional[str]) -> Optional[dict]:
+        """username 对应的第一个用户；不存在时返回 None。"""
+        if not username:
+            return None
+        self._refresh()
+        entries = self._by_name.get(username)
+        return entries[0] if entries else None
+
+    def candidates(self, username: str) -> list:
+        """同名的全部用户（登录时依次比对密码）。"""
+        self._refresh()
+        return list(self._by_name.get(username, ()))